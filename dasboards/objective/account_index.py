@@ -0,0 +1,67 @@
+"""
+Index de classification des comptes.
+
+Les règles de préfixe des numéros de compte (401, 51, 51025-x, 60, 60100) sont
+lues depuis account_rules.json et rangées dans un arbre de préfixes. Le plan
+comptable est classé une seule fois : chaque ligne n'a ensuite besoin que d'une
+recherche `account_id -> (type, catégorie)`.
+"""
+import json
+import os
+from functools import lru_cache
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "account_rules.json")
+
+# Types de comptes produits par les règles
+SALES = 'Sales'
+FOOD_COST = 'Food Cost'
+LABOUR = 'Labour'
+
+# Clés réservées dans les noeuds de l'arbre de préfixes
+_PREFIX_RULE = '__prefix__'
+_EXACT_RULE = '__exact__'
+
+
+class AccountClassifier:
+    """Classe les numéros de compte selon la règle de plus long préfixe."""
+
+    def __init__(self, rules):
+        self._trie = {}
+        for rule in rules:
+            node = self._trie
+            for char in rule['prefix']:
+                node = node.setdefault(char, {})
+            key = _EXACT_RULE if rule.get('exact') else _PREFIX_RULE
+            node[key] = (rule['kind'], rule['category'])
+
+    def classify(self, account_num):
+        """Retourne (type, catégorie) pour un numéro de compte, ou None s'il n'est pas suivi."""
+        node = self._trie
+        match = None
+        for char in account_num:
+            node = node.get(char)
+            if node is None:
+                return match
+            match = node.get(_PREFIX_RULE, match)
+        return node.get(_EXACT_RULE, match)
+
+    def build_index(self, accounts):
+        """Classe un plan comptable (`qbo_data['accounts']`) : account_id -> (type, catégorie)."""
+        index = {}
+        for account_id, account_info in accounts.items():
+            classification = self.classify(account_info.get('Number') or '')
+            if classification is not None:
+                index[account_id] = classification
+        return index
+
+
+def load_account_rules(path=DEFAULT_RULES_PATH):
+    """Lit les règles de classification depuis un fichier JSON."""
+    with open(path, encoding='utf-8') as rules_file:
+        return json.load(rules_file)['rules']
+
+
+@lru_cache(maxsize=None)
+def get_account_classifier(path=DEFAULT_RULES_PATH):
+    """Retourne le classificateur construit à partir du fichier de règles (mis en cache)."""
+    return AccountClassifier(load_account_rules(path))
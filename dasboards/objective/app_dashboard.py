@@ -1,39 +1,29 @@
 #sstreamlit run dasboards/objective/app_dashboard.py
 
+# Les bibliothèques QuickBooks, OAuth et matplotlib sont importées à la première
+# utilisation pour que la page s'affiche sans attendre leur chargement.
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
-import calendar
-import os
-from intuitlib.client import AuthClient
-from quickbooks import QuickBooks
-from quickbooks.objects.account import Account
-from quickbooks.objects.invoice import Invoice
-from quickbooks.objects.bill import Bill
-from quickbooks.objects.vendorcredit import VendorCredit
-from quickbooks.objects.journalentry import JournalEntry
-from quickbooks.objects.purchase import Purchase
-from quickbooks.objects.customer import Customer
-from quickbooks import helpers
-from intuitlib.enums import Scopes
-# Configuration de la page
-st.set_page_config(
-    page_title="Tableau de bord Restaurant",
-    page_icon="🍽️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+from datetime import datetime
+from functools import partial
+import sys
+import threading
+from qbo_fetch import fetch_all, format_fetch_stats
+from qbo_scheduler import format_scheduler_stats
+from ledger_columns import LedgerColumns
+from ledger_engine import month_range, previous_quarter, quarter_period
+from kpi_engine import KPI_INPUTS, compute_kpis
+from rollup_cube import RollupCube
+from dashboard_pipeline import fetch_snapshot, load_rollup_cubes, process_data_for_dashboard
+from dashboard_snapshots import load_snapshot
+from refresh_worker import format_age
 
 # Fonction pour se connecter à l'API QuickBooks
-# Ajouter quelque part dans votre app pour le débogage
-if st.sidebar.checkbox("Afficher l'état de la session"):
-    st.sidebar.write(st.session_state)
-    
 def connect_to_quickbooks():
+    from intuitlib.client import AuthClient
     from intuitlib.enums import Scopes
+    from qbo_client import forget_client, get_registered_client, verify_realm_access
     
     # Configuration de base
     try:
@@ -50,15 +40,15 @@ def connect_to_quickbooks():
         if not (client_id and client_secret):
             return None
 
-    auth_client = AuthClient(
-        client_id=client_id,
-        client_secret=client_secret,
-        redirect_uri=redirect_uri,
-        environment=environment
-    )
-    
     # Si nous n'avons pas encore de jeton dans la session
     if 'access_token' not in st.session_state:
+        auth_client = AuthClient(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            environment=environment
+        )
+        
         # Générer l'URL d'authentification
         auth_url = auth_client.get_authorization_url([Scopes.ACCOUNTING])
         
@@ -89,6 +79,12 @@ def connect_to_quickbooks():
             if auth_code and realm_id:
                 try:
                     auth_client.get_bearer_token(auth_code)
+                    # Le Realm ID saisi doit être celui de la compagnie autorisée par ce code :
+                    # le client, le cache et la base locale de la compagnie sont partagés
+                    if not verify_realm_access(auth_client.access_token, realm_id.strip(), environment):
+                        st.sidebar.error("Ce Realm ID ne correspond pas à la compagnie autorisée.")
+                        return None
+                    realm_id = realm_id.strip()
                     st.session_state.access_token = auth_client.access_token
                     st.session_state.refresh_token = auth_client.refresh_token
                     st.session_state.realm_id = realm_id
@@ -103,416 +99,114 @@ def connect_to_quickbooks():
         
         return None  # Retourner None si l'authentification n'est pas encore complète
     
-    # Si nous avons déjà un jeton, créer le client QuickBooks
+    # Si nous avons déjà un jeton, réutiliser le client QuickBooks de cette compagnie
     try:
-        client = QuickBooks(
-            auth_client=auth_client,
-            refresh_token=st.session_state.refresh_token,
-            company_id=st.session_state.realm_id,
+        registered = get_registered_client(
+            client_id, client_secret, redirect_uri, environment,
+            st.session_state.realm_id, st.session_state.refresh_token
         )
+        # QuickBooks peut remplacer le jeton de renouvellement à chaque renouvellement
+        st.session_state.refresh_token = registered.refresh_token
         st.sidebar.success("Connecté à QuickBooks!")
-        return client
+        return registered.client
     except Exception as e:
         st.sidebar.error(f"Erreur lors de la création du client QuickBooks: {e}")
+        forget_client(st.session_state.realm_id)
         if 'access_token' in st.session_state:
             del st.session_state.access_token
         return None
     
-# Fonction pour obtenir les données QuickBooks
-def get_qbo_data(client, start_date, end_date, account_refs=None):
-    """
-    Récupère les données financières de QuickBooks pour la période spécifiée.
+# Base locale des documents QuickBooks, partagée par toutes les sessions
+@st.cache_resource
+def get_ledger_store():
+    from ledger_store import LedgerStore
+    return LedgerStore()
+
+# Données QuickBooks partagées par toutes les sessions (voir shared_cache)
+@st.cache_resource
+def get_shared_cache():
+    from shared_cache import SharedDataCache
+    return SharedDataCache()
+
+# Actualisation en arrière-plan des données partagées (voir refresh_worker)
+@st.cache_resource
+def get_refresh_worker():
+    from refresh_worker import RefreshWorker
+    return RefreshWorker(get_shared_cache())
+
+# Âge maximal des données partagées servies après un clic sur « Actualiser »
+SHARED_REFRESH_MAX_AGE = 60
+
+SHARED_SOURCE_LABELS = {
+    'cache': "Données servies par le cache partagé",
+    'coalesced': "Données partagées avec une actualisation en cours",
+}
+
+# Nombre d'années proposées par le sélecteur de trimestre (l'année en cours et les précédentes)
+QUARTER_PICKER_YEARS = 5
+
+# Restaurants utilisés en mode démo, ou si les clients QuickBooks sont indisponibles
+DEMO_RESTAURANTS = ["HULL", "GATINEAU", "OTTAWA", "MONTREAL"]
+
+# Index des restaurants (clients QuickBooks actifs) de chaque compagnie
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_restaurant_index(realm_id, _client):
+    """Retourne l'index nom du restaurant -> Id du client QuickBooks."""
+    from quickbooks.objects.customer import Customer
+    return {customer.DisplayName: customer.Id
+            for customer in fetch_all(Customer, _client, "Active = true")}
+
+def session_memory_bytes(value):
+    """Estime la mémoire occupée par une valeur de la session (LedgerColumns, DataFrames, dictionnaires)."""
+    if isinstance(value, (LedgerColumns, RollupCube)):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sum(sys.getsizeof(key) + session_memory_bytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(session_memory_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+# Compteurs du cache de calcul du tableau de bord (partagés par toutes les sessions)
+DASHBOARD_CACHE_STATS = {'calls': 0, 'misses': 0}
+DASHBOARD_CACHE_LOCK = threading.Lock()
+
+@st.cache_data(max_entries=64, ttl=3600, show_spinner=False)
+def compute_dashboard(fingerprint, start_date, end_date, selected_restaurant,
+                      _qbo_data, _cube=None, _prior_cube=None):
     """
-    if not client:
-        return None
-    
-    # Convertir les dates au format QuickBooks
-    start_str = start_date.strftime('%Y-%m-%d')
-    end_str = end_date.strftime('%Y-%m-%d')
-    
-    # Récupérer les transactions de ventes, coûts, etc.
-    try:
-        # Requête pour les entrées de journal dans la période
-        query = f"""
-        SELECT * FROM JournalEntry 
-        WHERE TxnDate >= '{start_str}' AND TxnDate <= '{end_str}'
-        MAXRESULTS 1000
-        """
-        journal_entries = JournalEntry.query(query, qb=client)
-        
-        # Requête pour les factures dans la période
-        query = f"""
-        SELECT * FROM Invoice 
-        WHERE TxnDate >= '{start_str}' AND TxnDate <= '{end_str}'
-        MAXRESULTS 1000
-        """
-        invoices = Invoice.query(query, qb=client)
-        
-        # Requête pour les achats dans la période
-        query = f"""
-        SELECT * FROM Purchase 
-        WHERE TxnDate >= '{start_str}' AND TxnDate <= '{end_str}'
-        MAXRESULTS 1000
-        """
-        purchases = Purchase.query(query, qb=client)
-        
-        # Récupérer les comptes pour identifier les catégories
-        accounts = Account.filter(Active=True, qb=client)
-        
-        # Créer un dictionnaire de mappage des comptes
-        account_map = {}
-        for account in accounts:
-            account_map[account.Id] = {
-                'Name': account.Name,
-                'Number': account.AcctNum if hasattr(account, 'AcctNum') else '',
-                'Type': account.AccountType,
-                'SubType': account.AccountSubType if hasattr(account, 'AccountSubType') else ''
-            }
-        
-        return {
-            'journal_entries': journal_entries,
-            'invoices': invoices,
-            'purchases': purchases,
-            'accounts': account_map
-        }
-    
-    except Exception as e:
-        st.error(f"Erreur lors de la récupération des données QuickBooks: {e}")
-        return None
+    Version mémorisée de process_data_for_dashboard.
 
-# Fonction pour traiter les données et créer le tableau de bord
-def process_data_for_dashboard(qbo_data, start_date, end_date, selected_restaurant=None):
+    La clé de cache est l'empreinte des données, la période et le restaurant; les
+    arguments préfixés par _ ne sont pas hachés par Streamlit. Les changements de
+    widgets sans rapport avec ces valeurs ne recalculent rien.
     """
-    Traite les données de QuickBooks pour les adapter au format du tableau de bord.
+    with DASHBOARD_CACHE_LOCK:
+        DASHBOARD_CACHE_STATS['misses'] += 1
+    return process_data_for_dashboard(
+        _qbo_data, start_date, end_date, selected_restaurant,
+        cube=_cube, prior_cube=_prior_cube
+    )
+
+def get_dashboard(qbo_data, start_date, end_date, selected_restaurant=None, cube=None,
+                  prior_cube=None):
     """
-    if not qbo_data:
-        return None
-    
-    # Créer des DataFrames vides pour chaque catégorie
-    sales_data = []
-    food_cost_data = []
-    labour_data = []
-    
-    # Traiter les journaux
-    for entry in qbo_data['journal_entries']:
-        for line in entry.Line:
-            if hasattr(line, 'JournalEntryLineDetail') and hasattr(line.JournalEntryLineDetail, 'AccountRef'):
-                account_id = line.JournalEntryLineDetail.AccountRef.value
-                account_info = qbo_data['accounts'].get(account_id, {})
-                amount = float(line.Amount) if hasattr(line, 'Amount') else 0
-                
-                # Déterminer si crédit ou débit
-                is_credit = line.JournalEntryLineDetail.PostingType == "Credit"
-                if is_credit:
-                    amount = -amount
-                
-                # Extraire la date
-                txn_date = datetime.strptime(entry.TxnDate, '%Y-%m-%d')
-                month = txn_date.strftime('%Y-%m')
-                
-                # Classer selon le numéro de compte
-                account_num = account_info.get('Number', '')
-                
-                # Filtrer par restaurant si spécifié
-                entity_ref = None
-                if hasattr(entry, 'EntityRef'):
-                    entity_ref = entry.EntityRef.name
-                
-                if selected_restaurant and entity_ref != selected_restaurant:
-                    continue
-                
-                # Classifier en fonction du compte
-                if account_num.startswith('401'):  # Ventes
-                    sales_data.append({
-                        'Date': txn_date,
-                        'Month': month,
-                        'Amount': amount,
-                        'Account': account_info.get('Name', ''),
-                        'Type': 'Sales',
-                        'Restaurant': entity_ref
-                    })
-                elif account_num.startswith('51'):  # Coût des aliments
-                    food_cost_data.append({
-                        'Date': txn_date,
-                        'Month': month,
-                        'Amount': amount,
-                        'Account': account_info.get('Name', ''),
-                        'Type': 'Food Cost',
-                        'Category': categorize_food_cost(account_num),
-                        'Restaurant': entity_ref
-                    })
-                elif account_num.startswith('60'):  # Main d'oeuvre
-                    labour_data.append({
-                        'Date': txn_date,
-                        'Month': month,
-                        'Amount': amount,
-                        'Account': account_info.get('Name', ''),
-                        'Type': 'Labour',
-                        'Category': 'Crew' if account_num == '60100' else 'Management',
-                        'Restaurant': entity_ref
-                    })
-    
-    # Traiter les factures pour les ventes
-    for invoice in qbo_data['invoices']:
-        if hasattr(invoice, 'TotalAmt'):
-            amount = float(invoice.TotalAmt)
-            txn_date = datetime.strptime(invoice.TxnDate, '%Y-%m-%d')
-            month = txn_date.strftime('%Y-%m')
-            
-            customer_name = invoice.CustomerRef.name if hasattr(invoice, 'CustomerRef') else None
-            
-            if selected_restaurant and customer_name != selected_restaurant:
-                continue
-                
-            sales_data.append({
-                'Date': txn_date,
-                'Month': month,
-                'Amount': amount,
-                'Account': 'Sales',
-                'Type': 'Sales',
-                'Restaurant': customer_name
-            })
-    
-    # Traiter les achats pour les coûts
-    for purchase in qbo_data['purchases']:
-        if hasattr(purchase, 'TotalAmt'):
-            amount = float(purchase.TotalAmt)
-            txn_date = datetime.strptime(purchase.TxnDate, '%Y-%m-%d')
-            month = txn_date.strftime('%Y-%m')
-            
-            # Déterminer la catégorie en fonction du fournisseur ou des lignes
-            category = 'Other'
-            if hasattr(purchase, 'Line'):
-                for line in purchase.Line:
-                    if hasattr(line, 'AccountBasedExpenseLineDetail') and hasattr(line.AccountBasedExpenseLineDetail, 'AccountRef'):
-                        account_id = line.AccountBasedExpenseLineDetail.AccountRef.value
-                        account_info = qbo_data['accounts'].get(account_id, {})
-                        account_num = account_info.get('Number', '')
-                        
-                        if account_num.startswith('51'):
-                            category = categorize_food_cost(account_num)
-                            break
-            
-            entity_name = purchase.EntityRef.name if hasattr(purchase, 'EntityRef') else None
-            
-            if selected_restaurant and entity_name != selected_restaurant:
-                continue
-                
-            food_cost_data.append({
-                'Date': txn_date,
-                'Month': month,
-                'Amount': amount,
-                'Account': category,
-                'Type': 'Food Cost',
-                'Category': category,
-                'Restaurant': entity_name
-            })
-    
-    # Créer les DataFrames
-    sales_df = pd.DataFrame(sales_data) if sales_data else pd.DataFrame(columns=['Date', 'Month', 'Amount', 'Account', 'Type', 'Restaurant'])
-    food_cost_df = pd.DataFrame(food_cost_data) if food_cost_data else pd.DataFrame(columns=['Date', 'Month', 'Amount', 'Account', 'Type', 'Category', 'Restaurant'])
-    labour_df = pd.DataFrame(labour_data) if labour_data else pd.DataFrame(columns=['Date', 'Month', 'Amount', 'Account', 'Type', 'Category', 'Restaurant'])
-    
-    # Générer les données pour le tableau de bord
-    dashboard_data = {}
-    
-    # Générer les mois entre la date de début et de fin
-    months = []
-    current_date = start_date.replace(day=1)
-    while current_date <= end_date:
-        months.append(current_date.strftime('%Y-%m'))
-        # Passer au mois suivant
-        if current_date.month == 12:
-            current_date = current_date.replace(year=current_date.year + 1, month=1)
-        else:
-            current_date = current_date.replace(month=current_date.month + 1)
-    
-    # Obtenir les données de l'année précédente pour comparaison
-    prev_year_start = start_date.replace(year=start_date.year - 1)
-    prev_year_end = end_date.replace(year=end_date.year - 1)
-    
-    # Placeholder pour les données de l'année précédente (dans une vraie mise en œuvre, vous récupéreriez ces données)
-    prev_year_data = {month: np.random.randint(400000, 600000) for month in months}
-    
-    # Préparer les données mensuelles
-    monthly_data = {}
-    for month in months:
-        month_sales = sales_df[sales_df['Month'] == month]['Amount'].sum() if not sales_df.empty else 0
-        prev_month_sales = prev_year_data.get(month, 0)
-        
-        growth = ((month_sales - prev_month_sales) / prev_month_sales * 100) if prev_month_sales > 0 else 0
-        
-        # Food costs par catégorie
-        food_costs = {}
-        if not food_cost_df.empty:
-            month_food_costs = food_cost_df[food_cost_df['Month'] == month]
-            for category in ['Perte brute', 'Perte complétée', 'Condiments', 'Aliments employés', 'STAT']:
-                food_costs[category] = month_food_costs[month_food_costs['Category'] == category]['Amount'].sum()
-        else:
-            food_costs = {
-                'Perte brute': 0,
-                'Perte complétée': 0,
-                'Condiments': 0, 
-                'Aliments employés': 0,
-                'STAT': 0
-            }
-        
-        total_food_cost = sum(food_costs.values())
-        food_cost_percent = (total_food_cost / month_sales * 100) if month_sales > 0 else 0
-        
-        # Labour costs
-        labour_costs = {}
-        if not labour_df.empty:
-            month_labour = labour_df[labour_df['Month'] == month]
-            labour_costs['Équipiers'] = month_labour[month_labour['Category'] == 'Crew']['Amount'].sum()
-            labour_costs['Gestion'] = month_labour[month_labour['Category'] == 'Management']['Amount'].sum()
-        else:
-            labour_costs = {'Équipiers': 0, 'Gestion': 0}
-        
-        total_labour = sum(labour_costs.values())
-        labour_percent = (total_labour / month_sales * 100) if month_sales > 0 else 0
-        
-        # Ajouter les données FCFP de Clearview (simulé ici)
-        fcfp = np.random.randint(90, 130)
-        
-        # Calculer le pourcentage numérique (simulé)
-        numerique = np.random.uniform(15.0, 17.0)
-        
-        monthly_data[month] = {
-            'Ventes': {
-                'Actuel': month_sales,
-                'Année précédente': prev_month_sales,
-                'Croissance': growth
-            },
-            'Coût des aliments': {
-                'Perte brute': food_costs['Perte brute'],
-                'Perte complétée': food_costs['Perte complétée'],
-                'Condiments': food_costs['Condiments'],
-                'Aliments employés': food_costs['Aliments employés'],
-                'STAT': food_costs['STAT'],
-                'Total': total_food_cost,
-                'Pourcentage': food_cost_percent
-            },
-            'Main d\'oeuvre': {
-                'Équipiers': labour_costs['Équipiers'],
-                'Gestion': labour_costs['Gestion'],
-                'Total': total_labour,
-                'Pourcentage': labour_percent
-            },
-            'FCFP': fcfp,
-            'Numérique': numerique
-        }
-    
-    # Calculer le total du trimestre
-    quarter_data = {
-        'Ventes': {
-            'Actuel': sum(monthly_data[month]['Ventes']['Actuel'] for month in months),
-            'Année précédente': sum(monthly_data[month]['Ventes']['Année précédente'] for month in months),
-        },
-        'Coût des aliments': {
-            'Perte brute': sum(monthly_data[month]['Coût des aliments']['Perte brute'] for month in months),
-            'Perte complétée': sum(monthly_data[month]['Coût des aliments']['Perte complétée'] for month in months),
-            'Condiments': sum(monthly_data[month]['Coût des aliments']['Condiments'] for month in months),
-            'Aliments employés': sum(monthly_data[month]['Coût des aliments']['Aliments employés'] for month in months),
-            'STAT': sum(monthly_data[month]['Coût des aliments']['STAT'] for month in months),
-        },
-        'Main d\'oeuvre': {
-            'Équipiers': sum(monthly_data[month]['Main d\'oeuvre']['Équipiers'] for month in months),
-            'Gestion': sum(monthly_data[month]['Main d\'oeuvre']['Gestion'] for month in months),
-        }
-    }
-    
-    # Calculer les totaux et pourcentages pour le trimestre
-    quarter_data['Ventes']['Croissance'] = ((quarter_data['Ventes']['Actuel'] - quarter_data['Ventes']['Année précédente']) / 
-                                           quarter_data['Ventes']['Année précédente'] * 100) if quarter_data['Ventes']['Année précédente'] > 0 else 0
-    
-    quarter_data['Coût des aliments']['Total'] = (quarter_data['Coût des aliments']['Perte brute'] + 
-                                                 quarter_data['Coût des aliments']['Perte complétée'] + 
-                                                 quarter_data['Coût des aliments']['Condiments'] + 
-                                                 quarter_data['Coût des aliments']['Aliments employés'] + 
-                                                 quarter_data['Coût des aliments']['STAT'])
-    
-    quarter_data['Coût des aliments']['Pourcentage'] = (quarter_data['Coût des aliments']['Total'] / 
-                                                       quarter_data['Ventes']['Actuel'] * 100) if quarter_data['Ventes']['Actuel'] > 0 else 0
-    
-    quarter_data['Main d\'oeuvre']['Total'] = (quarter_data['Main d\'oeuvre']['Équipiers'] + 
-                                             quarter_data['Main d\'oeuvre']['Gestion'])
-    
-    quarter_data['Main d\'oeuvre']['Pourcentage'] = (quarter_data['Main d\'oeuvre']['Total'] / 
-                                                   quarter_data['Ventes']['Actuel'] * 100) if quarter_data['Ventes']['Actuel'] > 0 else 0
-    
-    # Calculer le FCFP moyen
-    quarter_data['FCFP'] = sum(monthly_data[month]['FCFP'] for month in months) / len(months) if months else 0
-    
-    # Calculer le numérique moyen
-    quarter_data['Numérique'] = sum(monthly_data[month]['Numérique'] for month in months) / len(months) if months else 0
-    
-    # Ajouter les objectifs
-    objectives = {
-        'Ventes': {
-            'Croissance': 5.5,
-            'Montant': 87482.02
-        },
-        'Coût des aliments': {
-            'Pourcentage': 2.5,
-            'Montant': 33861
-        },
-        'Main d\'oeuvre': {
-            'Pourcentage': 25.0,
-            'Montant': 338613.32
-        },
-        'FCFP': 140,
-        'Numérique': 18.8
-    }
-    
-    # Calculer les différences avec les objectifs
-    differences = {
-        'Ventes': objectives['Ventes']['Croissance'] - quarter_data['Ventes']['Croissance'],
-        'Coût des aliments': objectives['Coût des aliments']['Pourcentage'] - quarter_data['Coût des aliments']['Pourcentage'],
-        'Main d\'oeuvre': objectives['Main d\'oeuvre']['Pourcentage'] - quarter_data['Main d\'oeuvre']['Pourcentage'],
-        'FCFP': objectives['FCFP'] - quarter_data['FCFP'],
-        'Numérique': objectives['Numérique'] - quarter_data['Numérique']
-    }
-    
-    # Définir les valeurs maximales et atteintes
-    maximums = {
-        'Ventes': {'Maximum': 30, 'Atteint': 0 if differences['Ventes'] < 0 else 30},
-        'Coût des aliments': {'Maximum': 15, 'Atteint': 0 if differences['Coût des aliments'] < 0 else 15},
-        'Main d\'oeuvre': {'Maximum': 20, 'Atteint': 20 if abs(differences['Main d\'oeuvre']) <= 1.2 else 0},
-        'FCFP': {'Maximum': 20, 'Atteint': 20},
-        'Numérique': {'Maximum': 15, 'Atteint': 0 if differences['Numérique'] < 0 else 15}
-    }
-    
-    # Rassembler toutes les données
-    dashboard_data = {
-        'monthly': monthly_data,
-        'quarterly': quarter_data,
-        'objectives': objectives,
-        'differences': differences,
-        'maximums': maximums,
-        'months': months
-    }
-    
-    return dashboard_data
+    Retourne le tableau de bord depuis le cache, ou le calcule s'il est absent.
 
-def categorize_food_cost(account_num):
-    """Catégorise les coûts des aliments en fonction du numéro de compte."""
-    mapping = {
-        '51025-1': 'Perte brute',
-        '51025-2': 'Perte complétée',
-        '51025-3': 'Condiments',
-        '51025-4': 'Aliments employés'
-    }
-    
-    for prefix, category in mapping.items():
-        if account_num.startswith(prefix):
-            return category
-    
-    # Si le compte commence par 51 mais n'est pas dans le mapping, présumer STAT
-    if account_num.startswith('51'):
-        return 'STAT'
-    
-    return 'Autre'
+    Sans `qbo_data`, le tableau est calculé à partir de `cube` et `prior_cube`,
+    identifiés par leurs empreintes.
+    """
+    with DASHBOARD_CACHE_LOCK:
+        DASHBOARD_CACHE_STATS['calls'] += 1
+    if qbo_data:
+        fingerprint = qbo_data['fingerprint']
+    else:
+        fingerprint = cube.fingerprint + (prior_cube.fingerprint if prior_cube is not None else '')
+    return compute_dashboard(
+        fingerprint, start_date, end_date, selected_restaurant,
+        qbo_data, cube, prior_cube
+    )
 
 def format_currency(value):
     """Formate un nombre en devise."""
@@ -524,6 +218,20 @@ def format_percentage(value):
 
 # Interface utilisateur Streamlit
 def main():
+    # Configuration de la page
+    st.set_page_config(
+        page_title="Tableau de bord Restaurant",
+        page_icon="🍽️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    
+    # Ajouter quelque part dans votre app pour le débogage
+    if st.sidebar.checkbox("Afficher l'état de la session"):
+        session_bytes = sum(session_memory_bytes(value) for value in st.session_state.to_dict().values())
+        st.sidebar.caption(f"Mémoire de la session: {session_bytes / 1e6:.2f} Mo")
+        st.sidebar.write(st.session_state)
+    
     st.title("Tableau de bord de performance restaurant")
     
     # Connexion à QuickBooks
@@ -532,30 +240,20 @@ def main():
     # Configuration de la période et du restaurant
     st.sidebar.header("Filtres")
     
-    # Liste des trimestres disponibles
+    # Liste des années et des trimestres disponibles
     current_year = datetime.now().year
+    selected_year = st.sidebar.selectbox("Année", [current_year - i for i in range(QUARTER_PICKER_YEARS)])
     quarters = [
-        f"T1 {current_year} (Jan-Mar)",
-        f"T2 {current_year} (Avr-Jun)",
-        f"T3 {current_year} (Jul-Sep)",
-        f"T4 {current_year} (Oct-Déc)",
+        f"T1 {selected_year} (Jan-Mar)",
+        f"T2 {selected_year} (Avr-Jun)",
+        f"T3 {selected_year} (Jul-Sep)",
+        f"T4 {selected_year} (Oct-Déc)",
     ]
     
     selected_quarter = st.sidebar.selectbox("Trimestre", quarters)
     
     # Déterminer les dates de début et de fin en fonction du trimestre sélectionné
-    if "T1" in selected_quarter:
-        start_date = datetime(current_year, 1, 1)
-        end_date = datetime(current_year, 3, 31)
-    elif "T2" in selected_quarter:
-        start_date = datetime(current_year, 4, 1)
-        end_date = datetime(current_year, 6, 30)
-    elif "T3" in selected_quarter:
-        start_date = datetime(current_year, 7, 1)
-        end_date = datetime(current_year, 9, 30)
-    else:  # T4
-        start_date = datetime(current_year, 10, 1)
-        end_date = datetime(current_year, 12, 31)
+    start_date, end_date = quarter_period(selected_year, quarters.index(selected_quarter) + 1)
     
     # Option pour personnaliser la période
     custom_period = st.sidebar.checkbox("Période personnalisée")
@@ -563,33 +261,186 @@ def main():
         start_date = st.sidebar.date_input("Date de début", start_date)
         end_date = st.sidebar.date_input("Date de fin", end_date)
     
-    # Pour la démo, créons une liste de restaurants fictive
-    # Dans une vraie application, vous récupéreriez cette liste de QuickBooks
-    restaurants = ["HULL", "GATINEAU", "OTTAWA", "MONTREAL"]
+    # Les restaurants sont les clients QuickBooks actifs (liste fictive en mode démo)
+    restaurant_index = {}
+    if qb_client:
+        try:
+            restaurant_index = get_restaurant_index(st.session_state.realm_id, qb_client)
+        except Exception as e:
+            st.sidebar.warning(f"Liste des restaurants indisponible: {e}")
+    restaurants = sorted(restaurant_index) or DEMO_RESTAURANTS
     
     selected_restaurant = st.sidebar.selectbox("Restaurant", ["Tous"] + restaurants)
     selected_restaurant = None if selected_restaurant == "Tous" else selected_restaurant
+    restaurant_id = restaurant_index.get(selected_restaurant)
     
     # Récupérer les données de QuickBooks
     if qb_client:
+        store = get_ledger_store()
+        period = (start_date, end_date)
+        
+        # Les transactions (par défaut) donnent le détail; les rapports, directement les sommes
+        # mensuelles, mais par comptes de revenus plutôt que par factures et écritures
+        sources = {"Transactions (détail)": 'transactions', "Rapports (sommes mensuelles)": 'reports'}
+        source = sources[st.sidebar.radio("Source des données", list(sources))]
+        same_source = st.session_state.get('qbo_source') == source
+        
+        # Une période déjà consultée est relue de la base locale sans appel API
+        period_in_store = (
+            source == 'transactions'
+            and (st.session_state.get('qbo_period') != period or not same_source)
+            and store.covers(st.session_state.realm_id, ['JournalEntry', 'Invoice', 'Purchase'],
+                             start_date, end_date)
+            and store.has_complete_list(st.session_state.realm_id, 'Account')
+        )
+        
+        # Les rapports sont peu coûteux : ils sont redemandés à chaque changement de période
+        report_outdated = source == 'reports' and (
+            st.session_state.get('qbo_period') != period or not same_source
+        )
+        
+        # Des documents filtrés pour un autre restaurant ne peuvent pas être réutilisés
+        filter_outdated = (
+            source == 'transactions'
+            and st.session_state.get('qbo_restaurant_id') not in (None, restaurant_id)
+        )
+        
+        # Hors de la base locale, seuls les documents du restaurant sélectionné sont téléchargés
+        filtered_fetch = (
+            source == 'transactions' and restaurant_id is not None and not period_in_store
+            and not store.covers(st.session_state.realm_id, ['JournalEntry', 'Invoice', 'Purchase'],
+                                 start_date, end_date)
+        )
+        
+        # Par défaut, l'actualisation ne récupère que les modifications depuis la dernière synchronisation
+        # (les rapports n'ont pas de mode : leurs mois terminés restent valides un jour)
+        refresh_modes = {"Modifications seulement": 'changes', "Période complète": 'full'}
+        refresh_mode = None
+        if source == 'transactions':
+            refresh_mode = refresh_modes[st.sidebar.radio("Mode d'actualisation", list(refresh_modes))]
+        
         # Bouton pour récupérer les données
-        if st.sidebar.button("Actualiser les données"):
+        refresh_clicked = st.sidebar.button("Actualiser les données")
+        # Les données sont partagées entre les sessions par compagnie, source et période
+        shared_cache = get_shared_cache()
+        refresh_worker = get_refresh_worker()
+        realm_id = st.session_state.realm_id
+        data_key = (realm_id, source, start_date, end_date, restaurant_id if filtered_fetch else None)
+        background_refresh_mode = 'changes' if source == 'transactions' else None
+        
+        # Sans version en cache, le tableau précalculé chaque nuit (precompute_dashboards.py) est
+        # affiché tel quel; à défaut, une période de mois entiers déjà agrégée est servie par les
+        # agrégats enregistrés, sans récupération ni lecture des documents
+        snapshot, snapshot_age = shared_cache.peek(data_key)
+        precomputed, rollup_cubes = None, None
+        if snapshot is None and not refresh_clicked:
+            precomputed = load_snapshot(realm_id, source, start_date, end_date, selected_restaurant)
+            if precomputed is None:
+                rollup_cubes = load_rollup_cubes(store, realm_id, source, start_date, end_date)
+        
+        # Le trimestre courant et le précédent (tous restaurants) sont tenus à jour en arrière-plan,
+        # ainsi que la période affichée si elle n'est pas précalculée ni servie par les agrégats
+        today = datetime.now()
+        current_quarter = (today.year, (today.month - 1) // 3 + 1)
+        for year, quarter in (current_quarter, previous_quarter(*current_quarter)):
+            warm_start, warm_end = quarter_period(year, quarter)
+            refresh_worker.watch(
+                (realm_id, source, warm_start, warm_end, None),
+                partial(fetch_snapshot, qb_client, store, source, warm_start, warm_end,
+                        refresh_mode=background_refresh_mode)
+            )
+        if precomputed is None and rollup_cubes is None:
+            refresh_worker.watch(
+                data_key,
+                partial(fetch_snapshot, qb_client, store, source, start_date, end_date,
+                        refresh_mode=background_refresh_mode, restaurant_id=data_key[4])
+            )
+        
+        # La dernière version disponible est servie immédiatement, même pendant sa revalidation
+        if snapshot is not None and not refresh_clicked:
+            if st.session_state.get('qbo_data') is not snapshot:
+                st.session_state.qbo_data = snapshot
+                st.session_state.qbo_key = data_key
+                st.session_state.qbo_period = period
+                st.session_state.qbo_source = source
+                st.session_state.qbo_restaurant_id = data_key[4]
+                st.session_state.qbo_version = st.session_state.get('qbo_version', 0) + 1
+            st.sidebar.caption(f"Données de QuickBooks d'il y a {format_age(snapshot_age)}")
+            if refresh_worker.is_stale(data_key):
+                st.sidebar.caption("Actualisation en arrière-plan en cours...")
+            refresh_error = refresh_worker.last_error(data_key)
+            if refresh_error:
+                st.sidebar.warning(f"Échec de l'actualisation en arrière-plan: {refresh_error}")
+        elif precomputed is not None:
+            st.sidebar.caption(f"Tableau précalculé le {precomputed[1]:%Y-%m-%d à %H:%M}")
+        elif rollup_cubes is not None:
+            st.sidebar.caption("Période servie par les agrégats mensuels enregistrés")
+        elif refresh_clicked or period_in_store or report_outdated or filter_outdated:
             with st.spinner("Récupération des données..."):
-                qbo_data = get_qbo_data(qb_client, start_date, end_date)
+                # Une actualisation exige des données récentes; les clics simultanés partagent la même récupération
+                try:
+                    qbo_data, served_from = shared_cache.get(
+                        data_key,
+                        partial(fetch_snapshot, qb_client, store, source, start_date, end_date,
+                                refresh_mode=refresh_mode if refresh_clicked else None,
+                                restaurant_id=data_key[4]),
+                        max_age=SHARED_REFRESH_MAX_AGE if refresh_clicked else None
+                    )
+                except Exception as e:
+                    st.error(f"Erreur lors de la récupération des données QuickBooks: {e}")
+                    qbo_data = None
                 if qbo_data:
+                    # Les sessions gardent une référence aux données partagées, sans copie
                     st.session_state.qbo_data = qbo_data
+                    st.session_state.qbo_key = data_key
+                    st.session_state.qbo_period = period
+                    st.session_state.qbo_source = source
+                    st.session_state.qbo_restaurant_id = data_key[4]
+                    st.session_state.qbo_version = st.session_state.get('qbo_version', 0) + 1
+                    
+                    # Une synchronisation modifie la base locale : les autres périodes de la compagnie sont à relire
+                    if served_from == 'fetch' and refresh_clicked and source == 'transactions':
+                        shared_cache.invalidate(
+                            lambda key: key[:2] == data_key[:2] and key != data_key
+                        )
+                    
                     st.sidebar.success("Données récupérées avec succès!")
+                    if served_from != 'fetch':
+                        st.sidebar.caption(SHARED_SOURCE_LABELS[served_from])
+                    for entity_name, entity_stats in qbo_data['stats'].items():
+                        st.sidebar.caption(format_fetch_stats(entity_name, entity_stats))
+                    if 'months_reused' in qbo_data:
+                        st.sidebar.caption(f"Mois relus des agrégats: {qbo_data['months_reused']}, "
+                                           f"recalculés: {qbo_data['months_computed']}")
+                    st.sidebar.caption(f"Durée totale: {qbo_data['elapsed']:.2f} s")
+                    if getattr(qb_client, 'scheduler', None) is not None:
+                        st.sidebar.caption(format_scheduler_stats(qb_client.scheduler.stats))
                 else:
                     st.sidebar.error("Échec de la récupération des données.")
         
         # Si les données sont disponibles, traiter et afficher
-        if 'qbo_data' in st.session_state:
-            dashboard_data = process_data_for_dashboard(
-                st.session_state.qbo_data, 
-                start_date, 
-                end_date, 
-                selected_restaurant
-            )
+        if precomputed is not None:
+            display_dashboard(precomputed[0], selected_restaurant or "HULL")
+        elif rollup_cubes is not None or 'qbo_data' in st.session_state:
+            # Les agrégats par restaurant font partie des données récupérées (clé 'cube')
+            if rollup_cubes is not None:
+                dashboard_data = get_dashboard(
+                    None, start_date, end_date, selected_restaurant,
+                    cube=rollup_cubes[0], prior_cube=rollup_cubes[1]
+                )
+            else:
+                dashboard_data = get_dashboard(
+                    st.session_state.qbo_data, 
+                    start_date, 
+                    end_date, 
+                    selected_restaurant
+                )
+            
+            cache_misses = DASHBOARD_CACHE_STATS['misses']
+            cache_hits = DASHBOARD_CACHE_STATS['calls'] - cache_misses
+            st.sidebar.caption(f"Cache du tableau de bord: {cache_hits} succès, {cache_misses} échecs")
+            st.sidebar.caption(f"Actualisations en arrière-plan: {refresh_worker.stats['refreshes']} réussies, "
+                               f"{refresh_worker.stats['errors']} échouées")
             
             if dashboard_data:
                 # Afficher le tableau de bord
@@ -608,175 +459,39 @@ def main():
 def generate_demo_data(start_date, end_date, restaurant_name):
     """Génère des données de démonstration pour le tableau de bord"""
     # Générer les mois entre la date de début et de fin
-    months = []
-    current_date = start_date.replace(day=1)
-    while current_date <= end_date:
-        months.append(current_date.strftime('%Y-%m'))
-        # Passer au mois suivant
-        if current_date.month == 12:
-            current_date = current_date.replace(year=current_date.year + 1, month=1)
-        else:
-            current_date = current_date.replace(month=current_date.month + 1)
-    
-    # Simuler des données de ventes mensuelles
-    monthly_data = {}
-    for month in months:
-        # Ventes
-        month_sales = np.random.randint(450000, 600000)
-        prev_month_sales = np.random.randint(400000, 550000)
-        growth = ((month_sales - prev_month_sales) / prev_month_sales * 100)
-        
-        # Coûts des aliments
-        food_costs = {
-            'Perte brute': np.random.randint(2000, 5000),
-            'Perte complétée': np.random.randint(1000, 3000),
-            'Condiments': np.random.randint(3000, 7000),
-            'Aliments employés': np.random.randint(1500, 4000),
-            'STAT': np.random.randint(8000, 15000)
-        }
-        
-        total_food_cost = sum(food_costs.values())
-        food_cost_percent = (total_food_cost / month_sales * 100)
-        
-        # Coûts de main d'oeuvre
-        labour_costs = {
-            'Équipiers': np.random.randint(80000, 100000),
-            'Gestion': np.random.randint(40000, 60000)
-        }
-        
-        total_labour = sum(labour_costs.values())
-        labour_percent = (total_labour / month_sales * 100)
-        
-        # FCFP et Numérique
-        fcfp = np.random.randint(90, 130)
-        numerique = np.random.uniform(15.0, 17.0)
-        
-        monthly_data[month] = {
-            'Ventes': {
-                'Actuel': month_sales,
-                'Année précédente': prev_month_sales,
-                'Croissance': growth
-            },
-            'Coût des aliments': {
-                'Perte brute': food_costs['Perte brute'],
-                'Perte complétée': food_costs['Perte complétée'],
-                'Condiments': food_costs['Condiments'],
-                'Aliments employés': food_costs['Aliments employés'],
-                'STAT': food_costs['STAT'],
-                'Total': total_food_cost,
-                'Pourcentage': food_cost_percent
-            },
-            'Main d\'oeuvre': {
-                'Équipiers': labour_costs['Équipiers'],
-                'Gestion': labour_costs['Gestion'],
-                'Total': total_labour,
-                'Pourcentage': labour_percent
-            },
-            'FCFP': fcfp,
-            'Numérique': numerique
-        }
-    
-    # Calculer le total du trimestre
-    quarter_data = {
-        'Ventes': {
-            'Actuel': sum(monthly_data[month]['Ventes']['Actuel'] for month in months),
-            'Année précédente': sum(monthly_data[month]['Ventes']['Année précédente'] for month in months),
-        },
-        'Coût des aliments': {
-            'Perte brute': sum(monthly_data[month]['Coût des aliments']['Perte brute'] for month in months),
-            'Perte complétée': sum(monthly_data[month]['Coût des aliments']['Perte complétée'] for month in months),
-            'Condiments': sum(monthly_data[month]['Coût des aliments']['Condiments'] for month in months),
-            'Aliments employés': sum(monthly_data[month]['Coût des aliments']['Aliments employés'] for month in months),
-            'STAT': sum(monthly_data[month]['Coût des aliments']['STAT'] for month in months),
-        },
-        'Main d\'oeuvre': {
-            'Équipiers': sum(monthly_data[month]['Main d\'oeuvre']['Équipiers'] for month in months),
-            'Gestion': sum(monthly_data[month]['Main d\'oeuvre']['Gestion'] for month in months),
-        }
-    }
-    
-    # Calculer les totaux et pourcentages pour le trimestre
-    quarter_data['Ventes']['Croissance'] = ((quarter_data['Ventes']['Actuel'] - quarter_data['Ventes']['Année précédente']) / 
-                                           quarter_data['Ventes']['Année précédente'] * 100) if quarter_data['Ventes']['Année précédente'] > 0 else 0
-    
-    quarter_data['Coût des aliments']['Total'] = (quarter_data['Coût des aliments']['Perte brute'] + 
-                                                 quarter_data['Coût des aliments']['Perte complétée'] + 
-                                                 quarter_data['Coût des aliments']['Condiments'] + 
-                                                 quarter_data['Coût des aliments']['Aliments employés'] + 
-                                                 quarter_data['Coût des aliments']['STAT'])
-    
-    quarter_data['Coût des aliments']['Pourcentage'] = (quarter_data['Coût des aliments']['Total'] / 
-                                                       quarter_data['Ventes']['Actuel'] * 100) if quarter_data['Ventes']['Actuel'] > 0 else 0
-    
-    quarter_data['Main d\'oeuvre']['Total'] = (quarter_data['Main d\'oeuvre']['Équipiers'] + 
-                                             quarter_data['Main d\'oeuvre']['Gestion'])
-    
-    quarter_data['Main d\'oeuvre']['Pourcentage'] = (quarter_data['Main d\'oeuvre']['Total'] / 
-                                                   quarter_data['Ventes']['Actuel'] * 100) if quarter_data['Ventes']['Actuel'] > 0 else 0
-    
-    # Calculer le FCFP moyen
-    quarter_data['FCFP'] = sum(monthly_data[month]['FCFP'] for month in months) / len(months) if months else 0
-    
-    # Calculer le numérique moyen
-    quarter_data['Numérique'] = sum(monthly_data[month]['Numérique'] for month in months) / len(months) if months else 0
-    
-    # Ajouter les objectifs
-    objectives = {
-        'Ventes': {
-            'Croissance': 5.5,
-            'Montant': 87482.02
-        },
-        'Coût des aliments': {
-            'Pourcentage': 2.5,
-            'Montant': 33861
-        },
-        'Main d\'oeuvre': {
-            'Pourcentage': 25.0,
-            'Montant': 338613.32
-        },
-        'FCFP': 140,
-        'Numérique': 18.8
-    }
-    
-    # Calculer les différences avec les objectifs
-    differences = {
-        'Ventes': objectives['Ventes']['Croissance'] - quarter_data['Ventes']['Croissance'],
-        'Coût des aliments': objectives['Coût des aliments']['Pourcentage'] - quarter_data['Coût des aliments']['Pourcentage'],
-        'Main d\'oeuvre': objectives['Main d\'oeuvre']['Pourcentage'] - quarter_data['Main d\'oeuvre']['Pourcentage'],
-        'FCFP': objectives['FCFP'] - quarter_data['FCFP'],
-        'Numérique': objectives['Numérique'] - quarter_data['Numérique']
-    }
-    
-    # Définir les valeurs maximales et atteintes
-    maximums = {
-        'Ventes': {'Maximum': 30, 'Atteint': 0 if differences['Ventes'] < 0 else 30},
-        'Coût des aliments': {'Maximum': 15, 'Atteint': 0 if differences['Coût des aliments'] < 0 else 15},
-        'Main d\'oeuvre': {'Maximum': 20, 'Atteint': 20 if abs(differences['Main d\'oeuvre']) <= 1.2 else 0},
-        'FCFP': {'Maximum': 20, 'Atteint': 20},
-        'Numérique': {'Maximum': 15, 'Atteint': 0 if differences['Numérique'] < 0 else 15}
-    }
-    
-    # Rassembler toutes les données
-    dashboard_data = {
-        'monthly': monthly_data,
-        'quarterly': quarter_data,
-        'objectives': objectives,
-        'differences': differences,
-        'maximums': maximums,
-        'months': months
-    }
-    
-    return dashboard_data
+    months = month_range(start_date, end_date)
+    
+    # Simuler les métriques mensuelles, dans l'ordre des colonnes de KPI_INPUTS
+    values = np.empty((len(months), len(KPI_INPUTS)))
+    for i in range(len(months)):
+        values[i] = [
+            np.random.randint(450000, 600000),  # Ventes
+            np.random.randint(400000, 550000),  # Année précédente
+            np.random.randint(2000, 5000),      # Perte brute
+            np.random.randint(1000, 3000),      # Perte complétée
+            np.random.randint(3000, 7000),      # Condiments
+            np.random.randint(1500, 4000),      # Aliments employés
+            np.random.randint(8000, 15000),     # STAT
+            np.random.randint(80000, 100000),   # Équipiers
+            np.random.randint(40000, 60000),    # Gestion
+            np.random.randint(90, 130),         # FCFP
+            np.random.uniform(15.0, 17.0),      # Numérique
+        ]
+    
+    return compute_kpis(months, values)
 
 def display_dashboard(data, restaurant_name):
-    """Affiche le tableau de bord de style 'Résultats HULL'."""
+    """Affiche le tableau de bord de style 'Résultats HULL' à partir d'un DashboardData."""
+    import matplotlib.pyplot as plt
     
     # Titre du tableau de bord
     st.header(f"Résultats {restaurant_name}")
     
     # Structure de base du tableau
-    months = data['months']
-    month_names = [datetime.strptime(m, '%Y-%m').strftime('%B').capitalize() for m in months]
+    months = data.months
+    # L'année est ajoutée au nom des mois quand la période en couvre plusieurs
+    month_format = '%B %Y' if months and months[0][:4] != months[-1][:4] else '%B'
+    month_names = [datetime.strptime(m, '%Y-%m').strftime(month_format).capitalize() for m in months]
     
     # Création du tableau principal
     col_headers = ["Critères"] + month_names + ["T1 (%)"] + ["T1 (%)"]
@@ -862,12 +577,11 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles des ventes
-    for month in months:
-        monthly_sales = data['monthly'][month]['Ventes']['Actuel']
+    for monthly_sales in data.monthly('Ventes', 'Actuel'):
         html_table += f"<td>${monthly_sales:,.0f}</td>"
     
     # Données trimestrielles des ventes
-    quarterly_sales = data['quarterly']['Ventes']['Actuel']
+    quarterly_sales = data.quarterly('Ventes', 'Actuel')
     html_table += f"<td>${quarterly_sales:,.0f}</td><td></td>"
     
     # Objectifs des ventes (vides pour cette ligne)
@@ -883,12 +597,11 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles année précédente
-    for month in months:
-        prev_year_sales = data['monthly'][month]['Ventes']['Année précédente']
+    for prev_year_sales in data.monthly('Ventes', 'Année précédente'):
         html_table += f"<td>${prev_year_sales:,.0f}</td>"
     
     # Données trimestrielles année précédente
-    prev_year_quarterly = data['quarterly']['Ventes']['Année précédente']
+    prev_year_quarterly = data.quarterly('Ventes', 'Année précédente')
     html_table += f"<td>${prev_year_quarterly:,.0f}</td><td></td>"
     
     # Objectifs année précédente (vides)
@@ -904,26 +617,25 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles croissance
-    for month in months:
-        growth = data['monthly'][month]['Ventes']['Croissance']
+    for growth in data.monthly('Ventes', 'Croissance'):
         color = "red" if growth < 0 else "green"
         html_table += f"<td style='color:{color}'>{growth:.2f}%</td>"
     
     # Données trimestrielles croissance
-    quarterly_growth = data['quarterly']['Ventes']['Croissance']
+    quarterly_growth = data.quarterly('Ventes', 'Croissance')
     color = "red" if quarterly_growth < 0 else "green"
     html_table += f"<td style='color:{color}'>{quarterly_growth:.2f}%</td><td></td>"
     
     # Objectifs croissance
-    growth_objective = data['objectives']['Ventes']['Croissance']
-    growth_amount = data['objectives']['Ventes']['Montant']
-    growth_diff = data['differences']['Ventes']
+    growth_objective = data.objectives['Ventes']['Croissance']
+    growth_amount = data.objectives['Ventes']['Montant']
+    growth_diff = data.differences['Ventes']
     color = "red" if growth_diff < 0 else "green"
     html_table += f"<td>{growth_objective:.1f}%</td><td>${growth_amount:,.2f}</td><td style='color:{color}'>{growth_diff:.1f}%</td>"
     
     # Débours croissance
-    growth_max = data['maximums']['Ventes']['Maximum']
-    growth_achieved = data['maximums']['Ventes']['Atteint']
+    growth_max = data.maximums['Ventes']['Maximum']
+    growth_achieved = data.maximums['Ventes']['Atteint']
     html_table += f"<td>{growth_max}%</td><td>{growth_achieved}%</td></tr>"
     
     # Section Coût des aliments
@@ -944,19 +656,13 @@ def display_dashboard(data, restaurant_name):
         """
         
         # Données mensuelles par catégorie
-        for month in months:
-            category_amount = data['monthly'][month]['Coût des aliments'][category]
+        for category_amount in data.monthly('Coût des aliments', category):
             html_table += f"<td>${category_amount:,.0f}</td>"
         
         # Données trimestrielles par catégorie
-        quarterly_category = data['quarterly']['Coût des aliments'][category]
+        quarterly_category = data.quarterly('Coût des aliments', category)
+        category_percent = data.quarterly('Coût des aliments', f"{category} (%)")
         
-        # Calculer le pourcentage par rapport aux ventes pour ce trimestre
-        if data['quarterly']['Ventes']['Actuel'] > 0:
-            category_percent = quarterly_category / data['quarterly']['Ventes']['Actuel'] * 100
-        else:
-            category_percent = 0
-            
         html_table += f"<td>${quarterly_category:,.0f}</td><td>{category_percent:.2f}%</td>"
         
         # Objectifs pour cette catégorie (si disponibles, sinon vides)
@@ -983,16 +689,15 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Totaux mensuels
-    for month in months:
-        total_food_cost = data['monthly'][month]['Coût des aliments']['Total']
+    for total_food_cost in data.monthly('Coût des aliments', 'Total'):
         html_table += f"<td>${total_food_cost:,.0f}</td>"
     
     # Total trimestriel
-    quarterly_food_cost = data['quarterly']['Coût des aliments']['Total']
+    quarterly_food_cost = data.quarterly('Coût des aliments', 'Total')
     html_table += f"<td>${quarterly_food_cost:,.0f}</td><td></td>"
     
     # Objectifs totaux
-    food_cost_obj_amount = data['objectives']['Coût des aliments']['Montant']
+    food_cost_obj_amount = data.objectives['Coût des aliments']['Montant']
     html_table += f"<td></td><td>${food_cost_obj_amount:,.0f}</td><td></td>"
     
     # Débours totaux (vides)
@@ -1005,23 +710,22 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Pourcentages mensuels
-    for month in months:
-        food_cost_percent = data['monthly'][month]['Coût des aliments']['Pourcentage']
+    for food_cost_percent in data.monthly('Coût des aliments', 'Pourcentage'):
         html_table += f"<td>{food_cost_percent:.2f}%</td>"
     
     # Pourcentage trimestriel
-    quarterly_food_cost_percent = data['quarterly']['Coût des aliments']['Pourcentage']
+    quarterly_food_cost_percent = data.quarterly('Coût des aliments', 'Pourcentage')
     html_table += f"<td>{quarterly_food_cost_percent:.2f}%</td><td></td>"
     
     # Objectif pourcentage
-    food_cost_obj_percent = data['objectives']['Coût des aliments']['Pourcentage']
-    food_cost_diff = data['differences']['Coût des aliments']
+    food_cost_obj_percent = data.objectives['Coût des aliments']['Pourcentage']
+    food_cost_diff = data.differences['Coût des aliments']
     color = "green" if food_cost_diff >= 0 else "red"
     html_table += f"<td>{food_cost_obj_percent:.2f}%</td><td></td><td style='color:{color}'>{food_cost_diff:.2f}%</td>"
     
     # Débours pourcentage
-    food_cost_max = data['maximums']['Coût des aliments']['Maximum']
-    food_cost_achieved = data['maximums']['Coût des aliments']['Atteint']
+    food_cost_max = data.maximums['Coût des aliments']['Maximum']
+    food_cost_achieved = data.maximums['Coût des aliments']['Atteint']
     html_table += f"<td>{food_cost_max}%</td><td>{food_cost_achieved}%</td></tr>"
     
     # Section Main d'oeuvre
@@ -1039,12 +743,11 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles Équipiers
-    for month in months:
-        crew_amount = data['monthly'][month]['Main d\'oeuvre']['Équipiers']
+    for crew_amount in data.monthly('Main d\'oeuvre', 'Équipiers'):
         html_table += f"<td>${crew_amount:,.0f}</td>"
     
     # Données trimestrielles Équipiers
-    quarterly_crew = data['quarterly']['Main d\'oeuvre']['Équipiers']
+    quarterly_crew = data.quarterly('Main d\'oeuvre', 'Équipiers')
     html_table += f"<td>${quarterly_crew:,.0f}</td><td></td>"
     
     # Objectifs Équipiers (vides)
@@ -1060,16 +763,11 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Pourcentages mensuels Équipiers
-    for month in months:
-        crew_amount = data['monthly'][month]['Main d\'oeuvre']['Équipiers']
-        sales_amount = data['monthly'][month]['Ventes']['Actuel']
-        crew_percent = (crew_amount / sales_amount * 100) if sales_amount > 0 else 0
+    for crew_percent in data.monthly('Main d\'oeuvre', 'Équipiers (%)'):
         html_table += f"<td>{crew_percent:.1f}%</td>"
     
     # Pourcentage trimestriel Équipiers
-    quarterly_crew = data['quarterly']['Main d\'oeuvre']['Équipiers']
-    quarterly_sales = data['quarterly']['Ventes']['Actuel']
-    quarterly_crew_percent = (quarterly_crew / quarterly_sales * 100) if quarterly_sales > 0 else 0
+    quarterly_crew_percent = data.quarterly('Main d\'oeuvre', 'Équipiers (%)')
     html_table += f"<td>{quarterly_crew_percent:.1f}%</td><td></td>"
     
     # Objectifs Équipiers % (vides)
@@ -1085,12 +783,11 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles Gestion
-    for month in months:
-        mgmt_amount = data['monthly'][month]['Main d\'oeuvre']['Gestion']
+    for mgmt_amount in data.monthly('Main d\'oeuvre', 'Gestion'):
         html_table += f"<td>${mgmt_amount:,.0f}</td>"
     
     # Données trimestrielles Gestion
-    quarterly_mgmt = data['quarterly']['Main d\'oeuvre']['Gestion']
+    quarterly_mgmt = data.quarterly('Main d\'oeuvre', 'Gestion')
     html_table += f"<td>${quarterly_mgmt:,.0f}</td><td></td>"
     
     # Objectifs Gestion (vides)
@@ -1106,15 +803,11 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Pourcentages mensuels Gestion
-    for month in months:
-        mgmt_amount = data['monthly'][month]['Main d\'oeuvre']['Gestion']
-        sales_amount = data['monthly'][month]['Ventes']['Actuel']
-        mgmt_percent = (mgmt_amount / sales_amount * 100) if sales_amount > 0 else 0
+    for mgmt_percent in data.monthly('Main d\'oeuvre', 'Gestion (%)'):
         html_table += f"<td>{mgmt_percent:.1f}%</td>"
     
     # Pourcentage trimestriel Gestion
-    quarterly_mgmt = data['quarterly']['Main d\'oeuvre']['Gestion']
-    quarterly_mgmt_percent = (quarterly_mgmt / quarterly_sales * 100) if quarterly_sales > 0 else 0
+    quarterly_mgmt_percent = data.quarterly('Main d\'oeuvre', 'Gestion (%)')
     html_table += f"<td>{quarterly_mgmt_percent:.1f}%</td><td></td>"
     
     # Objectifs Gestion % (vides)
@@ -1130,16 +823,15 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Totaux mensuels Main d'oeuvre
-    for month in months:
-        total_labour = data['monthly'][month]['Main d\'oeuvre']['Total']
+    for total_labour in data.monthly('Main d\'oeuvre', 'Total'):
         html_table += f"<td>${total_labour:,.0f}</td>"
     
     # Total trimestriel Main d'oeuvre
-    quarterly_labour = data['quarterly']['Main d\'oeuvre']['Total']
+    quarterly_labour = data.quarterly('Main d\'oeuvre', 'Total')
     html_table += f"<td>${quarterly_labour:,.0f}</td><td></td>"
     
     # Objectifs totaux Main d'oeuvre
-    labour_obj_amount = data['objectives']['Main d\'oeuvre']['Montant']
+    labour_obj_amount = data.objectives['Main d\'oeuvre']['Montant']
     html_table += f"<td></td><td>${labour_obj_amount:,.2f}</td><td></td>"
     
     # Débours totaux Main d'oeuvre (vides)
@@ -1152,23 +844,22 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Pourcentages mensuels Main d'oeuvre
-    for month in months:
-        labour_percent = data['monthly'][month]['Main d\'oeuvre']['Pourcentage']
+    for labour_percent in data.monthly('Main d\'oeuvre', 'Pourcentage'):
         html_table += f"<td>{labour_percent:.1f}%</td>"
     
     # Pourcentage trimestriel Main d'oeuvre
-    quarterly_labour_percent = data['quarterly']['Main d\'oeuvre']['Pourcentage']
+    quarterly_labour_percent = data.quarterly('Main d\'oeuvre', 'Pourcentage')
     html_table += f"<td>{quarterly_labour_percent:.1f}%</td><td></td>"
     
     # Objectif pourcentage Main d'oeuvre
-    labour_obj_percent = data['objectives']['Main d\'oeuvre']['Pourcentage']
-    labour_diff = data['differences']['Main d\'oeuvre']
+    labour_obj_percent = data.objectives['Main d\'oeuvre']['Pourcentage']
+    labour_diff = data.differences['Main d\'oeuvre']
     color = "green" if labour_diff >= 0 else "red"
     html_table += f"<td>{labour_obj_percent:.1f}%</td><td></td><td style='color:{color}'>{labour_diff:.1f}%</td>"
     
     # Débours pourcentage Main d'oeuvre
-    labour_max = data['maximums']['Main d\'oeuvre']['Maximum']
-    labour_achieved = data['maximums']['Main d\'oeuvre']['Atteint']
+    labour_max = data.maximums['Main d\'oeuvre']['Maximum']
+    labour_achieved = data.maximums['Main d\'oeuvre']['Atteint']
     html_table += f"<td>{labour_max}%</td><td>{labour_achieved}%</td></tr>"
     
     # Section FCFP
@@ -1178,22 +869,21 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles FCFP
-    for month in months:
-        fcfp_value = data['monthly'][month]['FCFP']
-        html_table += f"<td>{fcfp_value}</td>"
+    for fcfp_value in data.monthly('FCFP'):
+        html_table += f"<td>{fcfp_value:.0f}</td>"
     
     # Donnée trimestrielle FCFP
-    quarterly_fcfp = data['quarterly']['FCFP']
+    quarterly_fcfp = data.quarterly('FCFP')
     html_table += f"<td>{quarterly_fcfp:.0f}</td><td></td>"
     
     # Objectif FCFP
-    fcfp_obj = data['objectives']['FCFP']
-    fcfp_diff = data['differences']['FCFP']
+    fcfp_obj = data.objectives['FCFP']
+    fcfp_diff = data.differences['FCFP']
     html_table += f"<td>{fcfp_obj}</td><td></td><td>{fcfp_diff}</td>"
     
     # Débours FCFP
-    fcfp_max = data['maximums']['FCFP']['Maximum']
-    fcfp_achieved = data['maximums']['FCFP']['Atteint']
+    fcfp_max = data.maximums['FCFP']['Maximum']
+    fcfp_achieved = data.maximums['FCFP']['Atteint']
     html_table += f"<td>{fcfp_max}%</td><td>{fcfp_achieved}%</td></tr>"
     
     # Section Numérique
@@ -1203,23 +893,22 @@ def display_dashboard(data, restaurant_name):
     """
     
     # Données mensuelles Numérique
-    for month in months:
-        numeric_value = data['monthly'][month]['Numérique']
+    for numeric_value in data.monthly('Numérique'):
         html_table += f"<td>{numeric_value:.1f}%</td>"
     
     # Donnée trimestrielle Numérique
-    quarterly_numeric = data['quarterly']['Numérique']
+    quarterly_numeric = data.quarterly('Numérique')
     html_table += f"<td>{quarterly_numeric:.2f}%</td><td></td>"
     
     # Objectif Numérique
-    numeric_obj = data['objectives']['Numérique']
-    numeric_diff = data['differences']['Numérique']
+    numeric_obj = data.objectives['Numérique']
+    numeric_diff = data.differences['Numérique']
     color = "red" if numeric_diff < 0 else "green"
     html_table += f"<td>{numeric_obj:.1f}%</td><td></td><td style='color:{color}'>{numeric_diff:.2f}%</td>"
     
     # Débours Numérique
-    numeric_max = data['maximums']['Numérique']['Maximum']
-    numeric_achieved = data['maximums']['Numérique']['Atteint']
+    numeric_max = data.maximums['Numérique']['Maximum']
+    numeric_achieved = data.maximums['Numérique']['Atteint']
     html_table += f"<td>{numeric_max}%</td><td>{numeric_achieved}%</td></tr>"
     
     # Section Note Atteinte
@@ -1247,8 +936,8 @@ def display_dashboard(data, restaurant_name):
         st.subheader("Évolution des ventes")
         sales_data = {
             'Mois': month_names,
-            'Ventes 2024': [data['monthly'][month]['Ventes']['Actuel'] for month in months],
-            'Ventes année précédente': [data['monthly'][month]['Ventes']['Année précédente'] for month in months]
+            'Ventes 2024': data.monthly('Ventes', 'Actuel'),
+            'Ventes année précédente': data.monthly('Ventes', 'Année précédente')
         }
         sales_df = pd.DataFrame(sales_data)
         
@@ -1274,8 +963,8 @@ def display_dashboard(data, restaurant_name):
         st.subheader("Pourcentages des coûts")
         cost_data = {
             'Mois': month_names,
-            'Coût des aliments (%)': [data['monthly'][month]['Coût des aliments']['Pourcentage'] for month in months],
-            'Main d\'oeuvre (%)': [data['monthly'][month]['Main d\'oeuvre']['Pourcentage'] for month in months],
+            'Coût des aliments (%)': data.monthly('Coût des aliments', 'Pourcentage'),
+            'Main d\'oeuvre (%)': data.monthly('Main d\'oeuvre', 'Pourcentage'),
         }
         cost_df = pd.DataFrame(cost_data)
         
@@ -1290,7 +979,7 @@ def display_dashboard(data, restaurant_name):
         ax.grid(True, linestyle='--', alpha=0.7)
         
         # Ligne d'objectif combiné
-        combined_target = data['objectives']['Coût des aliments']['Pourcentage'] + data['objectives']['Main d\'oeuvre']['Pourcentage']
+        combined_target = data.objectives['Coût des aliments']['Pourcentage'] + data.objectives['Main d\'oeuvre']['Pourcentage']
         ax.axhline(y=combined_target, color='red', linestyle='--', label=f'Objectif combiné ({combined_target}%)')
         
         st.pyplot(fig)
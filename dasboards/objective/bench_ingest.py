@@ -0,0 +1,220 @@
+"""
+Compare l'ingestion des réponses QuickBooks : objets python-quickbooks ou JSON brut.
+
+Des réponses de requête synthétiques (pages de 1000 documents) sont générées
+pour chaque taille, exprimée en lignes de journal. Chaque chemin part du texte
+JSON des pages et produit le DataFrame de lignes aplaties :
+
+- SDK : json.loads, JournalEntry/Invoice/Purchase.from_json, puis flatten_qbo_objects
+  (ci-dessous, l'ancien aplatissement par attributs);
+- JSON brut : analyseur de qbo_fetch (orjson s'il est installé), réduction aux
+  champs déclarés (QboRecord), puis flatten_qbo_json.
+
+    python dasboards/objective/bench_ingest.py [--sizes 10000 100000 1000000] [--skip-sdk-above 100000]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from quickbooks.objects.invoice import Invoice
+from quickbooks.objects.journalentry import JournalEntry
+from quickbooks.objects.purchase import Purchase
+
+from account_index import FOOD_COST, get_account_classifier
+from ledger_engine import SALES_CATEGORY, flatten_qbo_json, ref_name
+from qbo_fetch import QBO_PAGE_SIZE, json_loads, page_records
+
+# Lignes par écriture de journal dans les données synthétiques
+LINES_PER_ENTRY = 4
+
+ENTITY_CLASSES = {'JournalEntry': JournalEntry, 'Invoice': Invoice, 'Purchase': Purchase}
+
+RESTAURANTS = ['HULL', 'GATINEAU', 'OTTAWA', 'MONTREAL']
+ACCOUNT_NUMBERS = ['40100', '51025-1', '51025-2', '51025-3', '51025-4', '51999', '60100', '60200', '70000']
+
+
+def synthetic_pages(n_lines, seed=0):
+    """Génère le texte JSON des pages de requête : clé -> (nom d'entité, [texte de page])."""
+    rnd = random.Random(seed)
+    accounts = {str(i): {'Name': f'Compte {num}', 'Number': num, 'Type': '', 'SubType': ''}
+                for i, num in enumerate(ACCOUNT_NUMBERS)}
+    account_ids = list(accounts)
+
+    def txn_date():
+        return f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+
+    def ref(name):
+        return {'value': str(RESTAURANTS.index(name) + 1), 'name': name}
+
+    n_entries = max(1, n_lines // LINES_PER_ENTRY)
+    documents = {'journal_entries': [], 'invoices': [], 'purchases': []}
+    for i in range(n_entries):
+        documents['journal_entries'].append({
+            'Id': str(i), 'SyncToken': '0', 'TxnDate': txn_date(), 'DocNumber': f'JE-{i}',
+            'PrivateNote': 'Écriture de paie', 'MetaData': {'CreateTime': '2024-01-01T00:00:00-05:00'},
+            'Line': [{
+                'Id': str(j), 'Description': 'Ligne', 'Amount': round(rnd.uniform(1, 1000), 2),
+                'DetailType': 'JournalEntryLineDetail',
+                'JournalEntryLineDetail': {
+                    'PostingType': rnd.choice(['Debit', 'Credit']),
+                    'AccountRef': {'value': rnd.choice(account_ids), 'name': 'Compte'},
+                },
+            } for j in range(LINES_PER_ENTRY)],
+        })
+        if i % 4 == 0:
+            restaurant = rnd.choice(RESTAURANTS)
+            documents['invoices'].append({
+                'Id': str(i), 'SyncToken': '0', 'TxnDate': txn_date(), 'TotalAmt': round(rnd.uniform(1, 5000), 2),
+                'CustomerRef': ref(restaurant), 'Balance': 0, 'DocNumber': f'F-{i}',
+                'Line': [{'Amount': 1.0, 'DetailType': 'SalesItemLineDetail',
+                          'SalesItemLineDetail': {'ItemRef': {'value': '1', 'name': 'Repas'}}}],
+            })
+            documents['purchases'].append({
+                'Id': str(i), 'SyncToken': '0', 'TxnDate': txn_date(), 'TotalAmt': round(rnd.uniform(1, 900), 2),
+                'EntityRef': ref(restaurant), 'PaymentType': 'Cash',
+                'AccountRef': {'value': '99', 'name': 'Caisse'},
+                'Line': [{'Amount': 1.0, 'DetailType': 'AccountBasedExpenseLineDetail',
+                          'AccountBasedExpenseLineDetail': {'AccountRef': {'value': rnd.choice(account_ids)}}}],
+            })
+
+    entity_names = {'journal_entries': 'JournalEntry', 'invoices': 'Invoice', 'purchases': 'Purchase'}
+    pages = {
+        key: (entity_names[key], [
+            json.dumps({'QueryResponse': {entity_names[key]: docs[start:start + QBO_PAGE_SIZE]}})
+            for start in range(0, len(docs), QBO_PAGE_SIZE)
+        ])
+        for key, docs in documents.items()
+    }
+    return pages, accounts
+
+
+def flatten_qbo_objects(qbo_data, classifier=None):
+    """
+    Aplatit des objets python-quickbooks : même résultat que flatten_qbo_json,
+    mais chaque champ est lu par attribut (avec `hasattr`), comme avant le
+    passage au JSON brut.
+    """
+    classifier = classifier or get_account_classifier()
+    account_index = classifier.build_index(qbo_data['accounts'])
+    months, restaurants, categories, amounts = [], [], [], []
+
+    # Traiter les journaux
+    for entry in qbo_data['journal_entries']:
+        month = entry.TxnDate[:7]
+        restaurant = ref_name(getattr(entry, 'EntityRef', None))
+        for line in entry.Line:
+            detail = getattr(line, 'JournalEntryLineDetail', None)
+            account_ref = getattr(detail, 'AccountRef', None)
+            if account_ref is None:
+                continue
+
+            classification = account_index.get(account_ref.value)
+            if classification is None:
+                continue
+            category = classification[1]
+
+            amount = float(line.Amount) if hasattr(line, 'Amount') else 0.0
+            if detail.PostingType == "Credit":
+                amount = -amount
+
+            months.append(month)
+            restaurants.append(restaurant)
+            categories.append(category)
+            amounts.append(amount)
+
+    # Traiter les factures pour les ventes
+    for invoice in qbo_data['invoices']:
+        if hasattr(invoice, 'TotalAmt'):
+            months.append(invoice.TxnDate[:7])
+            restaurants.append(ref_name(getattr(invoice, 'CustomerRef', None)))
+            categories.append(SALES_CATEGORY)
+            amounts.append(float(invoice.TotalAmt))
+
+    # Traiter les achats pour les coûts : catégorie de la première ligne de coût des aliments
+    for purchase in qbo_data['purchases']:
+        if hasattr(purchase, 'TotalAmt'):
+            category = 'Autre'
+            for line in getattr(purchase, 'Line', []):
+                detail = getattr(line, 'AccountBasedExpenseLineDetail', None)
+                account_ref = getattr(detail, 'AccountRef', None)
+                if account_ref is None:
+                    continue
+                classification = account_index.get(account_ref.value)
+                if classification is not None and classification[0] == FOOD_COST:
+                    category = classification[1]
+                    break
+
+            months.append(purchase.TxnDate[:7])
+            restaurants.append(ref_name(getattr(purchase, 'EntityRef', None)))
+            categories.append(category)
+            amounts.append(float(purchase.TotalAmt))
+
+    return pd.DataFrame({
+        'Month': pd.Categorical(months),
+        'Restaurant': pd.Categorical(restaurants),
+        'Category': pd.Categorical(categories),
+        'Amount': np.asarray(amounts, dtype=np.float64),
+    })
+
+
+def ingest_sdk(pages, accounts):
+    """Chemin SDK : objets python-quickbooks complets, puis flatten_qbo_objects."""
+    qbo_data = {'accounts': accounts}
+    for key, (entity_name, texts) in pages.items():
+        entity_cls = ENTITY_CLASSES[entity_name]
+        qbo_data[key] = [entity_cls.from_json(data)
+                         for text in texts for data in json.loads(text)['QueryResponse'][entity_name]]
+    return flatten_qbo_objects(qbo_data)
+
+
+def ingest_raw(pages, accounts):
+    """Chemin JSON brut : documents réduits aux champs déclarés, puis flatten_qbo_json."""
+    qbo_data = {'accounts': accounts}
+    for key, (entity_name, texts) in pages.items():
+        entity_cls = ENTITY_CLASSES[entity_name]
+        qbo_data[key] = [record for text in texts
+                         for record in page_records(entity_cls, json_loads(text)['QueryResponse'])]
+    return flatten_qbo_json(qbo_data)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-sdk-above", type=int, default=None,
+                        help="ne pas mesurer le chemin SDK au-delà de ce nombre de lignes")
+    args = parser.parse_args()
+
+    print(f"Analyseur JSON: {json_loads.__module__}")
+
+    # Préchauffage : règles de comptes et premiers appels hors mesure
+    warmup_pages, warmup_accounts = synthetic_pages(1000)
+    ingest_raw(warmup_pages, warmup_accounts)
+    ingest_sdk(warmup_pages, warmup_accounts)
+
+    for n_lines in args.sizes:
+        pages, accounts = synthetic_pages(n_lines)
+        raw_lines, raw_seconds = timed(ingest_raw, pages, accounts)
+        message = f"{n_lines:>9} lignes: JSON brut {raw_seconds:7.2f} s"
+
+        if args.skip_sdk_above is None or n_lines <= args.skip_sdk_above:
+            sdk_lines, sdk_seconds = timed(ingest_sdk, pages, accounts)
+            if not sdk_lines.astype(str).equals(raw_lines.astype(str)):
+                print(f"ÉCHEC: les deux chemins diffèrent pour {n_lines} lignes")
+                return 1
+            message += f", SDK {sdk_seconds:7.2f} s (x{sdk_seconds / raw_seconds:.1f})"
+        print(message)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Mesure le temps de démarrage à froid de app_dashboard.py.
+
+Chaque mesure importe le module dans un nouvel interpréteur. Le script échoue
+(code de sortie 1) si la médiane dépasse le budget ou si une bibliothèque censée
+être chargée à la demande (QuickBooks, OAuth, graphiques) est importée au démarrage.
+Le budget par défaut est de 1.5 s (variable d'environnement JACMAR_COLD_START_BUDGET).
+
+    python dasboards/objective/bench_startup.py [--runs 5] [--budget 1.5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Budget de démarrage à froid par défaut, en secondes
+COLD_START_BUDGET = float(os.environ.get("JACMAR_COLD_START_BUDGET", "1.5"))
+
+# Modules qui ne doivent pas être chargés à l'import de l'application
+# (sous-modules, car Streamlit peut déjà exposer le paquet d'espace de noms intuitlib)
+LAZY_MODULES = ['quickbooks.objects', 'intuitlib.client', 'matplotlib.pyplot', 'seaborn']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app_dashboard
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure_import(app_dir):
+    """Importe app_dashboard dans un nouvel interpréteur et retourne la mesure."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=app_dir, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=COLD_START_BUDGET)
+    args = parser.parse_args()
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = [measure_import(app_dir) for _ in range(args.runs)]
+    timings = [sample['elapsed'] for sample in samples]
+    loaded = sorted({module for sample in samples for module in sample['loaded']})
+    median = statistics.median(timings)
+
+    print(f"Import de app_dashboard: médiane {median:.3f} s, min {min(timings):.3f} s, "
+          f"max {max(timings):.3f} s ({args.runs} mesures, budget {args.budget:.2f} s)")
+
+    failed = False
+    if median > args.budget:
+        print(f"ÉCHEC: démarrage à froid au-dessus du budget ({median:.3f} s > {args.budget:.2f} s)")
+        failed = True
+    if loaded:
+        print(f"ÉCHEC: modules chargés au démarrage: {', '.join(loaded)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Client QuickBooks simulé pour les tests.
+
+FakeQboClient répond aux requêtes (query, batch), au point d'accès CDC et aux
+rapports ProfitAndLoss à partir de documents JSON en mémoire, et garde la liste
+des requêtes reçues.
+make_documents génère des documents reproductibles (graine fixe).
+"""
+import json
+import random
+import re
+
+import pytest
+
+RESTAURANTS = ['GATINEAU', 'HULL', 'MONTREAL', 'OTTAWA']
+
+# Comptes couvrant chaque règle de classification, plus un compte non suivi
+ACCOUNT_NUMBERS = ['40100', '51025-1', '51025-2', '51025-3', '51025-4', '51999', '60100', '60200', '70000']
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+        self.text = self.content.decode()
+        self.headers = {}
+
+
+class FakeQboClient:
+    """Client brut (process_request, change_data_capture, get_report) servi par des documents en mémoire."""
+
+    company_id = '123'
+    api_url = 'https://quickbooks.test/v3'
+    minorversion = 75
+
+    def __init__(self, documents, changes=None, reports=None):
+        self.documents = documents
+        self.changes = changes or {}
+        self.reports = reports or []
+        self.queries = []
+        self.batches = []
+        self.report_requests = []
+
+    def process_request(self, method, url, headers=None, params=None, data=None):
+        if url.endswith('/query'):
+            return FakeResponse({'QueryResponse': self.query(data)})
+        items = json.loads(data)['BatchItemRequest']
+        self.batches.append([item['Query'] for item in items])
+        return FakeResponse({'BatchItemResponse': [
+            {'bId': item['bId'], 'QueryResponse': self.query(item['Query'])} for item in items
+        ]})
+
+    def query(self, query):
+        self.queries.append(query)
+        entity = query.split(' FROM ')[1].split()[0]
+        start = int(re.search(r'STARTPOSITION (\d+)', query).group(1))
+        size = int(re.search(r'MAXRESULTS (\d+)', query).group(1))
+        rows = self.documents.get(entity, [])
+        dates = re.search(r"TxnDate >= '([\d-]+)' AND TxnDate <= '([\d-]+)'", query)
+        if dates:
+            rows = [row for row in rows if dates.group(1) <= row['TxnDate'] <= dates.group(2)]
+        ref = re.search(r"(CustomerRef|EntityRef) = '(\w+)'", query)
+        if ref:
+            rows = [row for row in rows if row.get(ref.group(1), {}).get('value') == ref.group(2)]
+        return {entity: rows[start - 1:start - 1 + size]}
+
+    def change_data_capture(self, entity_names, changed_since):
+        return {'CDCResponse': [{'QueryResponse': [
+            {name: self.changes[name]} for name in entity_names.split(',') if name in self.changes
+        ]}]}
+
+    def get_report(self, name, params):
+        """Rapport ventilé par client : sommes (compte, restaurant) des montants de la période."""
+        self.report_requests.append((params['start_date'], params['end_date']))
+        sums = {}
+        for day, account_id, restaurant, amount in self.reports:
+            if params['start_date'] <= day <= params['end_date']:
+                sums.setdefault(account_id, {}).setdefault(restaurant, 0.0)
+                sums[account_id][restaurant] += amount
+        columns = ([{'ColType': 'Account'}]
+                   + [{'ColType': 'Money', 'ColTitle': restaurant} for restaurant in RESTAURANTS]
+                   + [{'ColType': 'Money', 'ColTitle': 'Total',
+                       'MetaData': [{'Name': 'ColKey', 'Value': 'total'}]}])
+        rows = []
+        for account_id, amounts in sorted(sums.items()):
+            cells = [{'value': f"{amounts.get(restaurant, 0.0):.2f}"} for restaurant in RESTAURANTS]
+            cells.append({'value': f"{sum(amounts.values()):.2f}"})
+            rows.append({'type': 'Data', 'ColData': [{'value': f"A{account_id}", 'id': account_id}] + cells})
+        return {'Columns': {'Column': columns}, 'Rows': {'Row': [{'Rows': {'Row': rows}, 'type': 'Section'}]}}
+
+
+def make_accounts():
+    return [{'Id': str(i), 'SyncToken': '0', 'Name': f"A{i}", 'AcctNum': number,
+             'AccountType': 'Expense', 'Active': True}
+            for i, number in enumerate(ACCOUNT_NUMBERS)]
+
+
+def make_documents(n=200, seed=1, years=(2023, 2024)):
+    """Génère journaux, factures et achats (et leurs comptes et clients) répartis sur `years`."""
+    rnd = random.Random(seed)
+    account_ids = [str(i) for i in range(len(ACCOUNT_NUMBERS))]
+
+    def txn_date():
+        return f"{rnd.choice(years)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+
+    def restaurant_ref():
+        index = rnd.randrange(len(RESTAURANTS))
+        return {'value': str(index + 1), 'name': RESTAURANTS[index]}
+
+    journal_entries, invoices, purchases = [], [], []
+    for i in range(n):
+        lines = [{'Amount': rnd.randint(1, 1000), 'DetailType': 'JournalEntryLineDetail',
+                  'JournalEntryLineDetail': {'PostingType': rnd.choice(['Credit', 'Debit']),
+                                             'AccountRef': {'value': rnd.choice(account_ids)}}}
+                 for _ in range(3)]
+        lines.append({'DetailType': 'DescriptionOnly', 'Description': 'note'})
+        # Un journal QuickBooks n'a pas de référence de client au niveau du document
+        journal_entries.append({'Id': str(i), 'SyncToken': '0', 'TxnDate': txn_date(), 'Line': lines})
+        invoices.append({'Id': str(i), 'SyncToken': '0', 'TxnDate': txn_date(),
+                         'TotalAmt': rnd.randint(1, 5000), 'CustomerRef': restaurant_ref()})
+        purchases.append({'Id': str(i), 'SyncToken': '0', 'TxnDate': txn_date(),
+                          'TotalAmt': rnd.randint(1, 900), 'EntityRef': restaurant_ref(),
+                          'Line': [{'Amount': 1, 'DetailType': 'AccountBasedExpenseLineDetail',
+                                    'AccountBasedExpenseLineDetail': {
+                                        'AccountRef': {'value': rnd.choice(account_ids)}}}
+                                   for _ in range(2)]})
+    customers = [{'Id': str(i + 1), 'SyncToken': '0', 'DisplayName': name, 'Active': True}
+                 for i, name in enumerate(RESTAURANTS)]
+    return {'JournalEntry': journal_entries, 'Invoice': invoices, 'Purchase': purchases,
+            'Account': make_accounts(), 'Customer': customers}
+
+
+def make_report_entries(n=300, seed=2, years=(2023, 2024)):
+    """Génère des montants (jour, Id du compte, restaurant, montant) pour les rapports simulés."""
+    rnd = random.Random(seed)
+    return [(f"{rnd.choice(years)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+             str(rnd.randrange(len(ACCOUNT_NUMBERS))), rnd.choice(RESTAURANTS),
+             float(rnd.randint(1, 500)))
+            for _ in range(n)]
+
+
+@pytest.fixture
+def documents():
+    return make_documents()
+
+
+@pytest.fixture
+def client(documents):
+    return FakeQboClient(documents)
+
+
+@pytest.fixture
+def store(tmp_path):
+    from ledger_store import LedgerStore
+
+    store = LedgerStore(str(tmp_path / 'ledger.sqlite3'))
+    yield store
+    store.close()
@@ -0,0 +1,443 @@
+"""
+Récupération des données QuickBooks et calcul du tableau de bord, sans Streamlit.
+
+Ce module est partagé par l'application (app_dashboard), son actualisation en
+arrière-plan et le précalcul hors ligne (precompute_dashboards). Les erreurs de
+QuickBooks ou de la base locale sont propagées à l'appelant, qui les affiche
+(application) ou les journalise (précalcul).
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+
+from kpi_engine import compute_kpis, kpi_matrix
+from ledger_columns import LedgerColumns
+from ledger_engine import (
+    CATEGORIES, SALES_CATEGORY, contiguous_months, flatten_qbo_json, full_months, lines_fingerprint,
+    month_bounds, month_range, prior_year_period, snapshot_fingerprint
+)
+from qbo_fetch import (
+    add_fetch_stats, fetch_all, fetch_batched, fetch_concurrently, fetch_with_store, new_fetch_stats,
+    sync_changes, txn_date_clause
+)
+from rollup_cube import RollupCube
+
+# Documents récupérés pour chaque période, et préfixe des clés de l'année précédente
+DOCUMENT_KEYS = ['journal_entries', 'invoices', 'purchases']
+PRIOR_YEAR_PREFIX = 'prior_year_'
+
+# Documents fournisseurs récupérés en mode batch sur demande
+BATCH_DOCUMENT_KEYS = ['bills', 'vendor_credits']
+
+# Champ de référence du restaurant (client QuickBooks) filtrable dans les requêtes
+RESTAURANT_FILTER_FIELDS = {'Invoice': 'CustomerRef', 'Purchase': 'EntityRef'}
+
+# Durée de validité des agrégats enregistrés par source, en secondes (None : jusqu'à
+# leur retrait par la base locale, dès qu'un document de leur mois change)
+ROLLUP_MAX_AGE = {'reports': 24 * 3600, 'transactions': None}
+
+
+def build_account_map(accounts):
+    """Crée le dictionnaire de mappage des comptes : Id -> nom, numéro, type, sous-type."""
+    account_map = {}
+    for account in accounts:
+        account_map[account.Id] = {
+            'Name': account.Name,
+            'Number': account.AcctNum if hasattr(account, 'AcctNum') else '',
+            'Type': account.AccountType,
+            'SubType': account.AccountSubType if hasattr(account, 'AccountSubType') else ''
+        }
+    return account_map
+
+
+# Fonction pour obtenir les données QuickBooks
+def get_qbo_data(client, start_date, end_date, account_refs=None, store=None,
+                 refresh_mode=None, prior_year=False, batch=False, restaurant_id=None,
+                 supplier_documents=False):
+    """
+    Récupère les données financières de QuickBooks pour la période spécifiée.
+
+    Les requêtes sont paginées (STARTPOSITION) pour ne jamais tronquer les résultats.
+    Toutes les pages d'une entité sont gardées (listes de QboRecord) avant
+    l'aplatissement : la mémoire de la récupération croît avec la période, seule la
+    forme gardée ensuite (LedgerColumns, cube) est compacte.
+    Avec une base locale `store`, seules
+    les plages de dates qu'elle ne contient pas encore sont demandées à QuickBooks;
+    `refresh_mode` vaut alors 'changes' pour n'y appliquer que les modifications
+    depuis la dernière synchronisation (CDC), ou 'full' pour récupérer toute la période.
+    Avec `prior_year=True`, la même période de l'année précédente est récupérée en
+    parallèle et retournée sous la clé 'prior_year'.
+    Avec `batch=True`, les requêtes sont regroupées dans des appels au point d'accès
+    batch; avec `supplier_documents=True`, les factures fournisseurs ('bills') et les
+    crédits fournisseurs ('vendor_credits') y sont ajoutés, mais aucun calcul du
+    tableau de bord ne les lit. Les clients (restaurants) ne sont pas récupérés ici :
+    leur index (get_restaurant_index de l'application) sert à filtrer la requête
+    avant qu'elle parte.
+    Avec `restaurant_id` (Id du client QuickBooks), les factures et achats sont
+    filtrés par QuickBooks sur ce restaurant; ignoré avec `store`, dont les
+    documents doivent rester complets.
+    Les compteurs par entité (pages, lignes, temps) sont disponibles sous la clé 'stats'.
+    """
+    if not client:
+        return None
+
+    from quickbooks.objects.account import Account
+    from quickbooks.objects.bill import Bill
+    from quickbooks.objects.invoice import Invoice
+    from quickbooks.objects.journalentry import JournalEntry
+    from quickbooks.objects.purchase import Purchase
+    from quickbooks.objects.vendorcredit import VendorCredit
+
+    entity_classes = {'journal_entries': JournalEntry, 'invoices': Invoice, 'purchases': Purchase}
+
+    # Entités filtrées par date : clé -> (classe, début, fin)
+    dated_entities = {
+        key: (entity_cls, start_date, end_date) for key, entity_cls in entity_classes.items()
+    }
+    if prior_year:
+        prev_year_start, prev_year_end = prior_year_period(start_date, end_date)
+        dated_entities.update({
+            PRIOR_YEAR_PREFIX + key: (entity_cls, prev_year_start, prev_year_end)
+            for key, entity_cls in entity_classes.items()
+        })
+    list_entities = {'accounts': (Account, "Active = true")}
+
+    if batch and supplier_documents:
+        entity_classes.update({'bills': Bill, 'vendor_credits': VendorCredit})
+        dated_entities.update({
+            'bills': (Bill, start_date, end_date),
+            'vendor_credits': (VendorCredit, start_date, end_date),
+        })
+    fetcher = fetch_batched if batch else fetch_concurrently
+
+    # Requêtes QuickBooks équivalentes, avec les dates au format QuickBooks
+    entity_queries = {
+        key: (entity_cls, txn_date_clause(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+        for key, (entity_cls, start, end) in dated_entities.items()
+    }
+    entity_queries.update(list_entities)
+
+    # Filtrer les documents du restaurant sélectionné côté QuickBooks
+    if restaurant_id and store is None:
+        for key, (entity_cls, where_clause) in entity_queries.items():
+            field = RESTAURANT_FILTER_FIELDS.get(entity_cls.qbo_object_name)
+            if field:
+                entity_queries[key] = (entity_cls, f"{where_clause} AND {field} = '{restaurant_id}'")
+
+    stats = {key: new_fetch_stats() for key in entity_queries}
+    started = time.perf_counter()
+
+    # Récupérer les transactions de ventes, coûts, etc.
+    if store is not None:
+        if refresh_mode == 'changes':
+            sync_changes(store, client, {
+                **entity_classes,
+                **{key: entity_cls for key, (entity_cls, _) in list_entities.items()}
+            }, stats)
+        elif refresh_mode == 'full':
+            # L'année précédente, close, reste servie par la base locale
+            for entity_cls in entity_classes.values():
+                store.uncover(str(client.company_id), entity_cls.qbo_object_name, start_date, end_date)
+
+        # Seules les plages absentes de la base locale sont récupérées
+        results = fetch_with_store(store, client, dated_entities, list_entities, stats, fetcher)
+    else:
+        # Toutes les requêtes s'exécutent en parallèle sur le même client, ou par lots
+        results = fetcher(entity_queries, client, stats)
+
+    account_map = build_account_map(results['accounts'])
+
+    qbo_data = {key: results[key] for key in DOCUMENT_KEYS}
+    qbo_data.update({key: results[key] for key in BATCH_DOCUMENT_KEYS if key in results})
+    qbo_data.update({
+        'accounts': account_map,
+        'stats': stats,
+        'elapsed': time.perf_counter() - started
+    })
+    if 'rollup_generation' in results:
+        qbo_data['rollup_generation'] = results['rollup_generation']
+    if PRIOR_YEAR_PREFIX + DOCUMENT_KEYS[0] in results:
+        qbo_data['prior_year'] = {key: results[PRIOR_YEAR_PREFIX + key] for key in DOCUMENT_KEYS}
+        qbo_data['prior_year']['accounts'] = account_map
+    qbo_data['fingerprint'] = snapshot_fingerprint(qbo_data)
+    return qbo_data
+
+
+# Fonction pour récupérer les agrégats mensuels par les rapports QuickBooks
+def get_report_data(client, start_date, end_date, prior_year=False):
+    """
+    Récupère les sommes mois × restaurant × compte depuis les rapports ProfitAndLoss.
+
+    Un rapport par mois remplace le téléchargement de tous les documents. Le
+    résultat a la forme compacte de compact_qbo_data ('lines' et, avec
+    `prior_year`, 'prior_year'), sans documents : le détail des transactions
+    reste accessible par get_qbo_data.
+    """
+    from quickbooks.objects.account import Account
+    from qbo_reports import profit_and_loss_lines
+
+    stats = {'accounts': new_fetch_stats(), 'reports': new_fetch_stats()}
+    started = time.perf_counter()
+
+    account_map = build_account_map(fetch_all(Account, client, "Active = true", stats=stats['accounts']))
+
+    lines = profit_and_loss_lines(client, start_date, end_date, account_map, stats['reports'])
+    report_data = {'lines': LedgerColumns.from_lines(lines), 'accounts': account_map}
+    fingerprint = lines_fingerprint(lines)
+    if prior_year:
+        prior_lines = profit_and_loss_lines(client, *prior_year_period(start_date, end_date),
+                                            account_map, stats['reports'])
+        report_data['prior_year'] = {'lines': LedgerColumns.from_lines(prior_lines)}
+        fingerprint += lines_fingerprint(prior_lines)
+
+    report_data.update({
+        'stats': stats,
+        'elapsed': time.perf_counter() - started,
+        'fingerprint': fingerprint
+    })
+    return report_data
+
+
+# Synchronisation de la base locale, hors d'une récupération de période
+def sync_store_changes(client, store, stats):
+    """
+    Applique à la base locale les modifications QuickBooks faites depuis la dernière
+    synchronisation, pour les entités lues par le tableau de bord.
+    """
+    from quickbooks.objects.account import Account
+    from quickbooks.objects.invoice import Invoice
+    from quickbooks.objects.journalentry import JournalEntry
+    from quickbooks.objects.purchase import Purchase
+
+    entities = {'journal_entries': JournalEntry, 'invoices': Invoice, 'purchases': Purchase, 'accounts': Account}
+    for key in entities:
+        stats.setdefault(key, new_fetch_stats())
+    sync_changes(store, client, entities, stats)
+
+
+# Fonction pour récupérer une période longue mois par mois
+def fetch_month_rollups(client, store, source, start_date, end_date, refresh_mode=None):
+    """
+    Récupère une période de mois entiers sous forme de cube d'agrégats, mois par mois.
+
+    Les mois terminés dont les agrégats sont enregistrés (et valides, voir
+    ROLLUP_MAX_AGE) sont relus de la base locale; seuls les autres (mois en cours,
+    mois jamais agrégés ou invalidés par une modification) sont récupérés par
+    suites de mois consécutifs, puis agrégés et enregistrés. Les mois de l'année
+    précédente font partie du même cube. `refresh_mode` vaut 'changes' (les modifications
+    depuis la dernière synchronisation retirent les agrégats des mois touchés) ou
+    'full' (les mois de la période sont récupérés à nouveau; ceux de l'année
+    précédente, clos, restent servis par la base locale). Les erreurs sont propagées.
+    """
+    from quickbooks.objects.account import Account
+    from qbo_reports import profit_and_loss_lines
+
+    realm_id = str(client.company_id)
+    period_months = set(month_range(start_date, end_date))
+    months = sorted(period_months | set(month_range(*prior_year_period(start_date, end_date))))
+    current_month = datetime.now().strftime('%Y-%m')
+    stats = {}
+    started = time.perf_counter()
+
+    if source == 'transactions' and refresh_mode == 'changes':
+        sync_store_changes(client, store, stats)
+
+    # Mois terminés déjà agrégés, sauf ceux de la période lors d'une actualisation complète
+    refreshed = period_months if refresh_mode == 'full' else set()
+    stored, rows = store.load_available_rollup(
+        realm_id, source, [month for month in months if month < current_month and month not in refreshed],
+        ROLLUP_MAX_AGE[source]
+    )
+    cubes = [RollupCube.from_rows(sorted(stored), rows)]
+
+    # Les autres mois sont récupérés, agrégés et, une fois terminés, enregistrés, par suites
+    # de mois consécutifs à actualiser ou non
+    missing = [month for month in months if month not in stored]
+    runs = ([(run, True) for run in contiguous_months([month for month in missing if month in refreshed])]
+            + [(run, False) for run in contiguous_months([month for month in missing if month not in refreshed])])
+    account_map = None
+    for run, full_refresh in runs:
+        run_start, run_end = month_bounds(run[0])[0], month_bounds(run[-1])[1]
+        if source == 'reports':
+            if account_map is None:
+                stats.update({'accounts': new_fetch_stats(), 'reports': new_fetch_stats()})
+                account_map = build_account_map(
+                    fetch_all(Account, client, "Active = true", stats=stats['accounts'])
+                )
+            lines = profit_and_loss_lines(client, run_start, run_end, account_map, stats['reports'])
+        else:
+            fetched = get_qbo_data(client, run_start, run_end, store=store, batch=True,
+                                   refresh_mode='full' if full_refresh else None)
+            if not fetched:
+                return None
+            for key, key_stats in fetched['stats'].items():
+                add_fetch_stats(stats.setdefault(key, new_fetch_stats()), key_stats)
+            lines = flatten_qbo_json(fetched)
+
+        cube = RollupCube.from_lines(lines, run)
+        closed = [month for month in run if month < current_month]
+        if closed:
+            # Pas d'enregistrement si une synchronisation concurrente a modifié des documents
+            store.save_rollup(realm_id, source, closed, cube.to_rows(closed),
+                              generation=None if source == 'reports' else fetched['rollup_generation'])
+        cubes.append(cube)
+
+    cube = RollupCube.combine(cubes, months)
+    return {
+        'cube': cube,
+        'prior_year': {'cube': cube},
+        'stats': stats,
+        'elapsed': time.perf_counter() - started,
+        'fingerprint': cube.fingerprint,
+        'months_reused': len(stored),
+        'months_computed': len(months) - len(stored),
+    }
+
+
+# Forme compacte gardée en session : lignes en colonnes numpy, sans les documents
+def compact_qbo_data(qbo_data):
+    """
+    Remplace les documents de `qbo_data` par leurs lignes aplaties en LedgerColumns.
+
+    Le résultat garde les comptes, les compteurs, la durée, l'empreinte et la
+    génération des agrégats, et l'année précédente sous la même forme
+    ({'lines': ...} sous 'prior_year').
+    """
+    compact = {
+        'lines': LedgerColumns.from_lines(flatten_qbo_json(qbo_data, detail=True)),
+        'accounts': qbo_data['accounts'],
+    }
+    if qbo_data.get('prior_year'):
+        compact['prior_year'] = {
+            'lines': LedgerColumns.from_lines(flatten_qbo_json(qbo_data['prior_year'], detail=True))
+        }
+    for key in ('stats', 'elapsed', 'fingerprint', 'rollup_generation'):
+        if key in qbo_data:
+            compact[key] = qbo_data[key]
+    return compact
+
+
+def fetch_snapshot(client, store, source, start_date, end_date, refresh_mode=None, restaurant_id=None):
+    """
+    Récupère les données compactes d'une période pour le cache partagé.
+
+    `source` vaut 'reports' (rapports ProfitAndLoss) ou 'transactions' (documents,
+    par la base locale `store`, ou filtrés par QuickBooks sur `restaurant_id`).
+    Le résultat porte le cube d'agrégats de la période (et de l'année précédente)
+    sous la clé 'cube'; sans filtre par restaurant, ceux des mois terminés sont
+    enregistrés dans `store`, et une période de mois entiers est récupérée mois
+    par mois (voir fetch_month_rollups). Les erreurs sont propagées.
+    Utilisable hors session (actualisation en arrière-plan).
+    """
+    if restaurant_id is None and full_months(start_date, end_date) == month_range(start_date, end_date):
+        return fetch_month_rollups(client, store, source, start_date, end_date, refresh_mode)
+    if source == 'reports':
+        snapshot = get_report_data(client, start_date, end_date, prior_year=True)
+    elif restaurant_id is not None:
+        fetched = get_qbo_data(client, start_date, end_date, prior_year=True, batch=True,
+                               restaurant_id=restaurant_id)
+        snapshot = compact_qbo_data(fetched) if fetched else None
+    else:
+        fetched = get_qbo_data(client, start_date, end_date, store=store, refresh_mode=refresh_mode,
+                               prior_year=True, batch=True)
+        snapshot = compact_qbo_data(fetched) if fetched else None
+    if not snapshot:
+        return None
+
+    prior_start, prior_end = prior_year_period(start_date, end_date)
+    snapshot['cube'] = build_rollup_cube(snapshot, start_date, end_date)
+    if snapshot.get('prior_year'):
+        snapshot['prior_year']['cube'] = build_rollup_cube(snapshot['prior_year'], prior_start, prior_end)
+
+    # Des documents filtrés sur un restaurant ne donnent pas les agrégats de la compagnie
+    if restaurant_id is None:
+        current_month = datetime.now().strftime('%Y-%m')
+        realm_id = str(client.company_id)
+        for data, (period_start, period_end) in ((snapshot, (start_date, end_date)),
+                                                 (snapshot.get('prior_year'), (prior_start, prior_end))):
+            months = [month for month in full_months(period_start, period_end) if month < current_month]
+            if data and months:
+                store.save_rollup(realm_id, source, months, data['cube'].to_rows(months),
+                                  generation=snapshot.get('rollup_generation'))
+    return snapshot
+
+
+def load_rollup_cubes(store, realm_id, source, start_date, end_date):
+    """
+    Retourne (cube de la période, cube de l'année précédente) à partir des agrégats
+    enregistrés, sans lire les documents, ou None si la période n'est pas faite de
+    mois entiers ou si l'un de ses mois n'a pas d'agrégats valides.
+    """
+    months = month_range(start_date, end_date)
+    if full_months(start_date, end_date) != months:
+        return None
+    prior_months = month_range(*prior_year_period(start_date, end_date))
+    rows = store.load_rollup(realm_id, source, months, ROLLUP_MAX_AGE[source])
+    prior_rows = store.load_rollup(realm_id, source, prior_months, ROLLUP_MAX_AGE[source])
+    if rows is None or prior_rows is None:
+        return None
+    return RollupCube.from_rows(months, rows), RollupCube.from_rows(prior_months, prior_rows)
+
+
+# Fonction pour traiter les données et créer le tableau de bord
+def build_rollup_cube(qbo_data, start_date, end_date):
+    """Agrège une fois pour toutes les données de la période par mois, restaurant et catégorie."""
+    if 'lines' in qbo_data:
+        lines = qbo_data['lines'].to_frame()
+    else:
+        lines = flatten_qbo_json(qbo_data)
+    return RollupCube.from_lines(lines, month_range(start_date, end_date))
+
+
+def process_data_for_dashboard(qbo_data, start_date, end_date, selected_restaurant=None, cube=None,
+                               prior_cube=None):
+    """
+    Traite les données de QuickBooks pour les adapter au format du tableau de bord.
+
+    Les montants sont lus dans les cubes d'agrégats (voir build_rollup_cube) de
+    la période et de l'année précédente : ceux de `qbo_data['cube']` par défaut,
+    ou `cube` et `prior_cube`, ce qui permet de servir une période à partir des
+    agrégats enregistrés sans `qbo_data`. Les ventes de l'année précédente valent
+    0 si cette période n'a pas été récupérée.
+    """
+    if not qbo_data and cube is None:
+        return None
+
+    # Générer les mois entre la date de début et de fin
+    months = month_range(start_date, end_date)
+    prev_months = month_range(*prior_year_period(start_date, end_date))
+
+    # Agrégats par restaurant, calculés une seule fois par récupération
+    if cube is None:
+        cube = qbo_data.get('cube') or build_rollup_cube(qbo_data, start_date, end_date)
+    if prior_cube is None and qbo_data and qbo_data.get('prior_year'):
+        prior_cube = (qbo_data['prior_year'].get('cube')
+                      or build_rollup_cube(qbo_data['prior_year'], *prior_year_period(start_date, end_date)))
+
+    # Matrice mois × catégorie du restaurant sélectionné et ventes de l'année précédente,
+    # rattachées au mois correspondant de la période
+    sales = CATEGORIES.index(SALES_CATEGORY)
+    matrix = cube.matrix(months, selected_restaurant)
+    prior_sales = 0.0
+    if prior_cube is not None:
+        prior_sales = prior_cube.matrix(prev_months, selected_restaurant)[:, sales]
+
+    # Ajouter les données FCFP de Clearview et le pourcentage numérique (simulés ici)
+    fcfp, numerique = [], []
+    for month in months:
+        fcfp.append(np.random.randint(90, 130))
+        numerique.append(np.random.uniform(15.0, 17.0))
+
+    # Totaux de la période par les sommes cumulées des cubes, sans relire les mois
+    totals = None
+    if months:
+        prior_total = 0.0
+        if prior_cube is not None:
+            prior_total = prior_cube.period_totals(prev_months[0], prev_months[-1], selected_restaurant)[sales]
+        totals = kpi_matrix(
+            [cube.period_totals(months[0], months[-1], selected_restaurant)],
+            prior_total, np.mean(fcfp), np.mean(numerique)
+        )[0]
+
+    return compute_kpis(months, kpi_matrix(matrix, prior_sales, fcfp, numerique), totals)
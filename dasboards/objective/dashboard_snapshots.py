@@ -0,0 +1,160 @@
+"""
+Tableaux de bord précalculés, enregistrés sur disque (voir precompute_dashboards.py).
+
+Chaque exécution écrit une version complète dans son propre répertoire
+(<racine>/<realm>/<source>/<version>/) : un fichier .npy par période, qui empile
+les matrices indicateur × période (DashboardData.values) de tous ses restaurants,
+et un manifeste JSON (mois, restaurants, écarts aux objectifs, points). Le
+fichier LATEST de la compagnie et de la source est remplacé en dernier, de façon
+atomique : un lecteur voit toujours une version complète. Les matrices sont
+relues en mémoire projetée (np.load(mmap_mode='r')), sans copie.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from kpi_engine import DashboardData
+
+# Version du format des fichiers (un lecteur ignore les versions qu'il ne connaît pas)
+SNAPSHOT_FORMAT = 1
+
+# Emplacement par défaut des tableaux précalculés (modifiable par variable d'environnement)
+DEFAULT_SNAPSHOT_DIR = os.environ.get(
+    "JACMAR_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+)
+
+# Nombre de versions gardées par compagnie et source (les plus anciennes sont supprimées)
+SNAPSHOT_KEEP_VERSIONS = 3
+
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+
+# Version publiée déjà lue, par compagnie et source : répertoire des versions ->
+# (répertoire de la version, (manifeste, index des périodes, matrices projetées)).
+# Une nouvelle version remplace la précédente, dont les projections sont libérées.
+_VERSIONS = {}
+_VERSIONS_LOCK = threading.Lock()
+
+
+def period_key(start_date, end_date):
+    """Retourne la clé d'une période ('AAAA-MM-JJ_AAAA-MM-JJ'), pour date ou datetime."""
+    return f"{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}"
+
+
+def snapshot_dir(realm_id, source, root=DEFAULT_SNAPSHOT_DIR):
+    """Retourne le répertoire des versions d'une compagnie et d'une source."""
+    return os.path.join(root, str(realm_id), source)
+
+
+def write_snapshots(realm_id, source, periods, root=DEFAULT_SNAPSHOT_DIR, keep=SNAPSHOT_KEEP_VERSIONS):
+    """
+    Enregistre une nouvelle version des tableaux précalculés et la publie.
+
+    `periods` est une liste de (début, fin, {restaurant: DashboardData}), le
+    restaurant None désignant tous les restaurants; les tableaux d'une période
+    ont les mêmes mois. Retourne le répertoire de la version publiée.
+    """
+    base = snapshot_dir(realm_id, source, root)
+    generated_at = datetime.now()
+    version = generated_at.strftime('%Y%m%dT%H%M%S%f') + f"-{os.getpid()}"
+    version_dir = os.path.join(base, version)
+    os.makedirs(version_dir)
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'realm_id': str(realm_id),
+        'source': source,
+        'generated_at': generated_at.isoformat(timespec='seconds'),
+        'periods': [],
+    }
+    for start_date, end_date, dashboards in periods:
+        key = period_key(start_date, end_date)
+        restaurants = list(dashboards)
+        np.save(os.path.join(version_dir, f"{key}.npy"),
+                np.stack([dashboards[restaurant].values for restaurant in restaurants]))
+        first = dashboards[restaurants[0]]
+        manifest['periods'].append({
+            'key': key,
+            'file': f"{key}.npy",
+            'months': first.months,
+            'restaurants': restaurants,
+            'differences': [dashboards[restaurant].differences for restaurant in restaurants],
+            'maximums': [dashboards[restaurant].maximums for restaurant in restaurants],
+        })
+    with open(os.path.join(version_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    # Publication atomique : LATEST désigne la nouvelle version une fois celle-ci complète
+    latest_tmp = os.path.join(base, f"{LATEST_FILE}.{os.getpid()}.tmp")
+    with open(latest_tmp, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(base, LATEST_FILE))
+
+    # Les versions projetées en mémoire par un lecteur restent lisibles après leur suppression
+    versions = sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+    for name in versions[:-keep] if keep else []:
+        if name != version:
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+    return version_dir
+
+
+def _load_version(base, version_dir):
+    """
+    Lit (et garde, à la place de la précédente) la version publiée d'une compagnie et
+    d'une source; retourne None si son format est inconnu.
+    """
+    with _VERSIONS_LOCK:
+        entry = _VERSIONS.get(base)
+        if entry is not None and entry[0] == version_dir:
+            return entry[1]
+    with open(os.path.join(version_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    loaded = None
+    if manifest.get('format') == SNAPSHOT_FORMAT:
+        loaded = (manifest, {period['key']: period for period in manifest['periods']}, {})
+    with _VERSIONS_LOCK:
+        entry = _VERSIONS.get(base)
+        if entry is not None and entry[0] == version_dir:
+            return entry[1]
+        _VERSIONS[base] = (version_dir, loaded)
+    return loaded
+
+
+def load_snapshot(realm_id, source, start_date, end_date, restaurant=None, root=DEFAULT_SNAPSHOT_DIR):
+    """
+    Retourne (DashboardData, date de génération) du tableau précalculé d'une
+    période et d'un restaurant (None pour tous), ou None s'il n'y en a pas.
+
+    La matrice du tableau est une vue en mémoire projetée du fichier .npy de la
+    version publiée, en lecture seule.
+    """
+    base = snapshot_dir(realm_id, source, root)
+    try:
+        with open(os.path.join(base, LATEST_FILE), encoding='utf-8') as f:
+            version_dir = os.path.join(base, f.read().strip())
+        loaded = _load_version(base, version_dir)
+    except (OSError, ValueError):
+        return None
+    if loaded is None:
+        return None
+
+    manifest, periods, arrays = loaded
+    period = periods.get(period_key(start_date, end_date))
+    if period is None or restaurant not in period['restaurants']:
+        return None
+    i = period['restaurants'].index(restaurant)
+    try:
+        with _VERSIONS_LOCK:
+            values = arrays.get(period['key'])
+            if values is None:
+                values = arrays[period['key']] = np.load(os.path.join(version_dir, period['file']),
+                                                         mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    data = DashboardData(values[i], list(period['months']), period['differences'][i], period['maximums'][i])
+    return data, datetime.fromisoformat(manifest['generated_at'])
@@ -0,0 +1,204 @@
+"""
+Calcul des indicateurs du tableau de bord à partir d'une matrice mois × métrique.
+
+Les données QuickBooks et les données de démonstration sont d'abord réduites à
+la même matrice (voir KPI_INPUTS); les totaux, pourcentages, écarts aux
+objectifs et points atteints sont ensuite calculés par opérations numpy sur
+toutes les périodes à la fois et gardés dans une matrice indicateur × période
+(DashboardData).
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+from ledger_engine import FOOD_COST_CATEGORIES, LABOUR_CATEGORIES, SALES_CATEGORY
+
+# Colonne des ventes de la même période l'année précédente
+PRIOR_SALES = 'Année précédente'
+
+# Colonnes de la matrice d'entrée, dans cet ordre
+KPI_INPUTS = [SALES_CATEGORY, PRIOR_SALES] + FOOD_COST_CATEGORIES + LABOUR_CATEGORIES + ['FCFP', 'Numérique']
+
+SALES = KPI_INPUTS.index(SALES_CATEGORY)
+PRIOR = KPI_INPUTS.index(PRIOR_SALES)
+FOOD_COSTS = [KPI_INPUTS.index(category) for category in FOOD_COST_CATEGORIES]
+LABOUR_COSTS = [KPI_INPUTS.index(category) for category in LABOUR_CATEGORIES]
+FCFP = KPI_INPUTS.index('FCFP')
+DIGITAL = KPI_INPUTS.index('Numérique')
+
+# Objectifs du trimestre
+OBJECTIVES = {
+    'Ventes': {
+        'Croissance': 5.5,
+        'Montant': 87482.02
+    },
+    'Coût des aliments': {
+        'Pourcentage': 2.5,
+        'Montant': 33861
+    },
+    'Main d\'oeuvre': {
+        'Pourcentage': 25.0,
+        'Montant': 338613.32
+    },
+    'FCFP': 140,
+    'Numérique': 18.8
+}
+
+
+def kpi_matrix(category_matrix, prior_sales, fcfp, numerique):
+    """
+    Assemble la matrice d'entrée (mois × KPI_INPUTS).
+
+    `category_matrix` contient les colonnes de ledger_engine.CATEGORIES (une
+    ligne par mois); `prior_sales`, `fcfp` et `numerique` une valeur par mois.
+    """
+    category_matrix = np.asarray(category_matrix, dtype=np.float64)
+    values = np.empty((len(category_matrix), len(KPI_INPUTS)), dtype=np.float64)
+    values[:, [SALES] + FOOD_COSTS + LABOUR_COSTS] = category_matrix
+    values[:, PRIOR] = prior_sales
+    values[:, FCFP] = fcfp
+    values[:, DIGITAL] = numerique
+    return values
+
+
+def ratio_percent(numerator, denominator):
+    """Retourne numerator / denominator en pourcentage, 0 où le dénominateur n'est pas positif."""
+    numerator, denominator = np.asarray(numerator), np.asarray(denominator)
+    positive = denominator > 0
+    safe_denominator = np.where(positive, denominator, 1.0)
+    return np.where(positive, numerator / safe_denominator * 100, 0.0)
+
+
+# Indicateurs calculés, (section, nom) dans l'ordre des lignes de DashboardData.values;
+# le nom None désigne un indicateur sans sous-clé (FCFP, Numérique)
+METRICS = (
+    [('Ventes', 'Actuel'), ('Ventes', 'Année précédente'), ('Ventes', 'Croissance')]
+    + [('Coût des aliments', category) for category in FOOD_COST_CATEGORIES]
+    + [('Coût des aliments', 'Total'), ('Coût des aliments', 'Pourcentage')]
+    + [('Main d\'oeuvre', category) for category in LABOUR_CATEGORIES]
+    + [('Main d\'oeuvre', 'Total'), ('Main d\'oeuvre', 'Pourcentage')]
+    + [('FCFP', None), ('Numérique', None)]
+    + [('Coût des aliments', f"{category} (%)") for category in FOOD_COST_CATEGORIES]
+    + [('Main d\'oeuvre', f"{category} (%)") for category in LABOUR_CATEGORIES]
+)
+METRIC_INDEX = {metric: row for row, metric in enumerate(METRICS)}
+
+# Période des totaux du trimestre, ajoutée après les mois
+QUARTER_PERIOD = 'Trimestre'
+
+# Clés de la vue dictionnaire de DashboardData
+DASHBOARD_KEYS = ('monthly', 'quarterly', 'objectives', 'differences', 'maximums', 'months')
+
+
+class DashboardData(Mapping):
+    """
+    Indicateurs du tableau de bord sous forme de matrice indicateur × période.
+
+    `values[METRIC_INDEX[(section, nom)], j]` est la valeur d'un indicateur pour
+    la période `periods[j]` (les mois, puis QUARTER_PERIOD). L'objet se lit aussi
+    comme l'ancien dictionnaire ({'monthly', 'quarterly', ...}), reconstruit à la
+    demande; il se sérialise en un seul tableau numpy.
+    """
+
+    __slots__ = ('values', 'months', 'differences', 'maximums')
+
+    def __init__(self, values, months, differences, maximums):
+        self.values = values
+        self.months = months
+        self.differences = differences
+        self.maximums = maximums
+
+    @property
+    def periods(self):
+        return self.months + [QUARTER_PERIOD]
+
+    @property
+    def objectives(self):
+        return OBJECTIVES
+
+    def monthly(self, section, name=None):
+        """Retourne les valeurs mensuelles d'un indicateur (tableau numpy)."""
+        return self.values[METRIC_INDEX[(section, name)], :-1]
+
+    def quarterly(self, section, name=None):
+        """Retourne la valeur trimestrielle d'un indicateur."""
+        return float(self.values[METRIC_INDEX[(section, name)], -1])
+
+    def period(self, column):
+        """Retourne le dictionnaire {section: {nom: valeur}} d'une colonne de la matrice."""
+        data = {}
+        for (section, name), value in zip(METRICS, self.values[:, column].tolist()):
+            if name is None:
+                data[section] = value
+            else:
+                data.setdefault(section, {})[name] = value
+        return data
+
+    def __getitem__(self, key):
+        if key == 'monthly':
+            return {month: self.period(i) for i, month in enumerate(self.months)}
+        if key == 'quarterly':
+            return self.period(-1)
+        if key in DASHBOARD_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(DASHBOARD_KEYS)
+
+    def __len__(self):
+        return len(DASHBOARD_KEYS)
+
+
+def period_metrics(inputs):
+    """Calcule la matrice indicateur × période (lignes METRICS) à partir des entrées période × KPI_INPUTS."""
+    sales, prior = inputs[:, SALES], inputs[:, PRIOR]
+    food, labour = inputs[:, FOOD_COSTS], inputs[:, LABOUR_COSTS]
+    food_total, labour_total = food.sum(axis=1), labour.sum(axis=1)
+    return np.vstack([
+        sales, prior, ratio_percent(sales - prior, prior),
+        *food.T, food_total, ratio_percent(food_total, sales),
+        *labour.T, labour_total, ratio_percent(labour_total, sales),
+        inputs[:, FCFP], inputs[:, DIGITAL],
+        *ratio_percent(food.T, sales), *ratio_percent(labour.T, sales),
+    ])
+
+
+def compute_kpis(months, values, totals=None):
+    """
+    Calcule le tableau de bord à partir de la matrice d'entrée (voir kpi_matrix).
+
+    `totals` (une ligne KPI_INPUTS) donne les totaux du trimestre déjà calculés,
+    par exemple par les sommes cumulées d'un cube d'agrégats; à défaut, ils sont
+    la somme des mois. Retourne un DashboardData, lisible comme le dictionnaire
+    {'monthly', 'quarterly', 'objectives', 'differences', 'maximums', 'months'}.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(len(months), len(KPI_INPUTS))
+
+    # Totaux du trimestre, ajoutés comme dernière période; FCFP et Numérique sont des moyennes
+    if totals is None:
+        totals = values.sum(axis=0)
+        totals[[FCFP, DIGITAL]] /= max(len(months), 1)
+    metrics = period_metrics(np.vstack([values, totals]))
+
+    quarter = {metric: float(metrics[row, -1]) for metric, row in METRIC_INDEX.items()}
+
+    # Calculer les différences avec les objectifs
+    differences = {
+        'Ventes': OBJECTIVES['Ventes']['Croissance'] - quarter[('Ventes', 'Croissance')],
+        'Coût des aliments': OBJECTIVES['Coût des aliments']['Pourcentage'] - quarter[('Coût des aliments', 'Pourcentage')],
+        'Main d\'oeuvre': OBJECTIVES['Main d\'oeuvre']['Pourcentage'] - quarter[('Main d\'oeuvre', 'Pourcentage')],
+        'FCFP': OBJECTIVES['FCFP'] - quarter[('FCFP', None)],
+        'Numérique': OBJECTIVES['Numérique'] - quarter[('Numérique', None)]
+    }
+
+    # Définir les valeurs maximales et atteintes
+    maximums = {
+        'Ventes': {'Maximum': 30, 'Atteint': 0 if differences['Ventes'] < 0 else 30},
+        'Coût des aliments': {'Maximum': 15, 'Atteint': 0 if differences['Coût des aliments'] < 0 else 15},
+        'Main d\'oeuvre': {'Maximum': 20, 'Atteint': 20 if abs(differences['Main d\'oeuvre']) <= 1.2 else 0},
+        'FCFP': {'Maximum': 20, 'Atteint': 20},
+        'Numérique': {'Maximum': 15, 'Atteint': 0 if differences['Numérique'] < 0 else 15}
+    }
+
+    return DashboardData(metrics, list(months), differences, maximums)
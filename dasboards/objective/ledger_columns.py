@@ -0,0 +1,79 @@
+"""
+Représentation compacte en colonnes des lignes QuickBooks gardées en session.
+
+Les documents récupérés sont aplatis dès leur arrivée puis réduits à quelques
+tableaux numpy : jour de transaction (int32, jours depuis 1970-01-01),
+restaurant, compte et catégorie codés (avec leurs libellés une seule fois) et
+montant. La session ne garde que cette structure, pas les documents.
+"""
+import numpy as np
+import pandas as pd
+
+
+def categorical_codes(values):
+    """Retourne (codes, libellés) d'une colonne catégorielle (-1 pour les valeurs manquantes)."""
+    values = values if isinstance(values, pd.Categorical) else pd.Categorical(values)
+    return np.asarray(values.codes), list(values.categories)
+
+
+class LedgerColumns:
+    """Lignes aplaties (jour, restaurant, compte, catégorie, montant) sous forme de tableaux numpy."""
+
+    __slots__ = ('day', 'restaurant', 'restaurant_names', 'account', 'account_ids',
+                 'category', 'category_names', 'amount')
+
+    def __init__(self, day, restaurant, restaurant_names, account, account_ids,
+                 category, category_names, amount):
+        self.day = day
+        self.restaurant = restaurant
+        self.restaurant_names = restaurant_names
+        self.account = account
+        self.account_ids = account_ids
+        self.category = category
+        self.category_names = category_names
+        self.amount = amount
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        Construit la structure à partir des lignes aplaties détaillées
+        (flatten_qbo_json(..., detail=True) : colonnes Date, Restaurant, Account, Category, Amount).
+        """
+        date_codes, dates = categorical_codes(lines['Date'].array)
+        date_days = pd.to_datetime(pd.Index(dates, dtype=object)).values.astype('datetime64[D]').astype(np.int64)
+        restaurant, restaurant_names = categorical_codes(lines['Restaurant'].array)
+        account, account_ids = categorical_codes(lines['Account'].array)
+        category, category_names = categorical_codes(lines['Category'].array)
+        return cls(
+            day=date_days[date_codes].astype(np.int32),
+            restaurant=restaurant, restaurant_names=restaurant_names,
+            account=account, account_ids=account_ids,
+            category=category, category_names=category_names,
+            amount=np.asarray(lines['Amount'], dtype=np.float64),
+        )
+
+    def __len__(self):
+        return len(self.amount)
+
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les tableaux et les libellés, en octets."""
+        arrays = (self.day, self.restaurant, self.account, self.category, self.amount)
+        labels = self.restaurant_names + self.account_ids + self.category_names
+        return sum(array.nbytes for array in arrays) + sum(len(str(label)) for label in labels)
+
+    def months(self):
+        """Retourne le mois ('AAAA-MM') de chaque ligne, en catégorie."""
+        month_values = self.day.astype('datetime64[D]').astype('datetime64[M]')
+        unique_months, month_codes = np.unique(month_values, return_inverse=True)
+        return pd.Categorical.from_codes(month_codes.reshape(-1),
+                                         np.datetime_as_string(unique_months, unit='M'))
+
+    def to_frame(self):
+        """Reconstruit le DataFrame de lignes (Month, Restaurant, Category, Amount) attendu par ledger_engine."""
+        return pd.DataFrame({
+            'Month': self.months(),
+            'Restaurant': pd.Categorical.from_codes(self.restaurant, self.restaurant_names),
+            'Category': pd.Categorical.from_codes(self.category, self.category_names),
+            'Amount': self.amount,
+        })
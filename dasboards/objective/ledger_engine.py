@@ -0,0 +1,224 @@
+"""
+Moteur d'agrégation en colonnes des données QuickBooks.
+
+Chaque ligne de document est aplatie une seule fois en colonnes typées
+(mois, restaurant, catégorie, montant), puis sommée en une passe par mois,
+restaurant et catégorie dans un cube d'agrégats (voir rollup_cube).
+"""
+import calendar
+import hashlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from account_index import FOOD_COST, get_account_classifier
+
+# Catégories de coût des aliments affichées dans le tableau de bord
+FOOD_COST_CATEGORIES = ['Perte brute', 'Perte complétée', 'Condiments', 'Aliments employés', 'STAT']
+
+# Catégories de main d'oeuvre affichées dans le tableau de bord
+LABOUR_CATEGORIES = ['Équipiers', 'Gestion']
+
+# Colonnes de la matrice mois × catégorie
+SALES_CATEGORY = 'Ventes'
+CATEGORIES = [SALES_CATEGORY] + FOOD_COST_CATEGORIES + LABOUR_CATEGORIES
+
+# Clé des agrégats tous restaurants confondus
+ALL_RESTAURANTS = 'Tous'
+
+
+def month_range(start_date, end_date):
+    """Retourne les mois ('AAAA-MM') entre la date de début et la date de fin."""
+    months = []
+    current_date = start_date.replace(day=1)
+    while current_date <= end_date:
+        months.append(current_date.strftime('%Y-%m'))
+        # Passer au mois suivant
+        if current_date.month == 12:
+            current_date = current_date.replace(year=current_date.year + 1, month=1)
+        else:
+            current_date = current_date.replace(month=current_date.month + 1)
+    return months
+
+
+def full_months(start_date, end_date):
+    """Retourne les mois ('AAAA-MM') entièrement compris entre la date de début et la date de fin."""
+    start_str, end_str = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    return [
+        month for month in month_range(start_date, end_date)
+        if start_str <= f"{month}-01"
+        and f"{month}-{calendar.monthrange(int(month[:4]), int(month[5:]))[1]:02d}" <= end_str
+    ]
+
+
+def month_bounds(month):
+    """Retourne (premier jour, dernier jour) d'un mois ('AAAA-MM'), en datetime."""
+    year, month_number = int(month[:4]), int(month[5:7])
+    return (datetime(year, month_number, 1),
+            datetime(year, month_number, calendar.monthrange(year, month_number)[1]))
+
+
+def contiguous_months(months):
+    """Regroupe des mois ('AAAA-MM') triés en suites de mois consécutifs."""
+    runs = []
+    for month in months:
+        # Le mois suivant le dernier de la suite commence le lendemain de son dernier jour
+        if runs and (month_bounds(runs[-1][-1])[1] + timedelta(days=1)).strftime('%Y-%m') == month:
+            runs[-1].append(month)
+        else:
+            runs.append([month])
+    return runs
+
+
+def ref_name(ref):
+    """Retourne le nom d'une référence QuickBooks (objet Ref, dictionnaire ou None)."""
+    if ref is None:
+        return None
+    if isinstance(ref, dict):
+        return ref.get('name')
+    return getattr(ref, 'name', None)
+
+
+def snapshot_fingerprint(qbo_data):
+    """
+    Calcule une empreinte du contenu des données récupérées.
+
+    Seuls l'Id et le SyncToken de chaque document (incrémenté par QuickBooks à
+    chaque modification) et le plan comptable sont hachés : l'empreinte change
+    dès qu'un document est ajouté, modifié ou supprimé.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for key in ('journal_entries', 'invoices', 'purchases'):
+        digest.update(key.encode())
+        for document in qbo_data[key]:
+            digest.update(f"{document.Id}:{getattr(document, 'SyncToken', '')};".encode())
+    digest.update(repr(sorted(qbo_data['accounts'].items())).encode())
+    if qbo_data.get('prior_year'):
+        digest.update(snapshot_fingerprint(qbo_data['prior_year']).encode())
+    return digest.hexdigest()
+
+
+def lines_fingerprint(lines):
+    """Calcule une empreinte du contenu d'un DataFrame de lignes aplaties."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(lines, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def document_json(document):
+    """Retourne le dictionnaire JSON d'un document (QboRecord, objet python-quickbooks ou dictionnaire)."""
+    return document if isinstance(document, dict) else document.to_dict()
+
+
+def flatten_qbo_json(qbo_data, classifier=None, detail=False):
+    """
+    Aplatit les documents QuickBooks à partir de leur JSON brut.
+
+    Colonnes : Month ('AAAA-MM'), Restaurant, Category (voir CATEGORIES, ou
+    'Autre' pour les achats non classés) et Amount (float64). Les crédits de
+    journal sont négatifs, comme dans le calcul d'origine. Les comptes sont
+    classés une seule fois par `classifier` (règles de account_rules.json par défaut).
+    Les champs sont lus directement dans les dictionnaires de la réponse de
+    requête : aucun objet n'est créé et aucune vérification `hasattr` n'est faite
+    par ligne (bench_ingest.py compare ce chemin à celui des objets
+    python-quickbooks). Avec `detail=True`, les colonnes Date ('AAAA-MM-JJ') et
+    Account (Id du compte classé, absent pour les factures) sont ajoutées.
+    """
+    classifier = classifier or get_account_classifier()
+    account_index = classifier.build_index(qbo_data['accounts'])
+    dates, restaurants, accounts, categories, amounts = [], [], [], [], []
+    add_date, add_restaurant, add_account = dates.append, restaurants.append, accounts.append
+    add_category, add_amount = categories.append, amounts.append
+
+    # Traiter les journaux
+    for entry in map(document_json, qbo_data['journal_entries']):
+        txn_date = entry['TxnDate']
+        restaurant = ref_name(entry.get('EntityRef'))
+        for line in entry.get('Line') or ():
+            line_detail = line.get('JournalEntryLineDetail')
+            account_ref = line_detail.get('AccountRef') if line_detail else None
+            if not account_ref:
+                continue
+
+            account_id = account_ref.get('value')
+            classification = account_index.get(account_id)
+            if classification is None:
+                continue
+
+            amount = float(line.get('Amount') or 0.0)
+            if line_detail.get('PostingType') == "Credit":
+                amount = -amount
+
+            add_date(txn_date)
+            add_restaurant(restaurant)
+            add_account(account_id)
+            add_category(classification[1])
+            add_amount(amount)
+
+    # Traiter les factures pour les ventes
+    for invoice in map(document_json, qbo_data['invoices']):
+        if 'TotalAmt' in invoice:
+            add_date(invoice['TxnDate'])
+            add_restaurant(ref_name(invoice.get('CustomerRef')))
+            add_account(None)
+            add_category(SALES_CATEGORY)
+            add_amount(float(invoice['TotalAmt']))
+
+    # Traiter les achats pour les coûts : catégorie de la première ligne de coût des aliments
+    for purchase in map(document_json, qbo_data['purchases']):
+        if 'TotalAmt' in purchase:
+            category, account_id = 'Autre', None
+            for line in purchase.get('Line') or ():
+                line_detail = line.get('AccountBasedExpenseLineDetail')
+                account_ref = line_detail.get('AccountRef') if line_detail else None
+                if not account_ref:
+                    continue
+                classification = account_index.get(account_ref.get('value'))
+                if classification is not None and classification[0] == FOOD_COST:
+                    category, account_id = classification[1], account_ref.get('value')
+                    break
+
+            add_date(purchase['TxnDate'])
+            add_restaurant(ref_name(purchase.get('EntityRef')))
+            add_account(account_id)
+            add_category(category)
+            add_amount(float(purchase['TotalAmt']))
+
+    # Le mois est déduit des dates distinctes plutôt que de chaque ligne
+    date_column = pd.Categorical(dates)
+    date_months = np.array([day[:7] for day in date_column.categories], dtype=object)
+    months, month_codes = np.unique(date_months, return_inverse=True)
+
+    lines = {
+        'Month': pd.Categorical.from_codes(month_codes.reshape(-1)[date_column.codes], months),
+        'Restaurant': pd.Categorical(restaurants),
+        'Category': pd.Categorical(categories),
+        'Amount': np.asarray(amounts, dtype=np.float64),
+    }
+    if detail:
+        lines['Date'] = date_column
+        lines['Account'] = pd.Categorical(accounts)
+    return pd.DataFrame(lines)
+
+
+def prior_year_period(start_date, end_date):
+    """Retourne la même période un an plus tôt (le 29 février devient le 28)."""
+    def previous_year(day):
+        try:
+            return day.replace(year=day.year - 1)
+        except ValueError:
+            return day.replace(year=day.year - 1, day=28)
+    return previous_year(start_date), previous_year(end_date)
+
+
+def quarter_period(year, quarter):
+    """Retourne (premier jour, dernier jour) d'un trimestre (1 à 4), en datetime."""
+    start = datetime(year, 3 * quarter - 2, 1)
+    end_month = 3 * quarter
+    return start, datetime(year, end_month, calendar.monthrange(year, end_month)[1])
+
+
+def previous_quarter(year, quarter):
+    """Retourne (année, trimestre) du trimestre précédent."""
+    return (year, quarter - 1) if quarter > 1 else (year - 1, 4)
@@ -0,0 +1,438 @@
+"""
+Stockage local persistant des documents QuickBooks (SQLite).
+
+Les documents sont indexés par realm_id, type d'entité et date de transaction.
+Une table de couverture garde les plages de dates déjà récupérées, ce qui permet
+à `get_qbo_data` de ne demander à QuickBooks que les plages manquantes; une autre,
+les entités sans date (ex. comptes) dont la liste complète a été enregistrée.
+Les agrégats mensuels (voir rollup_cube) y sont aussi enregistrés par source;
+ceux calculés à partir des documents sont retirés dès qu'un document de leur
+mois change, et chaque retrait incrémente une génération : des agrégats calculés
+sur des documents lus avant un retrait ne sont pas enregistrés.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from qbo_fields import QboRecord
+
+# Emplacement par défaut de la base locale (modifiable par variable d'environnement)
+DEFAULT_STORE_PATH = os.environ.get(
+    "JACMAR_LEDGER_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ledger_store.sqlite")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    realm_id TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    id TEXT NOT NULL,
+    txn_date TEXT,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (realm_id, entity, id)
+);
+CREATE INDEX IF NOT EXISTS documents_by_date ON documents (realm_id, entity, txn_date);
+CREATE TABLE IF NOT EXISTS coverage (
+    realm_id TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_by_entity ON coverage (realm_id, entity);
+CREATE TABLE IF NOT EXISTS list_coverage (
+    realm_id TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    PRIMARY KEY (realm_id, entity)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    realm_id TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    realm_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    month TEXT NOT NULL,
+    restaurant TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (realm_id, source, month, restaurant, category)
+);
+CREATE TABLE IF NOT EXISTS rollup_months (
+    realm_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    month TEXT NOT NULL,
+    computed_at REAL NOT NULL,
+    PRIMARY KEY (realm_id, source, month)
+);
+CREATE TABLE IF NOT EXISTS rollup_generation (
+    realm_id TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+"""
+
+# Source des agrégats calculés à partir des documents de la base
+DOCUMENT_ROLLUP_SOURCE = 'transactions'
+
+# Nombre d'Id par requête lors de la recherche des mois des documents modifiés
+ROLLUP_ID_CHUNK = 500
+
+# Les comptes déterminent la classification : leur modification invalide tous les agrégats
+CLASSIFICATION_ENTITY = 'Account'
+
+
+def as_date(value):
+    """Convertit une date, un datetime ou une chaîne ISO en date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def serialize_qbo_object(obj):
+    """Sérialise un document (QboRecord, déjà réduit aux champs déclarés) en JSON compact."""
+    return json.dumps(obj.to_dict(), separators=(",", ":"))
+
+
+def month_keys(start_date, end_date):
+    """Retourne les mois ('AAAA-MM') de start_date à end_date inclus."""
+    start_date, end_date = as_date(start_date), as_date(end_date)
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def merge_ranges(ranges):
+    """Fusionne des plages de dates (début, fin) qui se chevauchent ou se touchent."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class LedgerStore:
+    """Base SQLite locale des documents QuickBooks, partagée entre les sessions."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Plages de dates couvertes
+
+    def covered_ranges(self, realm_id, entity):
+        """Retourne les plages de dates déjà récupérées pour une entité."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start_date, end_date FROM coverage WHERE realm_id = ? AND entity = ?",
+                (realm_id, entity)
+            ).fetchall()
+        return merge_ranges((as_date(start), as_date(end)) for start, end in rows)
+
+    def missing_ranges(self, realm_id, entity, start_date, end_date):
+        """Retourne les plages de [start_date, end_date] absentes de la base."""
+        start_date, end_date = as_date(start_date), as_date(end_date)
+        missing = []
+        cursor = start_date
+        for covered_start, covered_end in self.covered_ranges(realm_id, entity):
+            if covered_end < cursor:
+                continue
+            if covered_start > end_date:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - timedelta(days=1)))
+            cursor = covered_end + timedelta(days=1)
+            if cursor > end_date:
+                break
+        if cursor <= end_date:
+            missing.append((cursor, end_date))
+        return missing
+
+    def covers(self, realm_id, entities, start_date, end_date):
+        """Indique si toutes les entités sont couvertes sur la période."""
+        return all(not self.missing_ranges(realm_id, entity, start_date, end_date)
+                   for entity in entities)
+
+    def mark_covered(self, realm_id, entity, start_date, end_date):
+        """
+        Enregistre une plage comme récupérée.
+
+        Seuls les jours passés sont marqués : la journée en cours peut encore
+        recevoir des transactions et sera redemandée au prochain rafraîchissement.
+        """
+        start_date = as_date(start_date)
+        end_date = min(as_date(end_date), date.today() - timedelta(days=1))
+        if end_date < start_date:
+            return
+
+        ranges = self.covered_ranges(realm_id, entity) + [(start_date, end_date)]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM coverage WHERE realm_id = ? AND entity = ?", (realm_id, entity)
+            )
+            self._conn.executemany(
+                "INSERT INTO coverage (realm_id, entity, start_date, end_date) VALUES (?, ?, ?, ?)",
+                [(realm_id, entity, start.isoformat(), end.isoformat())
+                 for start, end in merge_ranges(ranges)]
+            )
+
+    def uncover(self, realm_id, entity, start_date, end_date):
+        """Retire une plage de la couverture pour forcer sa prochaine récupération."""
+        start_date, end_date = as_date(start_date), as_date(end_date)
+        ranges = []
+        for covered_start, covered_end in self.covered_ranges(realm_id, entity):
+            if covered_start < start_date:
+                ranges.append((covered_start, min(covered_end, start_date - timedelta(days=1))))
+            if covered_end > end_date:
+                ranges.append((max(covered_start, end_date + timedelta(days=1)), covered_end))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM coverage WHERE realm_id = ? AND entity = ?", (realm_id, entity)
+            )
+            self._conn.executemany(
+                "INSERT INTO coverage (realm_id, entity, start_date, end_date) VALUES (?, ?, ?, ?)",
+                [(realm_id, entity, start.isoformat(), end.isoformat()) for start, end in ranges]
+            )
+
+    # Point de synchronisation (Change Data Capture)
+
+    def get_watermark(self, realm_id):
+        """Retourne l'horodatage ISO de la dernière synchronisation, ou None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark FROM sync_state WHERE realm_id = ?", (realm_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, realm_id, watermark):
+        """Enregistre l'horodatage ISO de la dernière synchronisation."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (realm_id, watermark) VALUES (?, ?)",
+                (realm_id, watermark)
+            )
+
+    # Documents
+
+    def replace_range(self, realm_id, entity, start_date, end_date, objects):
+        """Remplace les documents d'une plage de dates par ceux fournis."""
+        start_str, end_str = as_date(start_date).isoformat(), as_date(end_date).isoformat()
+        objects = list(objects)
+        with self._lock, self._conn:
+            # Un document déplacé d'un autre mois rend aussi les agrégats de ce mois périmés
+            months = self._document_months(realm_id, entity, [obj.Id for obj in objects])
+            self._drop_document_rollups(realm_id, entity, months.union(month_keys(start_date, end_date)))
+            self._conn.execute(
+                "DELETE FROM documents WHERE realm_id = ? AND entity = ? "
+                "AND txn_date >= ? AND txn_date <= ?",
+                (realm_id, entity, start_str, end_str)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (realm_id, entity, id, txn_date, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(realm_id, entity, str(obj.Id), getattr(obj, 'TxnDate', None) or None,
+                  serialize_qbo_object(obj))
+                 for obj in objects]
+            )
+
+    def replace_all(self, realm_id, entity, objects):
+        """Remplace tous les documents d'une entité sans date (ex. comptes) et marque sa liste complète."""
+        with self._lock, self._conn:
+            self._drop_document_rollups(realm_id, entity, ())
+            self._conn.execute(
+                "DELETE FROM documents WHERE realm_id = ? AND entity = ?", (realm_id, entity)
+            )
+            self._conn.executemany(
+                "INSERT INTO documents (realm_id, entity, id, txn_date, payload) "
+                "VALUES (?, ?, ?, NULL, ?)",
+                [(realm_id, entity, str(obj.Id), serialize_qbo_object(obj)) for obj in objects]
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO list_coverage (realm_id, entity) VALUES (?, ?)", (realm_id, entity)
+            )
+
+    def upsert_documents(self, realm_id, entity, objects):
+        """Ajoute ou remplace des documents selon leur Id."""
+        objects = list(objects)
+        if not objects:
+            return
+        with self._lock, self._conn:
+            months = self._document_months(realm_id, entity, [obj.Id for obj in objects])
+            months.update(obj.TxnDate[:7] for obj in objects if getattr(obj, 'TxnDate', None))
+            self._drop_document_rollups(realm_id, entity, months)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (realm_id, entity, id, txn_date, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(realm_id, entity, str(obj.Id), getattr(obj, 'TxnDate', None) or None,
+                  serialize_qbo_object(obj))
+                 for obj in objects]
+            )
+
+    def delete_documents(self, realm_id, entity, ids):
+        """Supprime des documents selon leur Id."""
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._drop_document_rollups(realm_id, entity, self._document_months(realm_id, entity, ids))
+            self._conn.executemany(
+                "DELETE FROM documents WHERE realm_id = ? AND entity = ? AND id = ?",
+                [(realm_id, entity, str(doc_id)) for doc_id in ids]
+            )
+
+    def has_complete_list(self, realm_id, entity):
+        """
+        Indique si la liste complète d'une entité sans date a été enregistrée
+        (replace_all). Des documents ajoutés par synchronisation (CDC) ne suffisent pas.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM list_coverage WHERE realm_id = ? AND entity = ?", (realm_id, entity)
+            ).fetchone()
+        return row is not None
+
+    def load_documents(self, realm_id, entity, start_date=None, end_date=None):
+        """Retourne les documents (dictionnaires JSON) d'une entité, filtrés par date si demandé."""
+        query = "SELECT payload FROM documents WHERE realm_id = ? AND entity = ?"
+        params = [realm_id, entity]
+        if start_date is not None and end_date is not None:
+            query += " AND txn_date >= ? AND txn_date <= ?"
+            params += [as_date(start_date).isoformat(), as_date(end_date).isoformat()]
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def load_objects(self, realm_id, entity_cls, start_date=None, end_date=None):
+        """Retourne les documents sous forme de QboRecord."""
+        return [QboRecord(payload) for payload in
+                self.load_documents(realm_id, entity_cls.qbo_object_name, start_date, end_date)]
+
+    # Agrégats mensuels
+
+    def rollup_generation(self, realm_id):
+        """Retourne la génération des agrégats des documents, incrémentée à chaque retrait."""
+        with self._lock:
+            return self._generation(realm_id)
+
+    def save_rollup(self, realm_id, source, months, rows, generation=None):
+        """
+        Enregistre les agrégats (mois, restaurant, catégorie, montant) des mois
+        `months` ('AAAA-MM'); ils remplacent ceux déjà enregistrés pour ces mois.
+
+        Avec `generation` (rollup_generation lue avant la lecture des documents
+        agrégés), rien n'est enregistré si des agrégats ont été retirés depuis :
+        une synchronisation ou une actualisation concurrente a pu modifier ces
+        documents. Retourne True si les agrégats ont été enregistrés.
+        """
+        months = set(months)
+        computed_at = time.time()
+        with self._lock, self._conn:
+            if generation is not None and self._generation(realm_id) != generation:
+                return False
+            self._delete_rollup_months(realm_id, source, months)
+            self._conn.executemany(
+                "INSERT INTO rollups (realm_id, source, month, restaurant, category, amount) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(realm_id, source, *row) for row in rows if row[0] in months]
+            )
+            self._conn.executemany(
+                "INSERT INTO rollup_months (realm_id, source, month, computed_at) VALUES (?, ?, ?, ?)",
+                [(realm_id, source, month, computed_at) for month in months]
+            )
+        return True
+
+    def load_rollup(self, realm_id, source, months, max_age=None):
+        """
+        Retourne les agrégats enregistrés des mois `months`, en lignes (mois,
+        restaurant, catégorie, montant), ou None si l'un de ces mois est absent
+        ou a été calculé il y a plus de `max_age` secondes.
+        """
+        months = set(months)
+        available, rows = self.load_available_rollup(realm_id, source, months, max_age)
+        return rows if available == months else None
+
+    def load_available_rollup(self, realm_id, source, months, max_age=None):
+        """
+        Retourne (mois disponibles, lignes de ces mois) parmi `months` : seuls les
+        mois agrégés il y a moins de `max_age` secondes sont retenus.
+        """
+        months = sorted(set(months))
+        if not months:
+            return set(), []
+        placeholders = ",".join("?" * len(months))
+        oldest = time.time() - max_age if max_age is not None else 0.0
+        with self._lock:
+            available = sorted(month for (month,) in self._conn.execute(
+                f"SELECT month FROM rollup_months WHERE realm_id = ? AND source = ? "
+                f"AND month IN ({placeholders}) AND computed_at >= ?",
+                (realm_id, source, *months, oldest)
+            ))
+            if not available:
+                return set(), []
+            rows = self._conn.execute(
+                f"SELECT month, restaurant, category, amount FROM rollups WHERE realm_id = ? "
+                f"AND source = ? AND month IN ({','.join('?' * len(available))})",
+                (realm_id, source, *available)
+            ).fetchall()
+        return set(available), rows
+
+    # Les méthodes suivantes s'exécutent avec le verrou déjà acquis
+
+    def _generation(self, realm_id):
+        row = self._conn.execute(
+            "SELECT generation FROM rollup_generation WHERE realm_id = ?", (realm_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _delete_rollup_months(self, realm_id, source, months):
+        for table in ('rollups', 'rollup_months'):
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE realm_id = ? AND source = ? AND month = ?",
+                [(realm_id, source, month) for month in months]
+            )
+
+    def _document_months(self, realm_id, entity, ids):
+        """Retourne les mois des documents déjà enregistrés parmi `ids`."""
+        ids = [str(doc_id) for doc_id in ids]
+        months = set()
+        for i in range(0, len(ids), ROLLUP_ID_CHUNK):
+            chunk = ids[i:i + ROLLUP_ID_CHUNK]
+            months.update(txn_date[:7] for (txn_date,) in self._conn.execute(
+                f"SELECT DISTINCT txn_date FROM documents WHERE realm_id = ? AND entity = ? "
+                f"AND id IN ({','.join('?' * len(chunk))}) AND txn_date IS NOT NULL",
+                (realm_id, entity, *chunk)
+            ))
+        return months
+
+    def _drop_document_rollups(self, realm_id, entity, months):
+        """
+        Retire les agrégats des documents pour les mois modifiés (tous si les comptes
+        changent) et incrémente leur génération.
+        """
+        if entity != CLASSIFICATION_ENTITY and not months:
+            return
+        self._conn.execute(
+            "INSERT INTO rollup_generation (realm_id, generation) VALUES (?, 1) "
+            "ON CONFLICT (realm_id) DO UPDATE SET generation = generation + 1",
+            (realm_id,)
+        )
+        if entity == CLASSIFICATION_ENTITY:
+            for table in ('rollups', 'rollup_months'):
+                self._conn.execute(f"DELETE FROM {table} WHERE realm_id = ? AND source = ?",
+                                   (realm_id, DOCUMENT_ROLLUP_SOURCE))
+        else:
+            self._delete_rollup_months(realm_id, DOCUMENT_ROLLUP_SOURCE, months)
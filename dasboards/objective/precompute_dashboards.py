@@ -0,0 +1,145 @@
+"""
+Précalcule hors de Streamlit les tableaux de bord de chaque trimestre et restaurant.
+
+Les périodes sont récupérées en parallèle par dashboard_pipeline (fetch_snapshot,
+donc get_qbo_data et les agrégats mensuels de la base locale), sans Streamlit,
+puis process_data_for_dashboard calcule le tableau de tous les restaurants et de
+chacun. Une nouvelle version des tableaux est ensuite publiée (voir
+dashboard_snapshots), que l'application affiche immédiatement, sans récupération
+ni calcul. La cause de chaque échec et le bilan sont affichés sur la sortie
+d'erreur; le code de sortie est 1 si une période n'a pu être calculée.
+
+Les identifiants QuickBooks viennent des variables d'environnement QB_CLIENT_ID,
+QB_CLIENT_SECRET, QB_ENVIRONMENT, QB_REALM_ID et QB_REFRESH_TOKEN. Avec
+--token-file, le jeton de renouvellement est lu dans ce fichier et remplacé par
+celui que QuickBooks renvoie, ce qui permet une exécution chaque nuit :
+
+    python dasboards/objective/precompute_dashboards.py [--source transactions] [--years 2] [--workers 4]
+
+    # crontab : chaque nuit à 2 h
+    0 2 * * * cd /srv/jacmar && python dasboards/objective/precompute_dashboards.py --token-file ~/.jacmar_token
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dashboard_pipeline import fetch_snapshot, process_data_for_dashboard, sync_store_changes
+from dashboard_snapshots import DEFAULT_SNAPSHOT_DIR, SNAPSHOT_KEEP_VERSIONS, write_snapshots
+from ledger_engine import quarter_period
+from ledger_store import DEFAULT_STORE_PATH, LedgerStore
+
+# URI de redirection enregistrée pour l'application (la même que dans l'application)
+REDIRECT_URI = "http://localhost:8501/"
+
+# Récupérations de périodes simultanées (l'ordonnanceur du client limite le débit)
+DEFAULT_WORKERS = 4
+
+
+def connect_headless(token_file=None):
+    """Retourne le client enregistré (qbo_client) créé à partir des variables d'environnement, sans interaction."""
+    from qbo_client import get_registered_client
+
+    refresh_token = os.environ.get("QB_REFRESH_TOKEN")
+    if token_file and os.path.exists(token_file):
+        with open(token_file, encoding='utf-8') as f:
+            refresh_token = f.read().strip()
+    return get_registered_client(
+        os.environ["QB_CLIENT_ID"], os.environ["QB_CLIENT_SECRET"], REDIRECT_URI,
+        os.environ.get("QB_ENVIRONMENT", "production"), os.environ["QB_REALM_ID"], refresh_token
+    )
+
+
+def save_refresh_token(registered, token_file):
+    """Remplace le jeton de renouvellement du fichier (QuickBooks peut le changer à chaque renouvellement)."""
+    tmp = f"{token_file}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(registered.refresh_token)
+    os.replace(tmp, token_file)
+
+
+def quarters_to_precompute(years, today=None):
+    """Retourne (année, trimestre) des `years` dernières années, jusqu'au trimestre en cours."""
+    today = today or datetime.now()
+    current = (today.year, (today.month - 1) // 3 + 1)
+    return [(year, quarter)
+            for year in range(today.year - years + 1, today.year + 1)
+            for quarter in range(1, 5)
+            if (year, quarter) <= current]
+
+
+def precompute_period(client, store, source, start_date, end_date, refresh_mode=None):
+    """
+    Calcule les tableaux d'une période : {restaurant: DashboardData}, le
+    restaurant None désignant tous les restaurants. Retourne None en cas d'échec,
+    après en avoir affiché la cause sur la sortie d'erreur.
+    """
+    try:
+        snapshot = fetch_snapshot(client, store, source, start_date, end_date, refresh_mode=refresh_mode)
+    except Exception as e:
+        print(f"ÉCHEC: {start_date:%Y-%m-%d} au {end_date:%Y-%m-%d}: {type(e).__name__}: {e}", file=sys.stderr)
+        return None
+    if not snapshot:
+        print(f"ÉCHEC: {start_date:%Y-%m-%d} au {end_date:%Y-%m-%d}: aucune donnée récupérée", file=sys.stderr)
+        return None
+    restaurants = [None] + snapshot['cube'].restaurants[1:]
+    return {
+        restaurant: process_data_for_dashboard(snapshot, start_date, end_date, restaurant)
+        for restaurant in restaurants
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", choices=['transactions', 'reports'], default='transactions')
+    parser.add_argument("--years", type=int, default=2, help="années précalculées, jusqu'à l'année en cours")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--full", action="store_true", help="recalculer tous les mois, sans les agrégats enregistrés")
+    parser.add_argument("--token-file", help="fichier du jeton de renouvellement, mis à jour après l'exécution")
+    parser.add_argument("--store", help="base locale (JACMAR_LEDGER_STORE par défaut)")
+    parser.add_argument("--output", default=DEFAULT_SNAPSHOT_DIR, help="répertoire des tableaux précalculés")
+    parser.add_argument("--keep", type=int, default=SNAPSHOT_KEEP_VERSIONS, help="versions gardées")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    registered = connect_headless(args.token_file)
+    client = registered.client
+    store = LedgerStore(args.store or DEFAULT_STORE_PATH)
+    realm_id = str(client.company_id)
+
+    try:
+        # Une seule synchronisation des modifications, avant les récupérations parallèles
+        refresh_mode = 'full' if args.full else None
+        if args.source == 'transactions' and not args.full:
+            sync_store_changes(client, store, {})
+
+        periods = [quarter_period(year, quarter) for year, quarter in quarters_to_precompute(args.years)]
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(
+                lambda period: precompute_period(client, store, args.source, *period, refresh_mode=refresh_mode),
+                periods
+            ))
+    finally:
+        if args.token_file:
+            save_refresh_token(registered, args.token_file)
+
+    failed = [start.strftime('%Y-%m') for (start, _), dashboards in zip(periods, results) if dashboards is None]
+    computed = [(start, end, dashboards) for (start, end), dashboards in zip(periods, results) if dashboards]
+    if not computed:
+        print("ÉCHEC: aucune période n'a pu être calculée", file=sys.stderr)
+        return 1
+
+    version_dir = write_snapshots(realm_id, args.source, computed, root=args.output, keep=args.keep)
+    n_dashboards = sum(len(dashboards) for _, _, dashboards in computed)
+    print(f"{n_dashboards} tableaux ({len(computed)} trimestres) publiés dans {version_dir} "
+          f"en {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    if failed:
+        print(f"ÉCHEC: trimestres non calculés (début): {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
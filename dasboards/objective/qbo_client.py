@@ -0,0 +1,146 @@
+"""
+Registre des clients QuickBooks partagés par tous les reruns et toutes les sessions.
+
+Créer un AuthClient télécharge le document de découverte OAuth, et créer un
+client QuickBooks sans jeton d'accès force un renouvellement du jeton. Le
+registre garde donc un client par compagnie (realm), avec une session HTTP
+dont les connexions TLS sont réutilisées, et ne renouvelle le jeton d'accès
+que peu avant son expiration. Chaque requête du client passe par l'ordonnanceur
+de sa compagnie (limites de débit, nouvelles tentatives).
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from qbo_scheduler import RequestScheduler
+
+# Le jeton d'accès est renouvelé lorsqu'il lui reste moins de 5 minutes
+TOKEN_REFRESH_MARGIN = 300
+
+# Durée de vie d'un jeton d'accès QuickBooks si la réponse ne la précise pas
+DEFAULT_TOKEN_LIFETIME = 3600
+
+# Connexions HTTP conservées par client (au moins le nombre de requêtes parallèles)
+HTTP_POOL_SIZE = 16
+
+# Adresse de l'API comptable par environnement
+QBO_API_URLS = {
+    'sandbox': "https://sandbox-quickbooks.api.intuit.com/v3",
+    'production': "https://quickbooks.api.intuit.com/v3",
+}
+
+_CLIENTS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class RegisteredClient:
+    """Client QuickBooks d'une compagnie, avec renouvellement automatique du jeton d'accès."""
+
+    def __init__(self, auth_client, realm_id):
+        from quickbooks import QuickBooks
+
+        self.auth_client = auth_client
+        self.realm_id = realm_id
+        self._lock = threading.Lock()
+
+        # Sans jeton d'accès, QuickBooks() le renouvelle une seule fois ici
+        self.client = QuickBooks(
+            auth_client=auth_client,
+            refresh_token=auth_client.refresh_token,
+            company_id=realm_id,
+        )
+        self.expires_at = time.time() + (auth_client.expires_in or DEFAULT_TOKEN_LIFETIME)
+
+        # Réutiliser les connexions TLS entre les requêtes et les reruns
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+        self.client.session.mount("https://", adapter)
+
+        # Toutes les requêtes de la compagnie passent par le même ordonnanceur, avec un
+        # jeton d'accès valide (y compris depuis l'actualisation en arrière-plan)
+        self.scheduler = RequestScheduler()
+        scheduled_request = self.scheduler.wrap(self.client.process_request)
+
+        def fresh_request(*args, **kwargs):
+            self.ensure_fresh()
+            return scheduled_request(*args, **kwargs)
+
+        self.client.process_request = fresh_request
+        self.client.scheduler = self.scheduler
+
+    @property
+    def refresh_token(self):
+        return self.auth_client.refresh_token
+
+    def ensure_fresh(self):
+        """Renouvelle le jeton d'accès s'il expire bientôt, sans recréer la session HTTP."""
+        if time.time() < self.expires_at - TOKEN_REFRESH_MARGIN:
+            return
+        with self._lock:
+            if time.time() < self.expires_at - TOKEN_REFRESH_MARGIN:
+                return
+            self.auth_client.refresh()
+            self.client.refresh_token = self.auth_client.refresh_token
+            self.client.session.token = {
+                'access_token': self.auth_client.access_token,
+                'refresh_token': self.auth_client.refresh_token,
+            }
+            self.expires_at = time.time() + (self.auth_client.expires_in or DEFAULT_TOKEN_LIFETIME)
+
+
+def verify_realm_access(access_token, realm_id, environment):
+    """
+    Vérifie que le jeton d'accès d'une session donne accès à la compagnie `realm_id`.
+
+    Le Realm ID est saisi par l'utilisateur : il doit être vérifié avec le jeton
+    obtenu par la session elle-même (lecture de CompanyInfo) avant de servir le
+    client enregistré ou les données partagées de cette compagnie.
+    """
+    if not str(realm_id).isdigit():
+        return False
+    response = requests.get(
+        f"{QBO_API_URLS[environment]}/company/{realm_id}/companyinfo/{realm_id}",
+        headers={'Authorization': f"Bearer {access_token}", 'Accept': 'application/json'},
+        timeout=30,
+    )
+    return response.status_code == 200
+
+
+def get_registered_client(client_id, client_secret, redirect_uri, environment, realm_id, refresh_token):
+    """
+    Retourne le client enregistré pour une compagnie, en le créant au besoin.
+
+    Le client est partagé par toutes les sessions de la compagnie : l'appelant
+    doit d'abord avoir vérifié que la session y a accès (verify_realm_access).
+
+    Le jeton d'accès est renouvelé s'il est sur le point d'expirer. Le jeton de
+    renouvellement à jour est disponible via `refresh_token`, car QuickBooks
+    peut le remplacer à chaque renouvellement.
+    """
+    from intuitlib.client import AuthClient
+
+    key = (realm_id, client_id, environment)
+    with _REGISTRY_LOCK:
+        registered = _CLIENTS.get(key)
+        if registered is None:
+            auth_client = AuthClient(
+                client_id=client_id,
+                client_secret=client_secret,
+                redirect_uri=redirect_uri,
+                environment=environment,
+                refresh_token=refresh_token,
+                realm_id=realm_id,
+            )
+            registered = RegisteredClient(auth_client, realm_id)
+            _CLIENTS[key] = registered
+
+    registered.ensure_fresh()
+    return registered
+
+
+def forget_client(realm_id):
+    """Retire du registre les clients d'une compagnie (ex. après une erreur d'authentification)."""
+    with _REGISTRY_LOCK:
+        for key in [key for key in _CLIENTS if key[0] == realm_id]:
+            del _CLIENTS[key]
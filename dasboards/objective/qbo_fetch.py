@@ -0,0 +1,359 @@
+"""
+Couche de récupération des données QuickBooks.
+
+Les requêtes QuickBooks sont limitées à 1000 résultats par appel : on parcourt
+donc les pages avec STARTPOSITION au lieu de tronquer silencieusement. Seuls les
+champs déclarés dans qbo_fields sont sélectionnés, et les documents sont
+retournés sous forme de QboRecord. Les réponses JSON sont lues directement
+(avec orjson s'il est installé), sans créer d'objets python-quickbooks.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from qbo_fields import select_clause, to_record
+
+# Analyseur JSON rapide s'il est disponible
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Nombre maximal de résultats accepté par l'API QuickBooks pour une requête
+QBO_PAGE_SIZE = 1000
+
+# Nombre maximal de requêtes QuickBooks exécutées en parallèle
+MAX_FETCH_WORKERS = 4
+
+# Nombre maximal de requêtes dans un appel au point d'accès batch
+QBO_BATCH_MAX_ITEMS = 30
+
+# Le point d'accès CDC ne remonte pas plus loin que 30 jours
+CDC_MAX_LOOKBACK = timedelta(days=30)
+
+# Le point d'accès CDC retourne au plus 1000 objets par entité
+CDC_MAX_RESULTS = 1000
+
+
+def new_fetch_stats():
+    """Crée un compteur de récupération pour une entité."""
+    return {'pages': 0, 'rows': 0, 'elapsed': 0.0}
+
+
+def post_json(client, endpoint, body, content_type='application/json'):
+    """
+    Envoie une requête POST à l'API QuickBooks et retourne la réponse JSON brute.
+
+    Équivalent de QuickBooks.make_request pour les requêtes de lecture, mais la
+    réponse est analysée par `json_loads`. La requête passe par
+    `client.process_request`, donc par l'ordonnanceur de la compagnie.
+    """
+    from quickbooks.exceptions import AuthorizationException, QuickbooksException
+
+    url = f"{client.api_url}/company/{client.company_id}/{endpoint}"
+    headers = {
+        'Content-Type': content_type,
+        'Accept': 'application/json',
+        'User-Agent': 'python-quickbooks V3 library'
+    }
+    response = client.process_request(
+        'POST', url, headers=headers, params={'minorversion': client.minorversion}, data=body
+    )
+    if response.status_code == 401:
+        raise AuthorizationException("Application authentication failed",
+                                     error_code=response.status_code, detail=response.text)
+
+    try:
+        result = json_loads(response.content)
+    except ValueError:
+        raise QuickbooksException(f"Error reading json response: {response.text}", 10000)
+
+    if "Fault" in result:
+        client.handle_exceptions(result["Fault"])
+    elif response.status_code != 200:
+        raise QuickbooksException(
+            f"Error returned with status code '{response.status_code}': {response.text}", 10000)
+    return result
+
+
+def page_query(entity_cls, where_clause, start_position, page_size=QBO_PAGE_SIZE):
+    """Construit la requête d'une page, limitée aux champs déclarés de l'entité."""
+    where = f"WHERE {where_clause}" if where_clause else ""
+    return (
+        f"SELECT {select_clause(entity_cls.qbo_object_name)} FROM {entity_cls.qbo_object_name} "
+        f"{where} STARTPOSITION {start_position} MAXRESULTS {page_size}"
+    )
+
+
+def page_records(entity_cls, query_response):
+    """Convertit les documents d'une réponse QueryResponse en QboRecord réduits."""
+    entity_name = entity_cls.qbo_object_name
+    return [to_record(entity_name, data) for data in query_response.get(entity_name, [])]
+
+
+def iter_qbo_pages(entity_cls, client, where_clause="", page_size=QBO_PAGE_SIZE, stats=None):
+    """
+    Parcourt une requête QuickBooks page par page (générateur).
+
+    Chaque page est une liste de QboRecord. Si `stats` est fourni, il est
+    mis à jour au fil des pages (pages, lignes, temps passé dans les appels API).
+    """
+    start_position = 1
+
+    while True:
+        query = page_query(entity_cls, where_clause, start_position, page_size)
+
+        started = time.perf_counter()
+        response = post_json(client, "query", query, content_type='application/text')
+        page = page_records(entity_cls, response.get('QueryResponse', {}))
+
+        if stats is not None:
+            stats['pages'] += 1
+            stats['rows'] += len(page)
+            stats['elapsed'] += time.perf_counter() - started
+
+        if page:
+            yield page
+
+        # Une page incomplète signifie qu'il n'y a plus de résultats
+        if len(page) < page_size:
+            break
+
+        start_position += page_size
+
+
+def fetch_all(entity_cls, client, where_clause="", page_size=QBO_PAGE_SIZE, stats=None):
+    """Récupère tous les documents d'une requête paginée dans une liste (toutes les pages restent en mémoire)."""
+    records = []
+    for page in iter_qbo_pages(entity_cls, client, where_clause, page_size, stats):
+        records.extend(page)
+    return records
+
+
+def fetch_concurrently(entity_queries, client, stats, max_workers=MAX_FETCH_WORKERS):
+    """
+    Récupère plusieurs entités en parallèle avec un seul client authentifié.
+
+    `entity_queries` associe une clé (ex. 'invoices') à un couple
+    (classe QuickBooks, clause WHERE). Retourne un dictionnaire clé -> liste
+    d'objets; `stats[clé]` est mis à jour pour chaque entité. La durée totale
+    correspond à celle de l'entité la plus lente plutôt qu'à leur somme.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            key: executor.submit(fetch_all, entity_cls, client, where_clause, stats=stats[key])
+            for key, (entity_cls, where_clause) in entity_queries.items()
+        }
+        # result() relance dans le thread appelant l'exception d'un worker
+        return {key: future.result() for key, future in futures.items()}
+
+
+def fetch_batched(entity_queries, client, stats, max_items=QBO_BATCH_MAX_ITEMS, page_size=QBO_PAGE_SIZE):
+    """
+    Récupère plusieurs entités en regroupant leurs requêtes dans des appels batch.
+
+    Même contrat que fetch_concurrently. Chaque appel batch contient jusqu'à
+    `max_items` pages de requêtes, toutes entités confondues. Le premier appel
+    demande une page par entité; ensuite, les places libres servent à demander
+    d'avance les pages suivantes des entités dont la dernière page était pleine.
+    Une entité est terminée dès qu'une de ses pages est incomplète. Une erreur
+    (Fault) ou une réponse manquante pour une requête lève QuickbooksException.
+    """
+    from quickbooks.exceptions import QuickbooksException
+
+    results = {key: [] for key in entity_queries}
+    next_start = {key: 1 for key in entity_queries}
+    pending = list(entity_queries)
+    # Entités dont la dernière page reçue était pleine
+    full = set()
+
+    while pending:
+        # Répartir les places de l'appel entre les entités incomplètes
+        pages_per_entity = max(1, max_items // len(pending))
+        items = []
+        for key in pending:
+            entity_cls, where_clause = entity_queries[key]
+            for _ in range(pages_per_entity if key in full else 1):
+                if len(items) >= max_items:
+                    break
+                items.append((key, page_query(entity_cls, where_clause, next_start[key], page_size)))
+                next_start[key] += page_size
+
+        started = time.perf_counter()
+        response = post_json(client, "batch", json.dumps({
+            'BatchItemRequest': [{'bId': str(index), 'Query': query}
+                                 for index, (_, query) in enumerate(items)]
+        }))
+        elapsed = time.perf_counter() - started
+
+        pages = {}
+        for item in response['BatchItemResponse']:
+            if 'Fault' in item:
+                errors = item['Fault'].get('Error', [{}])
+                raise QuickbooksException(errors[0].get('Message', 'Batch query failed'),
+                                          errors[0].get('code', ''), errors[0].get('Detail', ''))
+            if 'QueryResponse' in item:
+                pages[int(item['bId'])] = item['QueryResponse']
+        # Une requête sans réponse ne doit pas passer pour une page vide (fin de l'entité)
+        missing = [str(index) for index in range(len(items)) if index not in pages]
+        if missing:
+            raise QuickbooksException("Batch response is missing items", '',
+                                      f"bId sans QueryResponse: {', '.join(missing)}")
+
+        finished = set()
+        for index, (key, _) in enumerate(items):
+            if key in finished:
+                continue
+            page = page_records(entity_queries[key][0], pages[index])
+            results[key].extend(page)
+            stats[key]['pages'] += 1
+            stats[key]['rows'] += len(page)
+            stats[key]['elapsed'] += elapsed / len(items)
+            if len(page) < page_size:
+                finished.add(key)
+            else:
+                full.add(key)
+
+        pending = [key for key in pending if key not in finished]
+
+    return results
+
+
+def add_fetch_stats(total, stats):
+    """Ajoute un compteur de récupération à un compteur cumulatif."""
+    for field in total:
+        total[field] += stats[field]
+
+
+def fetch_with_store(store, client, dated_entities, list_entities, stats, fetcher=fetch_concurrently):
+    """
+    Synchronise la base locale puis y lit les données des périodes demandées.
+
+    `dated_entities` associe une clé à un triplet (classe QuickBooks, début, fin) :
+    seules les plages absentes de la base sont demandées à QuickBooks, toutes
+    entités et périodes confondues dans le même lot de requêtes parallèles.
+    `list_entities` associe une clé à un couple (classe, clause WHERE) pour les
+    entités sans date (ex. comptes), récupérées tant que la base n'en a pas la
+    liste complète.
+    Les requêtes sont exécutées par `fetcher` (fetch_concurrently ou fetch_batched).
+    Lorsque la base couvre déjà les périodes, aucun appel API n'est fait.
+    Le résultat porte aussi, sous la clé 'rollup_generation', la génération des
+    agrégats lue juste avant les documents (voir LedgerStore.save_rollup).
+    """
+    realm_id = str(client.company_id)
+
+    # Première synchronisation : les modifications faites pendant la récupération seront
+    # captées par CDC; le point n'est enregistré qu'une fois tous les documents en base
+    first_sync_at = utc_timestamp() if store.get_watermark(realm_id) is None else None
+
+    jobs = {}
+    for key, (entity_cls, start_date, end_date) in dated_entities.items():
+        for range_start, range_end in store.missing_ranges(
+                realm_id, entity_cls.qbo_object_name, start_date, end_date):
+            where_clause = txn_date_clause(range_start.isoformat(), range_end.isoformat())
+            jobs[(key, range_start, range_end)] = (entity_cls, where_clause)
+    for key, (entity_cls, where_clause) in list_entities.items():
+        if not store.has_complete_list(realm_id, entity_cls.qbo_object_name):
+            jobs[(key, None, None)] = (entity_cls, where_clause)
+
+    job_stats = {job: new_fetch_stats() for job in jobs}
+    fetched = fetcher(jobs, client, job_stats) if jobs else {}
+
+    for (key, range_start, range_end), objects in fetched.items():
+        entity_name = jobs[(key, range_start, range_end)][0].qbo_object_name
+        if range_start is None:
+            store.replace_all(realm_id, entity_name, objects)
+        else:
+            store.replace_range(realm_id, entity_name, range_start, range_end, objects)
+            store.mark_covered(realm_id, entity_name, range_start, range_end)
+        add_fetch_stats(stats[key], job_stats[(key, range_start, range_end)])
+    if first_sync_at is not None:
+        store.set_watermark(realm_id, first_sync_at)
+
+    # Lue avant les documents : un retrait d'agrégats ensuite empêchera leur enregistrement
+    results = {'rollup_generation': store.rollup_generation(realm_id)}
+    for key, (entity_cls, start_date, end_date) in dated_entities.items():
+        results[key] = store.load_objects(realm_id, entity_cls, start_date, end_date)
+    for key, (entity_cls, _) in list_entities.items():
+        results[key] = store.load_objects(realm_id, entity_cls)
+    return results
+
+
+def sync_changes(store, client, entities, stats):
+    """
+    Applique à la base locale les modifications faites depuis la dernière synchronisation.
+
+    `entities` associe une clé à une classe QuickBooks. Le point d'accès CDC est
+    utilisé tant que le dernier point de synchronisation date de moins de 30 jours :
+    les objets modifiés remplacent ceux de la base et les objets supprimés en sont
+    retirés. Au-delà (ou si CDC atteint sa limite de résultats), on se rabat sur un
+    filtre MetaData.LastUpdatedTime, qui ne signale pas les suppressions.
+    Sans point de synchronisation, rien n'est fait : la base est alors vide.
+    """
+    realm_id = str(client.company_id)
+    watermark = store.get_watermark(realm_id)
+    if watermark is None:
+        return
+
+    synced_at = utc_timestamp()
+    use_cdc = datetime.now(timezone.utc) - datetime.fromisoformat(watermark) < CDC_MAX_LOOKBACK
+
+    changes = {}
+    if use_cdc:
+        started = time.perf_counter()
+        cdc_response = client.change_data_capture(
+            ",".join(entity_cls.qbo_object_name for entity_cls in entities.values()), watermark
+        )
+        # Une QueryResponse par entité; les documents supprimés portent status = 'Deleted'
+        changed_by_entity = {}
+        for query_response in cdc_response['CDCResponse'][0]['QueryResponse']:
+            for entity_name, documents in query_response.items():
+                if isinstance(documents, list):
+                    changed_by_entity[entity_name] = documents
+        for key, entity_cls in entities.items():
+            changed = changed_by_entity.get(entity_cls.qbo_object_name, [])
+            if len(changed) < CDC_MAX_RESULTS:
+                changes[key] = changed
+        elapsed = time.perf_counter() - started
+        for key in changes:
+            stats[key]['pages'] += 1
+            stats[key]['rows'] += len(changes[key])
+            stats[key]['elapsed'] += elapsed / len(changes)
+
+    # Entités non couvertes par CDC : requête paginée sur la date de modification
+    fallback = {
+        key: (entity_cls, f"MetaData.LastUpdatedTime >= '{watermark}'")
+        for key, entity_cls in entities.items() if key not in changes
+    }
+    if fallback:
+        for key, records in fetch_concurrently(fallback, client, stats).items():
+            changes[key] = [record.to_dict() for record in records]
+
+    for key, changed in changes.items():
+        entity_name = entities[key].qbo_object_name
+        deleted = [data['Id'] for data in changed if data.get('status') == 'Deleted']
+        store.delete_documents(realm_id, entity_name, deleted)
+        store.upsert_documents(
+            realm_id, entity_name,
+            [to_record(entity_name, data) for data in changed if data.get('status') != 'Deleted']
+        )
+
+    store.set_watermark(realm_id, synced_at)
+
+
+def utc_timestamp():
+    """Retourne l'heure courante au format ISO accepté par QuickBooks."""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def txn_date_clause(start_str, end_str):
+    """Construit la clause WHERE sur la date de transaction."""
+    return f"TxnDate >= '{start_str}' AND TxnDate <= '{end_str}'"
+
+
+def format_fetch_stats(entity_name, stats):
+    """Formate le compteur d'une entité pour l'affichage."""
+    return (f"{entity_name}: {stats['rows']} lignes, {stats['pages']} page(s), "
+            f"{stats['elapsed']:.2f} s")
@@ -0,0 +1,98 @@
+"""
+Champs QuickBooks réellement lus par le tableau de bord.
+
+Chaque entité déclare les champs dont le calcul a besoin : les requêtes
+sélectionnent ces champs au lieu de `SELECT *`, les lignes de documents sont
+réduites aux sous-champs utilisés, et les documents sont gardés sous une forme
+légère (QboRecord) plutôt qu'en objets python-quickbooks complets.
+"""
+
+# Sous-champs des lignes de documents (None : valeur gardée telle quelle)
+LINE_FIELDS = {
+    'Amount': None,
+    'JournalEntryLineDetail': {'PostingType': None, 'AccountRef': None},
+    'AccountBasedExpenseLineDetail': {'AccountRef': None},
+}
+
+# Champs conservés par entité; Id et SyncToken servent à la base locale et à l'empreinte
+ENTITY_FIELDS = {
+    'JournalEntry': {'Id': None, 'SyncToken': None, 'TxnDate': None, 'Line': LINE_FIELDS},
+    'Invoice': {'Id': None, 'SyncToken': None, 'TxnDate': None, 'TotalAmt': None, 'CustomerRef': None},
+    'Purchase': {'Id': None, 'SyncToken': None, 'TxnDate': None, 'TotalAmt': None, 'EntityRef': None,
+                 'Line': LINE_FIELDS},
+    'Bill': {'Id': None, 'SyncToken': None, 'TxnDate': None, 'TotalAmt': None, 'VendorRef': None,
+             'Line': LINE_FIELDS},
+    'VendorCredit': {'Id': None, 'SyncToken': None, 'TxnDate': None, 'TotalAmt': None, 'VendorRef': None,
+                     'Line': LINE_FIELDS},
+    'Account': {'Id': None, 'SyncToken': None, 'Name': None, 'AcctNum': None, 'AccountType': None,
+                'AccountSubType': None, 'Active': None},
+    'Customer': {'Id': None, 'SyncToken': None, 'DisplayName': None, 'Active': None},
+}
+
+
+def select_clause(entity_name):
+    """Retourne la liste des champs à sélectionner pour une entité ('*' si elle n'est pas déclarée)."""
+    fields = ENTITY_FIELDS.get(entity_name)
+    return ", ".join(fields) if fields else "*"
+
+
+def project_fields(value, fields):
+    """Réduit une valeur JSON (dictionnaire ou liste de dictionnaires) aux champs déclarés."""
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [project_fields(item, fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for name, subfields in fields.items():
+        if name in value:
+            item = value[name]
+            projected[name] = item if subfields is None else project_fields(item, subfields)
+    return projected
+
+
+def project_document(entity_name, data):
+    """Réduit un document JSON QuickBooks aux champs déclarés pour son entité."""
+    return project_fields(data, ENTITY_FIELDS.get(entity_name))
+
+
+class QboRecord:
+    """
+    Vue en attributs d'un document JSON réduit.
+
+    Se lit comme un objet python-quickbooks (`entry.Line[0].Amount`,
+    `ref.value`) : les dictionnaires imbriqués sont enveloppés à la lecture, et
+    un champ absent lève AttributeError, ce qui garde `hasattr`/`getattr` valides.
+    """
+
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            value = self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        return _wrap(value)
+
+    def to_dict(self):
+        return self._data
+
+    def __repr__(self):
+        return f"QboRecord({self._data!r})"
+
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return QboRecord(value)
+    if isinstance(value, list):
+        return [_wrap(item) for item in value]
+    return value
+
+
+def to_record(entity_name, data):
+    """Crée un QboRecord à partir d'un document JSON, réduit aux champs déclarés."""
+    return QboRecord(project_document(entity_name, data))
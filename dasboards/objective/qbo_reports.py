@@ -0,0 +1,142 @@
+"""
+Source de données par rapports QuickBooks (ProfitAndLoss).
+
+Le tableau de bord n'a besoin que de sommes mensuelles par catégorie de compte
+et par restaurant. Au lieu de télécharger chaque document, on demande pour
+chaque mois un rapport ProfitAndLoss ventilé par client (restaurant) : quelques
+requêtes légères par période. Les lignes du rapport sont classées avec les
+mêmes règles de comptes (401, 51, 60) que les transactions, puis agrégées par
+le même cube d'agrégats (rollup_cube.RollupCube). Les transactions restent disponibles
+pour le détail.
+"""
+import calendar
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from account_index import get_account_classifier
+from ledger_engine import month_range
+from qbo_fetch import MAX_FETCH_WORKERS, add_fetch_stats, new_fetch_stats
+
+# Colonne des totaux dans un rapport ventilé
+TOTAL_COLUMN_KEY = 'total'
+
+
+def month_periods(start_date, end_date):
+    """Retourne (mois 'AAAA-MM', premier jour, dernier jour) pour chaque mois, bornés à la période."""
+    periods = []
+    for month in month_range(start_date, end_date):
+        year, month_number = int(month[:4]), int(month[5:])
+        first_day = f"{month}-01"
+        last_day = f"{month}-{calendar.monthrange(year, month_number)[1]:02d}"
+        periods.append((month,
+                        max(first_day, start_date.strftime('%Y-%m-%d')),
+                        min(last_day, end_date.strftime('%Y-%m-%d'))))
+    return periods
+
+
+def report_columns(report):
+    """Retourne, pour chaque colonne du rapport, le restaurant correspondant (None pour le total)."""
+    restaurants = []
+    for column in report.get('Columns', {}).get('Column', []):
+        metadata = {item.get('Name'): item.get('Value') for item in column.get('MetaData', [])}
+        if column.get('ColType') != 'Money' or metadata.get('ColKey') == TOTAL_COLUMN_KEY:
+            restaurants.append(None)
+        else:
+            restaurants.append(column.get('ColTitle'))
+    return restaurants
+
+
+def iter_report_data_rows(rows):
+    """Parcourt les lignes de données d'un rapport, sections imbriquées comprises (sans les totaux)."""
+    for row in rows.get('Row', []):
+        if 'Rows' in row:
+            yield from iter_report_data_rows(row['Rows'])
+        elif row.get('type', 'Data') == 'Data' and 'ColData' in row:
+            yield row['ColData']
+
+
+def report_amount(value):
+    """Convertit une cellule monétaire du rapport ('' pour zéro)."""
+    return float(value) if value else 0.0
+
+
+def flatten_report(report, month, account_index):
+    """
+    Aplatit un rapport ProfitAndLoss ventilé par client en colonnes
+    (Month, Restaurant, Category, Amount), comme flatten_qbo_json avec
+    `detail=True` : Date est le premier jour du mois et Account l'Id du compte.
+
+    Seules les lignes de comptes classés sont gardées; la colonne Total est
+    ignorée puisque l'agrégat tous restaurants est recalculé.
+    """
+    restaurants = report_columns(report)
+    lines = {'Month': [], 'Date': [], 'Restaurant': [], 'Account': [], 'Category': [], 'Amount': []}
+    for col_data in iter_report_data_rows(report.get('Rows', {})):
+        account_id = col_data[0].get('id')
+        classification = account_index.get(account_id)
+        if classification is None:
+            continue
+        for restaurant, cell in zip(restaurants[1:], col_data[1:]):
+            amount = report_amount(cell.get('value'))
+            if restaurant is None or not amount:
+                continue
+            lines['Month'].append(month)
+            lines['Date'].append(f"{month}-01")
+            lines['Restaurant'].append(restaurant)
+            lines['Account'].append(account_id)
+            lines['Category'].append(classification[1])
+            lines['Amount'].append(amount)
+    return lines
+
+
+def fetch_profit_and_loss(client, start_str, end_str, stats=None):
+    """Demande le rapport ProfitAndLoss d'une période, ventilé par client."""
+    started = time.perf_counter()
+    report = client.get_report('ProfitAndLoss', {
+        'start_date': start_str,
+        'end_date': end_str,
+        'summarize_column_by': 'Customers',
+    })
+    if stats is not None:
+        stats['pages'] += 1
+        stats['rows'] += sum(1 for _ in iter_report_data_rows(report.get('Rows', {})))
+        stats['elapsed'] += time.perf_counter() - started
+    return report
+
+
+def profit_and_loss_lines(client, start_date, end_date, accounts, stats, classifier=None,
+                          max_workers=MAX_FETCH_WORKERS):
+    """
+    Récupère un rapport ProfitAndLoss par mois et retourne les lignes aplaties (DataFrame).
+
+    Les mois sont demandés en parallèle; `stats` cumule les requêtes et leur durée.
+    """
+    classifier = classifier or get_account_classifier()
+    account_index = classifier.build_index(accounts)
+    periods = month_periods(start_date, end_date)
+    period_stats = [new_fetch_stats() for _ in periods]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        reports = list(executor.map(
+            lambda period, report_stats: fetch_profit_and_loss(client, period[1], period[2], report_stats),
+            periods, period_stats
+        ))
+    for report_stats in period_stats:
+        add_fetch_stats(stats, report_stats)
+
+    columns = {'Month': [], 'Date': [], 'Restaurant': [], 'Account': [], 'Category': [], 'Amount': []}
+    for (month, _, _), report in zip(periods, reports):
+        for name, values in flatten_report(report, month, account_index).items():
+            columns[name].extend(values)
+
+    return pd.DataFrame({
+        'Month': pd.Categorical(columns['Month']),
+        'Restaurant': pd.Categorical(columns['Restaurant']),
+        'Category': pd.Categorical(columns['Category']),
+        'Amount': np.asarray(columns['Amount'], dtype=np.float64),
+        'Date': pd.Categorical(columns['Date']),
+        'Account': pd.Categorical(columns['Account']),
+    })
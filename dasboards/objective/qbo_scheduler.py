@@ -0,0 +1,141 @@
+"""
+Ordonnanceur des requêtes HTTP vers QuickBooks.
+
+QuickBooks limite chaque compagnie (realm) à 500 requêtes par minute et à
+10 requêtes simultanées; le point d'accès batch a sa propre limite de 40 appels
+par minute (de 30 requêtes au plus chacun). L'ordonnanceur se place devant
+chaque requête d'un client : seaux à jetons pour le débit, sémaphore pour la
+concurrence, puis nouvelles tentatives avec attente exponentielle aléatoire sur
+les réponses 429 et 5xx transitoires et sur les erreurs réseau.
+
+Les seaux commencent avec une petite réserve (QBO_BURST) et se remplissent au
+débit qui garde toute fenêtre d'une minute sous la limite, réserve comprise :
+un seau initialement plein permettrait presque deux fois la limite pendant la
+première minute.
+"""
+import random
+import threading
+import time
+
+import requests
+
+# Limites de l'API QuickBooks par compagnie
+QBO_REQUESTS_PER_MINUTE = 500
+QBO_BATCH_REQUESTS_PER_MINUTE = 40
+QBO_MAX_CONCURRENT_REQUESTS = 10
+
+# Requêtes permises d'un coup, avant de suivre le débit régulier
+QBO_BURST = 10
+
+# Codes HTTP qui justifient une nouvelle tentative
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Seau à jetons qui permet `burst` requêtes d'un coup et au plus
+    `requests_per_minute` sur toute fenêtre d'une minute.
+    """
+
+    def __init__(self, requests_per_minute, burst=QBO_BURST):
+        self.capacity = float(min(burst, requests_per_minute))
+        # La réserve compte dans la limite de la minute
+        self.rate = max(requests_per_minute - self.capacity, 1.0) / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Réserve un jeton et attend qu'il soit disponible; retourne le temps d'attente."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Un seau négatif ordonne les requêtes en attente : chacune attend son propre jeton
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def is_batch_request(args, kwargs):
+    """Indique si une requête process_request(method, url, ...) vise le point d'accès batch."""
+    url = kwargs.get('url', args[1] if len(args) > 1 else '')
+    return isinstance(url, str) and url.rstrip('/').endswith('/batch')
+
+
+class RequestScheduler:
+    """Limite le débit et la concurrence des requêtes d'une compagnie et réessaie les échecs transitoires."""
+
+    def __init__(self, requests_per_minute=QBO_REQUESTS_PER_MINUTE,
+                 max_concurrent=QBO_MAX_CONCURRENT_REQUESTS,
+                 max_retries=5, base_delay=1.0, max_delay=60.0,
+                 batch_requests_per_minute=QBO_BATCH_REQUESTS_PER_MINUTE, burst=QBO_BURST):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._bucket = TokenBucket(requests_per_minute, burst)
+        # Un appel batch compte aussi dans la limite générale
+        self._batch_bucket = TokenBucket(batch_requests_per_minute, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'throttled_seconds': 0.0}
+
+    def _count(self, field, value=1):
+        with self._stats_lock:
+            self.stats[field] += value
+
+    def _take_token(self, batch=False):
+        """Attend qu'un jeton soit disponible (et un jeton batch pour un appel batch) et le consomme."""
+        waited = self._batch_bucket.take() if batch else 0.0
+        waited += self._bucket.take()
+        if waited:
+            self._count('throttled_seconds', waited)
+
+    def _backoff_delay(self, attempt, response=None):
+        """Délai avant la prochaine tentative : Retry-After s'il est fourni, sinon exponentiel avec gigue."""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def send(self, send_request, *args, **kwargs):
+        """Exécute `send_request(*args, **kwargs)` en respectant les limites et en réessayant au besoin."""
+        batch = is_batch_request(args, kwargs)
+        attempt = 0
+        while True:
+            self._take_token(batch)
+            response = None
+            with self._slots:
+                self._count('requests')
+                try:
+                    response = send_request(*args, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                        return response
+
+            if response is not None and response.status_code == 429:
+                self._count('throttled')
+            delay = self._backoff_delay(attempt, response)
+            self._count('retries')
+            self._count('throttled_seconds', delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def wrap(self, send_request):
+        """Retourne une version ordonnancée de `send_request` (ex. QuickBooks.process_request)."""
+        def scheduled_request(*args, **kwargs):
+            return self.send(send_request, *args, **kwargs)
+        return scheduled_request
+
+
+def format_scheduler_stats(stats):
+    """Formate les compteurs de l'ordonnanceur pour l'affichage."""
+    return (f"Requêtes QuickBooks: {stats['requests']}, nouvelles tentatives: {stats['retries']} "
+            f"(dont {stats['throttled']} limitées), attente: {stats['throttled_seconds']:.1f} s")
@@ -0,0 +1,104 @@
+"""
+Actualisation en arrière-plan des données partagées (stale-while-revalidate).
+
+Le processus garde une liste de clés à tenir à jour (compagnie, source,
+période), chacune avec sa fonction de récupération. Un fil d'exécution unique
+les revalide dans le cache partagé dès qu'elles dépassent l'intervalle
+configuré. Les sessions servent immédiatement la dernière version disponible,
+avec son âge, sans attendre QuickBooks.
+"""
+import os
+import threading
+
+# Intervalle d'actualisation des clés suivies, en secondes (modifiable par variable d'environnement)
+REFRESH_INTERVAL = float(os.environ.get("JACMAR_REFRESH_INTERVAL", "900"))
+
+# Nombre maximal de clés suivies (les moins récemment demandées sont abandonnées)
+MAX_WATCHED_KEYS = 16
+
+# Attente maximale entre deux passages du fil d'exécution, en secondes
+POLL_INTERVAL = 30.0
+
+
+class RefreshWorker:
+    """Revalide en arrière-plan les clés suivies d'un SharedDataCache."""
+
+    def __init__(self, cache, interval=REFRESH_INTERVAL, max_keys=MAX_WATCHED_KEYS):
+        self.cache = cache
+        self.interval = interval
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.stats = {'refreshes': 0, 'errors': 0}
+        self._errors = {}
+
+    def watch(self, key, fetch):
+        """
+        Suit une clé : `fetch()` sera appelé en arrière-plan chaque fois que sa
+        valeur en cache dépasse l'intervalle. Une clé absente ou périmée est
+        revalidée dès le prochain passage.
+        """
+        with self._lock:
+            self._jobs.pop(key, None)
+            self._jobs[key] = fetch
+            while len(self._jobs) > self.max_keys:
+                del self._jobs[next(iter(self._jobs))]
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="qbo-refresh", daemon=True)
+                self._thread.start()
+        age = self.cache.age(key)
+        if age is None or age >= self.interval:
+            self._wakeup.set()
+
+    def is_stale(self, key):
+        """Indique si la valeur d'une clé est absente ou plus vieille que l'intervalle."""
+        age = self.cache.age(key)
+        return age is None or age >= self.interval
+
+    def last_error(self, key):
+        """Retourne le message du dernier échec de revalidation d'une clé, ou None depuis sa dernière réussite."""
+        with self._lock:
+            return self._errors.get(key)
+
+    def _record(self, key, error):
+        with self._lock:
+            if error is None:
+                self.stats['refreshes'] += 1
+                self._errors.pop(key, None)
+            else:
+                self.stats['errors'] += 1
+                self._errors[key] = error
+                while len(self._errors) > self.max_keys:
+                    del self._errors[next(iter(self._errors))]
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            with self._lock:
+                jobs = list(self._jobs.items())
+
+            next_due = POLL_INTERVAL
+            for key, fetch in jobs:
+                if self.is_stale(key):
+                    try:
+                        # get() regroupe cette revalidation avec une éventuelle récupération en cours
+                        value, _ = self.cache.get(key, fetch, max_age=self.interval)
+                        self._record(key, None if value is not None else "aucune donnée récupérée")
+                    except Exception as error:
+                        self._record(key, str(error))
+                age = self.cache.age(key)
+                if age is not None:
+                    next_due = min(next_due, max(self.interval - age, 1.0))
+
+            self._wakeup.wait(next_due)
+
+
+def format_age(seconds):
+    """Formate l'âge d'une donnée pour l'affichage."""
+    if seconds < 60:
+        return "moins d'une minute"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min"
+    return f"{seconds / 3600:.1f} h"
@@ -0,0 +1,142 @@
+"""
+Cube d'agrégats mensuels : mois × restaurant × catégorie.
+
+Les lignes aplaties sont sommées une seule fois par mois, restaurant (plus
+ALL_RESTAURANTS pour l'ensemble) et catégorie (ventes, coûts des aliments, main
+d'oeuvre). Les sommes cumulées le long des mois donnent le total de n'importe
+quelle période par une simple différence, sans relire les lignes. Le cube se
+convertit en lignes (mois, restaurant, catégorie, montant) pour être enregistré
+dans la base locale (LedgerStore.save_rollup).
+"""
+import hashlib
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from ledger_engine import ALL_RESTAURANTS, CATEGORIES
+
+CATEGORY_INDEX = {category: i for i, category in enumerate(CATEGORIES)}
+
+
+def label_positions(labels, index):
+    """Retourne la position de chaque libellé dans `index` (-1 s'il en est absent)."""
+    return np.array([index.get(label, -1) for label in labels], dtype=np.int64)
+
+
+class RollupCube:
+    """Sommes mois × restaurant × catégorie (CATEGORIES) et leurs cumuls le long des mois."""
+
+    __slots__ = ('months', 'restaurants', 'values', 'cumulative', 'fingerprint',
+                 '_month_index', '_restaurant_index')
+
+    def __init__(self, months, restaurants, values):
+        self.months = list(months)
+        self.restaurants = list(restaurants)
+        self.values = values
+        # cumulative[j] - cumulative[i] : somme des mois i à j - 1
+        self.cumulative = np.concatenate([np.zeros((1,) + values.shape[1:]), values.cumsum(axis=0)])
+        self._month_index = {month: i for i, month in enumerate(self.months)}
+        self._restaurant_index = {restaurant: i for i, restaurant in enumerate(self.restaurants)}
+        digest = hashlib.blake2b(values.tobytes(), digest_size=16)
+        digest.update(repr((self.months, self.restaurants)).encode())
+        self.fingerprint = digest.hexdigest()
+
+    @classmethod
+    def from_lines(cls, lines, months):
+        """
+        Construit le cube des mois `months` (triés) à partir de lignes aplaties
+        (colonnes Month, Restaurant, Category, Amount). Les lignes hors de ces mois
+        ou de CATEGORIES (achats 'Autre') sont ignorées; ALL_RESTAURANTS comprend
+        les lignes sans restaurant.
+        """
+        months = list(months)
+        if lines.empty:
+            return cls(months, [ALL_RESTAURANTS], np.zeros((len(months), 1, len(CATEGORIES))))
+        month_codes = lines['Month'].array
+        restaurant_codes = lines['Restaurant'].array
+        category_codes = lines['Category'].array
+        names = list(restaurant_codes.categories)
+
+        # Position de chaque ligne dans les axes du cube, par les codes des catégories pandas
+        month = label_positions(month_codes.categories, {m: i for i, m in enumerate(months)})[month_codes.codes]
+        category = label_positions(category_codes.categories, CATEGORY_INDEX)[category_codes.codes]
+        restaurant = np.asarray(restaurant_codes.codes, dtype=np.int64) + 1
+        amount = np.asarray(lines['Amount'], dtype=np.float64)
+        keep = (month >= 0) & (category >= 0)
+
+        shape = (len(months), len(names) + 1, len(CATEGORIES))
+        size = shape[0] * shape[1] * shape[2]
+        # Tous restaurants (position 0), puis chaque restaurant
+        cells = (month * shape[1]) * shape[2] + category
+        values = np.bincount(cells[keep], weights=amount[keep], minlength=size)
+        named = keep & (restaurant > 0)
+        values += np.bincount((cells + restaurant * shape[2])[named], weights=amount[named], minlength=size)
+        return cls(months, [ALL_RESTAURANTS] + names, values.reshape(shape))
+
+    @classmethod
+    def from_rows(cls, months, rows):
+        """Reconstruit le cube des mois `months` à partir de lignes (mois, restaurant, catégorie, montant)."""
+        months = sorted(months)
+        restaurants = [ALL_RESTAURANTS] + sorted({row[1] for row in rows} - {ALL_RESTAURANTS})
+        month_index = {month: i for i, month in enumerate(months)}
+        restaurant_index = {restaurant: i for i, restaurant in enumerate(restaurants)}
+        values = np.zeros((len(months), len(restaurants), len(CATEGORIES)))
+        for month, restaurant, category, amount in rows:
+            if month in month_index and category in CATEGORY_INDEX:
+                values[month_index[month], restaurant_index[restaurant], CATEGORY_INDEX[category]] = amount
+        return cls(months, restaurants, values)
+
+    @classmethod
+    def combine(cls, cubes, months):
+        """
+        Assemble des cubes de mois différents (ex. mois enregistrés et mois
+        recalculés) en un cube des mois `months` (triés); pour un mois présent dans
+        plusieurs cubes, le dernier l'emporte.
+        """
+        restaurants = [ALL_RESTAURANTS] + sorted(
+            {restaurant for cube in cubes for restaurant in cube.restaurants} - {ALL_RESTAURANTS}
+        )
+        month_index = {month: i for i, month in enumerate(months)}
+        restaurant_index = {restaurant: i for i, restaurant in enumerate(restaurants)}
+        values = np.zeros((len(months), len(restaurants), len(CATEGORIES)))
+        for cube in cubes:
+            source = [i for i, month in enumerate(cube.months) if month in month_index]
+            target = [month_index[cube.months[i]] for i in source]
+            columns = [restaurant_index[restaurant] for restaurant in cube.restaurants]
+            values[np.ix_(target, columns)] = cube.values[source]
+        return cls(months, restaurants, values)
+
+    def to_rows(self, months=None):
+        """Retourne les sommes non nulles (mois, restaurant, catégorie, montant) des mois demandés (tous par défaut)."""
+        rows = []
+        for month in self.months if months is None else months:
+            i = self._month_index[month]
+            for r, c in zip(*np.nonzero(self.values[i])):
+                rows.append((month, self.restaurants[r], CATEGORIES[c], float(self.values[i, r, c])))
+        return rows
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.cumulative.nbytes
+
+    def matrix(self, months, restaurant=None):
+        """
+        Retourne la matrice mois × CATEGORIES (tableau numpy) d'un restaurant, ou
+        de tous; les mois absents du cube et les restaurants sans ligne valent 0.
+        """
+        result = np.zeros((len(months), len(CATEGORIES)))
+        r = self._restaurant_index.get(restaurant or ALL_RESTAURANTS)
+        if r is None:
+            return result
+        positions = np.array([self._month_index.get(month, -1) for month in months], dtype=np.int64)
+        present = positions >= 0
+        result[present] = self.values[positions[present], r]
+        return result
+
+    def period_totals(self, start_month, end_month, restaurant=None):
+        """Retourne les totaux par catégorie des mois de `start_month` à `end_month` ('AAAA-MM', inclus)."""
+        r = self._restaurant_index.get(restaurant or ALL_RESTAURANTS)
+        if r is None:
+            return np.zeros(len(CATEGORIES))
+        i, j = bisect_left(self.months, start_month), bisect_right(self.months, end_month)
+        return self.cumulative[max(j, i), r] - self.cumulative[i, r]
@@ -0,0 +1,111 @@
+"""
+Cache des données QuickBooks partagé par toutes les sessions du processus.
+
+Les données d'une clé (compagnie, source, période...) sont récupérées une seule
+fois puis servies à toutes les sessions jusqu'à expiration ou invalidation.
+Les demandes simultanées pour une même clé sont regroupées : la première
+session lance la récupération, les autres attendent et reçoivent le même
+résultat. Une vague d'actualisations en fin de mois ne coûte donc qu'une
+récupération. Les valeurs partagées ne doivent pas être modifiées.
+"""
+import threading
+import time
+
+# Durée de validité d'une entrée, en secondes
+SHARED_DATA_TTL = 900
+
+# Nombre maximal d'entrées gardées (les plus anciennes sont retirées)
+SHARED_DATA_MAX_ENTRIES = 32
+
+
+class _Flight:
+    """Récupération en cours pour une clé, partagée par les sessions qui l'attendent."""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SharedDataCache:
+    """Cache clé -> valeur avec expiration et récupération unique par clé."""
+
+    def __init__(self, ttl=SHARED_DATA_TTL, max_entries=SHARED_DATA_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+        self.stats = {'hits': 0, 'fetches': 0, 'coalesced': 0}
+
+    def age(self, key):
+        """Retourne l'âge en secondes de l'entrée d'une clé, ou None si elle est absente."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[1]
+
+    def peek(self, key):
+        """Retourne (valeur, âge en secondes) de la dernière valeur d'une clé, même expirée, ou (None, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        return entry[0], time.monotonic() - entry[1]
+
+    def get(self, key, fetch, max_age=None):
+        """
+        Retourne la valeur d'une clé, en appelant `fetch()` si elle est absente ou trop ancienne.
+
+        `max_age` (secondes, `ttl` par défaut) permet d'exiger une valeur plus
+        récente, par exemple lors d'une actualisation. Si une récupération est
+        déjà en cours pour la clé, son résultat est attendu et partagé au lieu
+        d'en lancer une autre. Un résultat None (échec) n'est pas gardé.
+        Retourne (valeur, source) où source vaut 'cache', 'fetch' ou 'coalesced'.
+        """
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < max_age:
+                self.stats['hits'] += 1
+                return entry[0], 'cache'
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats['fetches'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, 'coalesced'
+
+        try:
+            flight.value = fetch()
+        except Exception as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and flight.value is not None:
+                    self._store(key, flight.value)
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, 'fetch'
+
+    def _store(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = (value, time.monotonic())
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, predicate=None):
+        """Retire les entrées dont la clé satisfait `predicate` (toutes par défaut)."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate is None or predicate(key)]:
+                del self._entries[key]
@@ -0,0 +1,54 @@
+import pytest
+
+from account_index import FOOD_COST, LABOUR, SALES, AccountClassifier, get_account_classifier
+
+
+@pytest.fixture
+def classifier():
+    return get_account_classifier()
+
+
+@pytest.mark.parametrize('account_num, expected', [
+    ('40100', (SALES, 'Ventes')),
+    ('401', (SALES, 'Ventes')),
+    ('51999', (FOOD_COST, 'STAT')),
+    ('51025-1', (FOOD_COST, 'Perte brute')),
+    ('51025-17', (FOOD_COST, 'Perte brute')),
+    ('51025-4', (FOOD_COST, 'Aliments employés')),
+    ('51025', (FOOD_COST, 'STAT')),
+    ('60200', (LABOUR, 'Gestion')),
+    ('60100', (LABOUR, 'Équipiers')),
+    ('40', None),
+    ('70000', None),
+    ('', None),
+])
+def test_longest_prefix_wins(classifier, account_num, expected):
+    assert classifier.classify(account_num) == expected
+
+
+def test_exact_rule_applies_only_to_the_exact_number(classifier):
+    # 60100 est une règle exacte : un numéro plus long retombe sur la règle 60
+    assert classifier.classify('60100') == (LABOUR, 'Équipiers')
+    assert classifier.classify('601001') == (LABOUR, 'Gestion')
+    assert classifier.classify('6010') == (LABOUR, 'Gestion')
+
+
+def test_exact_and_prefix_rules_on_same_number():
+    classifier = AccountClassifier([
+        {'prefix': '5', 'kind': 'A', 'category': 'prefix 5'},
+        {'prefix': '55', 'kind': 'B', 'category': 'exact 55', 'exact': True},
+        {'prefix': '55', 'kind': 'C', 'category': 'prefix 55'},
+    ])
+    assert classifier.classify('55') == ('B', 'exact 55')
+    assert classifier.classify('551') == ('C', 'prefix 55')
+    assert classifier.classify('56') == ('A', 'prefix 5')
+
+
+def test_build_index_keeps_classified_accounts(classifier):
+    accounts = {
+        '1': {'Number': '40100'},
+        '2': {'Number': '70000'},
+        '3': {'Number': None},
+        '4': {'Number': '60100'},
+    }
+    assert classifier.build_index(accounts) == {'1': (SALES, 'Ventes'), '4': (LABOUR, 'Équipiers')}
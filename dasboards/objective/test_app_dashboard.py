@@ -0,0 +1,14 @@
+import pytest
+
+from app_dashboard import get_restaurant_index
+from conftest import RESTAURANTS
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    get_restaurant_index.clear()
+
+
+def test_restaurant_index_maps_customer_names_to_ids(client):
+    assert get_restaurant_index('123', client) == {name: str(i + 1) for i, name in enumerate(RESTAURANTS)}
+
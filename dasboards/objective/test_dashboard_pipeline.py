@@ -0,0 +1,182 @@
+"""
+Comparaisons du pipeline avec un calcul de référence, sur des clients simulés.
+
+La référence agrège les documents par un groupby des lignes aplaties et les
+rapports par une simple somme des montants classés : les cubes, les agrégats
+enregistrés et les tableaux de bord doivent donner les mêmes montants.
+"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from account_index import get_account_classifier
+from conftest import ACCOUNT_NUMBERS, RESTAURANTS, FakeQboClient, make_accounts, make_report_entries
+from dashboard_pipeline import (
+    build_account_map, fetch_snapshot, get_qbo_data, load_rollup_cubes, process_data_for_dashboard
+)
+from ledger_engine import CATEGORIES, SALES_CATEGORY, flatten_qbo_json, month_range, prior_year_period
+from qbo_fields import QboRecord
+
+REALM = FakeQboClient.company_id
+QUARTER = (date(2024, 1, 1), date(2024, 3, 31))
+MID_MONTH = (date(2024, 3, 5), date(2024, 5, 20))
+DOCUMENT_ENTITIES = {'journal_entries': 'JournalEntry', 'invoices': 'Invoice', 'purchases': 'Purchase'}
+
+
+def reference_matrix(documents, start_date, end_date, restaurant=None):
+    """Sommes mois × CATEGORIES des documents de la période, par un groupby des lignes aplaties."""
+    start_str, end_str = start_date.isoformat(), end_date.isoformat()
+    qbo_data = {key: [QboRecord(doc) for doc in documents[entity] if start_str <= doc['TxnDate'] <= end_str]
+                for key, entity in DOCUMENT_ENTITIES.items()}
+    qbo_data['accounts'] = build_account_map(QboRecord(doc) for doc in documents['Account'])
+    lines = flatten_qbo_json(qbo_data)
+    if restaurant is not None:
+        lines = lines[lines['Restaurant'] == restaurant]
+    months = month_range(start_date, end_date)
+    matrix = np.zeros((len(months), len(CATEGORIES)))
+    for (month, category), amount in lines.groupby(['Month', 'Category'], observed=True)['Amount'].sum().items():
+        if category in CATEGORIES:
+            matrix[months.index(month), CATEGORIES.index(category)] = amount
+    return matrix
+
+
+def report_reference_matrix(entries, start_date, end_date, restaurant=None):
+    """Sommes mois × CATEGORIES des montants des rapports simulés, classés par compte."""
+    classifier = get_account_classifier()
+    months = month_range(start_date, end_date)
+    matrix = np.zeros((len(months), len(CATEGORIES)))
+    for day, account_id, entry_restaurant, amount in entries:
+        classification = classifier.classify(ACCOUNT_NUMBERS[int(account_id)])
+        if (classification is None or not start_date.isoformat() <= day <= end_date.isoformat()
+                or restaurant not in (None, entry_restaurant)):
+            continue
+        matrix[months.index(day[:7]), CATEGORIES.index(classification[1])] += amount
+    return matrix
+
+
+def assert_cube_matches(cube, expected_for, start_date, end_date):
+    months = month_range(start_date, end_date)
+    for restaurant in [None] + RESTAURANTS:
+        np.testing.assert_allclose(cube.matrix(months, restaurant),
+                                   expected_for(start_date, end_date, restaurant), atol=1e-6)
+
+
+def test_restaurant_filter_keeps_that_restaurant_documents(client):
+    hull_id = str(RESTAURANTS.index('HULL') + 1)
+    unfiltered = get_qbo_data(client, *QUARTER)
+    client.queries.clear()
+    filtered = get_qbo_data(client, *QUARTER, restaurant_id=hull_id)
+
+    assert any(f"CustomerRef = '{hull_id}'" in query for query in client.queries)
+    assert any(f"EntityRef = '{hull_id}'" in query for query in client.queries)
+    for key, ref in (('invoices', 'CustomerRef'), ('purchases', 'EntityRef')):
+        assert [doc.Id for doc in filtered[key]] == [doc.Id for doc in unfiltered[key]
+                                                     if getattr(doc, ref).value == hull_id]
+    # Les journaux n'ont pas de restaurant au niveau du document : ils restent complets
+    assert len(filtered['journal_entries']) == len(unfiltered['journal_entries'])
+
+
+def test_batched_and_concurrent_fetches_agree(client, documents):
+    concurrent = get_qbo_data(client, *MID_MONTH, prior_year=True)
+    batch_client = FakeQboClient(documents)
+    batched = get_qbo_data(batch_client, *MID_MONTH, prior_year=True, batch=True)
+
+    assert batched['fingerprint'] == concurrent['fingerprint']
+    # Les clients et les documents fournisseurs ne sont lus par aucun calcul
+    assert 'customers' not in batched and 'bills' not in batched
+    assert not any(' FROM Customer ' in query for query in batch_client.queries)
+
+
+@pytest.mark.parametrize('period', [QUARTER, MID_MONTH])
+def test_transaction_snapshot_matches_reference(client, store, documents, period):
+    snapshot = fetch_snapshot(client, store, 'transactions', *period)
+    expected_for = lambda start, end, restaurant: reference_matrix(documents, start, end, restaurant)
+
+    assert_cube_matches(snapshot['cube'], expected_for, *period)
+    assert_cube_matches(snapshot['prior_year']['cube'], expected_for, *prior_year_period(*period))
+
+
+@pytest.mark.parametrize('period', [QUARTER, MID_MONTH])
+def test_report_snapshot_matches_reference(store, period):
+    entries = make_report_entries()
+    client = FakeQboClient({'Account': make_accounts()}, reports=entries)
+    snapshot = fetch_snapshot(client, store, 'reports', *period)
+    expected_for = lambda start, end, restaurant: report_reference_matrix(entries, start, end, restaurant)
+
+    assert_cube_matches(snapshot['cube'], expected_for, *period)
+    assert_cube_matches(snapshot['prior_year']['cube'], expected_for, *prior_year_period(*period))
+
+
+def test_dashboard_matches_reference(client, store, documents):
+    snapshot = fetch_snapshot(client, store, 'transactions', *QUARTER)
+    sales = CATEGORIES.index(SALES_CATEGORY)
+    labour = [CATEGORIES.index(category) for category in ('Équipiers', 'Gestion')]
+
+    for restaurant in [None, 'HULL']:
+        data = process_data_for_dashboard(snapshot, *QUARTER, restaurant)
+        expected = reference_matrix(documents, *QUARTER, restaurant)
+        prior = reference_matrix(documents, *prior_year_period(*QUARTER), restaurant)
+
+        assert data.months == month_range(*QUARTER)
+        np.testing.assert_allclose(data.monthly('Ventes', 'Actuel'), expected[:, sales])
+        np.testing.assert_allclose(data.monthly('Ventes', 'Année précédente'), prior[:, sales])
+        np.testing.assert_allclose(data.monthly('Main d\'oeuvre', 'Total'), expected[:, labour].sum(axis=1))
+        assert data.quarterly('Ventes', 'Actuel') == pytest.approx(expected[:, sales].sum())
+
+
+@pytest.mark.parametrize('source', ['transactions', 'reports'])
+def test_stored_cubes_give_the_same_dashboard(store, documents, source):
+    client = FakeQboClient(documents, reports=make_report_entries())
+    snapshot = fetch_snapshot(client, store, source, *QUARTER)
+    cube, prior_cube = load_rollup_cubes(store, REALM, source, *QUARTER)
+
+    for restaurant in [None] + RESTAURANTS + ['INCONNU']:
+        np.random.seed(1)
+        expected = process_data_for_dashboard(snapshot, *QUARTER, restaurant)
+        np.random.seed(1)
+        data = process_data_for_dashboard(None, *QUARTER, restaurant, cube=cube, prior_cube=prior_cube)
+        np.testing.assert_allclose(data.values, expected.values)
+        assert data.differences == expected.differences
+
+
+def test_stored_months_are_reused(client, store):
+    first = fetch_snapshot(client, store, 'transactions', *QUARTER)
+    client.queries.clear()
+    client.batches.clear()
+    again = fetch_snapshot(client, store, 'transactions', *QUARTER)
+
+    assert again['months_reused'] == 6 and again['months_computed'] == 0
+    assert client.queries == []
+    assert again['fingerprint'] == first['fingerprint']
+
+
+def test_rollups_changed_during_the_fetch_are_not_saved(client, store, documents, monkeypatch):
+    load_objects = store.load_objects
+
+    def load_then_sync(realm_id, entity_cls, *args):
+        # Synchronisation concurrente entre la lecture de la génération et celle des documents
+        store.upsert_documents(realm_id, 'Invoice', [QboRecord(documents['Invoice'][0])])
+        return load_objects(realm_id, entity_cls, *args)
+
+    monkeypatch.setattr(store, 'load_objects', load_then_sync)
+    fetch_snapshot(client, store, 'transactions', *QUARTER)
+
+    months = month_range(*QUARTER)
+    assert store.load_available_rollup(REALM, 'transactions', months) == (set(), [])
+
+
+def test_full_refresh_fetches_only_the_period_months(client, store):
+    first = fetch_snapshot(client, store, 'transactions', *QUARTER)
+    client.queries.clear()
+    refreshed = fetch_snapshot(client, store, 'transactions', *QUARTER, refresh_mode='full')
+
+    queried_years = {query.split("TxnDate >= '")[1][:4] for query in client.queries if 'TxnDate' in query}
+    assert queried_years == {'2024'}
+    assert refreshed['months_reused'] == 3
+    assert refreshed['fingerprint'] == first['fingerprint']
+
+
+def test_mid_month_period_is_not_served_from_rollups(client, store):
+    fetch_snapshot(client, store, 'transactions', *MID_MONTH)
+    assert load_rollup_cubes(store, REALM, 'transactions', *MID_MONTH) is None
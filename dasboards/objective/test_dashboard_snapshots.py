@@ -0,0 +1,112 @@
+import json
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+import dashboard_snapshots
+from dashboard_snapshots import LATEST_FILE, MANIFEST_FILE, load_snapshot, snapshot_dir, write_snapshots
+from kpi_engine import compute_kpis, kpi_matrix
+
+REALM = '123'
+MONTHS = ['2024-01', '2024-02', '2024-03']
+QUARTER = (date(2024, 1, 1), date(2024, 3, 31))
+
+
+def dashboard(scale=1.0):
+    category_matrix = scale * np.array([
+        [1000.0, 10, 0, 5, 5, 0, 200, 50],
+        [2000.0, 20, 10, 0, 0, 10, 300, 100],
+        [1500.0, 15, 0, 0, 5, 5, 250, 80],
+    ])
+    return compute_kpis(MONTHS, kpi_matrix(category_matrix, prior_sales=[900.0, 1800.0, 1600.0],
+                                              fcfp=[120, 130, 140], numerique=[20, 19, 18]))
+
+
+def periods(scale=1.0):
+    return [(*QUARTER, {None: dashboard(scale), 'HULL': dashboard(scale / 2)})]
+
+
+def test_written_snapshot_is_read_back_memory_mapped(tmp_path):
+    write_snapshots(REALM, 'transactions', periods(), root=str(tmp_path))
+
+    for restaurant, scale in ((None, 1.0), ('HULL', 0.5)):
+        data, generated_at = load_snapshot(REALM, 'transactions', *QUARTER, restaurant, root=str(tmp_path))
+        expected = dashboard(scale)
+        np.testing.assert_allclose(data.values, expected.values)
+        assert data.months == MONTHS
+        assert data.differences == expected.differences
+        assert data.maximums == expected.maximums
+        assert generated_at.date() == date.today()
+    # Lecture seule, sans copie du fichier
+    assert isinstance(data.values.base, np.memmap)
+    assert not data.values.flags.writeable
+
+
+def test_missing_period_restaurant_or_source_is_none(tmp_path):
+    write_snapshots(REALM, 'transactions', periods(), root=str(tmp_path))
+
+    assert load_snapshot(REALM, 'transactions', date(2024, 4, 1), date(2024, 6, 30), root=str(tmp_path)) is None
+    assert load_snapshot(REALM, 'transactions', *QUARTER, 'OTTAWA', root=str(tmp_path)) is None
+    assert load_snapshot(REALM, 'reports', *QUARTER, root=str(tmp_path)) is None
+
+
+def test_latest_is_replaced_only_once_the_version_is_complete(tmp_path):
+    first = write_snapshots(REALM, 'transactions', periods(), root=str(tmp_path))
+    base = snapshot_dir(REALM, 'transactions', str(tmp_path))
+    # Une version en cours d'écriture (sans manifeste) n'est pas lue
+    os.makedirs(os.path.join(base, '99999999T999999999999-1'))
+
+    data, _ = load_snapshot(REALM, 'transactions', *QUARTER, root=str(tmp_path))
+    np.testing.assert_allclose(data.values, dashboard().values)
+    with open(os.path.join(base, LATEST_FILE), encoding='utf-8') as f:
+        assert f.read() == os.path.basename(first)
+    assert not [name for name in os.listdir(base) if name.endswith('.tmp')]
+
+    second = write_snapshots(REALM, 'transactions', periods(2.0), root=str(tmp_path))
+    data, _ = load_snapshot(REALM, 'transactions', *QUARTER, root=str(tmp_path))
+    np.testing.assert_allclose(data.values, dashboard(2.0).values)
+    assert second != first
+
+
+def test_old_versions_are_pruned(tmp_path):
+    written = [write_snapshots(REALM, 'transactions', periods(scale), root=str(tmp_path), keep=2)
+               for scale in (1.0, 2.0, 3.0, 4.0)]
+
+    base = snapshot_dir(REALM, 'transactions', str(tmp_path))
+    kept = sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+    assert kept == [os.path.basename(path) for path in written[-2:]]
+
+
+def test_reader_keeps_only_the_published_version(tmp_path):
+    write_snapshots(REALM, 'transactions', periods(), root=str(tmp_path))
+    load_snapshot(REALM, 'transactions', *QUARTER, root=str(tmp_path))
+    second = write_snapshots(REALM, 'transactions', periods(2.0), root=str(tmp_path))
+    load_snapshot(REALM, 'transactions', *QUARTER, root=str(tmp_path))
+
+    base = snapshot_dir(REALM, 'transactions', str(tmp_path))
+    assert dashboard_snapshots._VERSIONS[base][0] == second
+    assert [key for key in dashboard_snapshots._VERSIONS if key.startswith(str(tmp_path))] == [base]
+
+
+def test_unknown_format_is_ignored(tmp_path):
+    version_dir = write_snapshots(REALM, 'reports', periods(), root=str(tmp_path))
+    manifest_path = os.path.join(version_dir, MANIFEST_FILE)
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['format'] = 99
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    assert load_snapshot(REALM, 'reports', *QUARTER, root=str(tmp_path)) is None
+
+
+@pytest.mark.parametrize('content', ['', 'absente'])
+def test_broken_latest_is_none(tmp_path, content):
+    base = snapshot_dir(REALM, 'transactions', str(tmp_path))
+    os.makedirs(base)
+    with open(os.path.join(base, LATEST_FILE), 'w', encoding='utf-8') as f:
+        f.write(content)
+
+    assert load_snapshot(REALM, 'transactions', *QUARTER, root=str(tmp_path)) is None
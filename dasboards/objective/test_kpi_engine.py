@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from kpi_engine import (
+    KPI_INPUTS, METRICS, OBJECTIVES, QUARTER_PERIOD, DashboardData, compute_kpis, kpi_matrix, ratio_percent
+)
+from ledger_engine import CATEGORIES
+
+MONTHS = ['2024-01', '2024-02', '2024-03']
+
+
+def sample_values():
+    # Ventes 1000/2000/0, puis 5 catégories d'aliments et 2 de main d'oeuvre
+    category_matrix = np.array([
+        [1000.0, 10, 0, 5, 5, 0, 200, 50],
+        [2000.0, 20, 10, 0, 0, 10, 300, 100],
+        [0.0, 0, 0, 0, 0, 0, 0, 0],
+    ])
+    return kpi_matrix(category_matrix, prior_sales=[900.0, 0.0, 100.0], fcfp=[120, 130, 140], numerique=[20, 19, 18])
+
+
+def test_kpi_matrix_places_each_input_column():
+    values = sample_values()
+
+    assert values.shape == (3, len(KPI_INPUTS)) and len(CATEGORIES) == 8
+    assert list(values[1]) == [2000.0, 0.0, 20, 10, 0, 0, 10, 300, 100, 130, 19]
+
+
+def test_ratio_percent_is_zero_without_positive_denominator():
+    np.testing.assert_allclose(ratio_percent([50, 10, 10], [200, 0, -5]), [25.0, 0.0, 0.0])
+
+
+def test_monthly_and_quarterly_indicators():
+    kpis = compute_kpis(MONTHS, sample_values())
+
+    january = kpis['monthly']['2024-01']
+    assert january['Ventes']['Croissance'] == pytest.approx(100 / 9)
+    assert january['Coût des aliments']['Total'] == 20
+    assert january['Coût des aliments']['Pourcentage'] == pytest.approx(2.0)
+    assert january["Main d'oeuvre"]['Pourcentage'] == pytest.approx(25.0)
+    # Sans ventes l'année précédente ni ce mois-ci, les pourcentages valent 0
+    assert kpis['monthly']['2024-02']['Ventes']['Croissance'] == 0.0
+    assert kpis['monthly']['2024-03']['Coût des aliments']['Pourcentage'] == 0.0
+
+    quarter = kpis['quarterly']
+    assert quarter['Ventes']['Actuel'] == 3000
+    assert quarter['Ventes']['Croissance'] == pytest.approx(200.0)
+    assert quarter["Main d'oeuvre"]['Total'] == 650
+    assert quarter['FCFP'] == 130 and quarter['Numérique'] == 19
+
+
+def test_differences_and_points_follow_the_objectives():
+    kpis = compute_kpis(MONTHS, sample_values())
+
+    assert kpis['differences']['FCFP'] == OBJECTIVES['FCFP'] - 130
+    assert kpis['differences']['Ventes'] == pytest.approx(5.5 - 200.0)
+    assert kpis['maximums']['Ventes']['Atteint'] == 0
+    assert kpis['maximums']['Numérique']['Atteint'] == 0
+    # Main d'oeuvre à 21,67 % : plus de 1,2 point de l'objectif
+    assert kpis['maximums']["Main d'oeuvre"]['Atteint'] == 0
+    assert kpis['months'] == MONTHS
+
+
+def test_dashboard_data_reads_as_the_dashboard_dictionary():
+    data = compute_kpis(MONTHS, sample_values())
+
+    assert isinstance(data, DashboardData)
+    assert data.periods == MONTHS + [QUARTER_PERIOD]
+    assert data.values.shape == (len(METRICS), len(MONTHS) + 1)
+    np.testing.assert_allclose(data.monthly('Ventes', 'Actuel'), [1000, 2000, 0])
+    assert data.quarterly('FCFP') == 130
+    assert data['monthly']['2024-02']['Coût des aliments']['Total'] == data.monthly('Coût des aliments', 'Total')[1]
+    assert data['quarterly']['Main d\'oeuvre']['Équipiers (%)'] == pytest.approx(500 / 30)
+    assert set(data) == {'monthly', 'quarterly', 'objectives', 'differences', 'maximums', 'months'}
+    with pytest.raises(KeyError):
+        data['inconnu']
@@ -0,0 +1,56 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from conftest import make_documents
+from ledger_columns import LedgerColumns
+from ledger_engine import flatten_qbo_json, month_range
+from qbo_fields import QboRecord
+from rollup_cube import RollupCube
+
+
+def document_lines(detail=True):
+    documents = make_documents(n=50)
+    qbo_data = {key: [QboRecord(doc) for doc in documents[entity]]
+                for key, entity in (('journal_entries', 'JournalEntry'), ('invoices', 'Invoice'),
+                                    ('purchases', 'Purchase'))}
+    qbo_data['accounts'] = {account['Id']: {'Number': account['AcctNum']} for account in documents['Account']}
+    return flatten_qbo_json(qbo_data, detail=detail)
+
+
+def test_columns_rebuild_the_flattened_lines():
+    lines = document_lines()
+    columns = LedgerColumns.from_lines(lines)
+
+    assert len(columns) == len(lines)
+    assert columns.day.dtype == np.int32 and columns.amount.dtype == np.float64
+    pd.testing.assert_frame_equal(columns.to_frame(), document_lines(detail=False))
+
+
+def test_columns_decode_days_restaurants_and_accounts():
+    lines = pd.DataFrame({
+        'Date': pd.Categorical(['2024-01-31', '2024-02-01', '2024-01-31']),
+        'Restaurant': pd.Categorical(['HULL', None, 'OTTAWA']),
+        'Account': pd.Categorical(['7', None, '7']),
+        'Category': pd.Categorical(['Ventes', 'Ventes', 'STAT']),
+        'Amount': [10.0, 20.0, 5.0],
+        'Month': pd.Categorical(['2024-01', '2024-02', '2024-01']),
+    })
+    columns = LedgerColumns.from_lines(lines)
+
+    assert list(columns.day.astype('datetime64[D]').astype(str)) == ['2024-01-31', '2024-02-01', '2024-01-31']
+    assert list(columns.months()) == ['2024-01', '2024-02', '2024-01']
+    # Les valeurs manquantes sont codées -1
+    assert list(columns.restaurant) == [0, -1, 1] and columns.restaurant_names == ['HULL', 'OTTAWA']
+    assert list(columns.account) == [0, -1, 0] and columns.account_ids == ['7']
+    assert columns.nbytes < lines.memory_usage(deep=True).sum()
+
+
+def test_cube_from_columns_matches_cube_from_lines():
+    lines = document_lines()
+    months = month_range(date(2023, 1, 1), date(2024, 12, 31))
+    expected = RollupCube.from_lines(lines, months)
+    cube = RollupCube.from_lines(LedgerColumns.from_lines(lines).to_frame(), months)
+    for restaurant in [None, 'HULL']:
+        np.testing.assert_allclose(cube.matrix(months, restaurant), expected.matrix(months, restaurant))
@@ -0,0 +1,118 @@
+from datetime import date
+
+import numpy as np
+
+from ledger_engine import (
+    CATEGORIES, flatten_qbo_json, lines_fingerprint, month_range, prior_year_period,
+    snapshot_fingerprint
+)
+from qbo_fields import QboRecord
+from rollup_cube import RollupCube
+
+ACCOUNTS = {'1': {'Number': '40100'}, '2': {'Number': '51025-2'}, '3': {'Number': '51999'},
+            '4': {'Number': '60100'}, '5': {'Number': '60200'}, '6': {'Number': '70000'}}
+
+
+def journal_line(amount, posting_type, account_id):
+    return {'Amount': amount, 'DetailType': 'JournalEntryLineDetail',
+            'JournalEntryLineDetail': {'PostingType': posting_type, 'AccountRef': {'value': account_id}}}
+
+
+def sample_data():
+    return {
+        'accounts': ACCOUNTS,
+        'journal_entries': [
+            QboRecord({'Id': '1', 'TxnDate': '2024-01-15', 'Line': [
+                journal_line(100, 'Credit', '1'), journal_line(40, 'Debit', '4'),
+                journal_line(25, 'Debit', '5'), journal_line(9, 'Debit', '6'),
+                {'DetailType': 'DescriptionOnly', 'Description': 'note'},
+            ]}),
+            QboRecord({'Id': '2', 'TxnDate': '2024-02-03', 'Line': [
+                journal_line(12, 'Debit', '2'),
+            ]}),
+        ],
+        'invoices': [
+            QboRecord({'Id': '1', 'TxnDate': '2024-01-20', 'TotalAmt': 500,
+                       'CustomerRef': {'value': '1', 'name': 'HULL'}}),
+            QboRecord({'Id': '2', 'TxnDate': '2024-02-20', 'TotalAmt': 300,
+                       'CustomerRef': {'value': '2', 'name': 'OTTAWA'}}),
+        ],
+        'purchases': [
+            QboRecord({'Id': '1', 'TxnDate': '2024-02-01', 'TotalAmt': 80,
+                       'EntityRef': {'value': '1', 'name': 'HULL'}, 'Line': [
+                           {'Amount': 50, 'DetailType': 'AccountBasedExpenseLineDetail',
+                            'AccountBasedExpenseLineDetail': {'AccountRef': {'value': '6'}}},
+                           {'Amount': 30, 'DetailType': 'AccountBasedExpenseLineDetail',
+                            'AccountBasedExpenseLineDetail': {'AccountRef': {'value': '3'}}},
+                       ]}),
+            QboRecord({'Id': '2', 'TxnDate': '2024-01-05', 'TotalAmt': 15,
+                       'EntityRef': {'value': '2', 'name': 'OTTAWA'}}),
+        ],
+    }
+
+
+def test_flatten_skips_untracked_accounts_and_negates_credits():
+    lines = flatten_qbo_json(sample_data())
+
+    assert lines['Amount'].dtype == np.float64
+    # Journaux (sans restaurant), factures, puis achats
+    assert list(lines['Month']) == ['2024-01', '2024-01', '2024-01', '2024-02',
+                                    '2024-01', '2024-02', '2024-02', '2024-01']
+    assert list(lines['Restaurant'].astype(object).fillna('')) == ['', '', '', '', 'HULL', 'OTTAWA', 'HULL', 'OTTAWA']
+    assert list(lines['Category']) == ['Ventes', 'Équipiers', 'Gestion', 'Perte complétée',
+                                       'Ventes', 'Ventes', 'STAT', 'Autre']
+    # Le compte 70000 n'est pas suivi; l'achat prend la catégorie de sa première ligne de compte 51
+    # et, sans ligne, reste 'Autre'
+    assert list(lines['Amount']) == [-100.0, 40.0, 25.0, 12.0, 500.0, 300.0, 80.0, 15.0]
+
+
+def test_cube_of_flattened_lines_sums_each_cell():
+    months = ['2024-01', '2024-02', '2024-03']
+    cube = RollupCube.from_lines(flatten_qbo_json(sample_data()), months)
+    matrix = cube.matrix(months)
+    sales, stat = CATEGORIES.index('Ventes'), CATEGORIES.index('STAT')
+
+    assert matrix[0, sales] == 400.0
+    assert matrix[1, sales] == 300.0
+    assert matrix[1, stat] == 80.0
+    assert matrix[0, CATEGORIES.index('Gestion')] == 25.0
+    assert not matrix[2].any()
+
+    hull = cube.matrix(months[:2], 'HULL')
+    assert hull[0, sales] == 500.0
+    assert hull[1, stat] == 80.0
+    assert hull[1, sales] == 0.0
+    assert not cube.matrix(months, 'MONTREAL').any()
+
+
+def test_month_range_spans_years():
+    assert month_range(date(2023, 11, 20), date(2024, 2, 1)) == ['2023-11', '2023-12', '2024-01', '2024-02']
+
+
+def test_prior_year_period_moves_leap_day():
+    assert prior_year_period(date(2024, 1, 1), date(2024, 2, 29)) == (date(2023, 1, 1), date(2023, 2, 28))
+
+
+def test_fingerprint_changes_only_with_content():
+    data = sample_data()
+    fingerprint = snapshot_fingerprint(data)
+    assert snapshot_fingerprint(sample_data()) == fingerprint
+
+    # Document modifié dans QuickBooks : son SyncToken change
+    data['invoices'][0].to_dict()['SyncToken'] = '1'
+    assert snapshot_fingerprint(data) != fingerprint
+    data = sample_data()
+    data['purchases'].pop()
+    assert snapshot_fingerprint(data) != fingerprint
+    data = sample_data()
+    data['prior_year'] = sample_data()
+    assert snapshot_fingerprint(data) != fingerprint
+
+
+def test_lines_fingerprint_follows_amounts():
+    lines = flatten_qbo_json(sample_data())
+    fingerprint = lines_fingerprint(lines)
+    assert lines_fingerprint(flatten_qbo_json(sample_data())) == fingerprint
+
+    lines.loc[0, 'Amount'] += 1
+    assert lines_fingerprint(lines) != fingerprint
@@ -0,0 +1,163 @@
+from datetime import date, timedelta
+
+from quickbooks.objects.invoice import Invoice
+
+from ledger_store import DOCUMENT_ROLLUP_SOURCE, merge_ranges, month_keys
+from qbo_fields import QboRecord
+
+REALM = '123'
+
+
+def invoice(doc_id, txn_date, amount):
+    return QboRecord({'Id': doc_id, 'TxnDate': txn_date, 'TotalAmt': amount})
+
+
+def test_merge_ranges_joins_overlapping_and_adjacent_ranges():
+    ranges = [(date(2024, 3, 1), date(2024, 3, 31)), (date(2024, 1, 1), date(2024, 1, 31)),
+              (date(2024, 2, 1), date(2024, 2, 10)), (date(2024, 3, 15), date(2024, 4, 5))]
+    assert merge_ranges(ranges) == [(date(2024, 1, 1), date(2024, 2, 10)), (date(2024, 3, 1), date(2024, 4, 5))]
+
+
+def test_month_keys_spans_years():
+    assert month_keys(date(2023, 11, 20), '2024-02-01') == ['2023-11', '2023-12', '2024-01', '2024-02']
+
+
+def test_missing_ranges_of_empty_store_is_whole_period(store):
+    assert store.missing_ranges(REALM, 'Invoice', date(2024, 1, 1), date(2024, 3, 31)) == [
+        (date(2024, 1, 1), date(2024, 3, 31))
+    ]
+
+
+def test_missing_ranges_returns_gaps_between_covered_ranges(store):
+    store.mark_covered(REALM, 'Invoice', date(2024, 1, 1), date(2024, 1, 31))
+    store.mark_covered(REALM, 'Invoice', date(2024, 3, 1), date(2024, 3, 31))
+
+    assert store.missing_ranges(REALM, 'Invoice', date(2023, 12, 15), date(2024, 4, 10)) == [
+        (date(2023, 12, 15), date(2023, 12, 31)),
+        (date(2024, 2, 1), date(2024, 2, 29)),
+        (date(2024, 4, 1), date(2024, 4, 10)),
+    ]
+    assert store.missing_ranges(REALM, 'Invoice', date(2024, 1, 5), date(2024, 1, 20)) == []
+    assert store.covers(REALM, ['Invoice'], date(2024, 3, 1), date(2024, 3, 31))
+    assert not store.covers(REALM, ['Invoice', 'Purchase'], date(2024, 3, 1), date(2024, 3, 31))
+
+
+def test_mark_covered_merges_ranges_and_separates_realms_and_entities(store):
+    store.mark_covered(REALM, 'Invoice', date(2024, 1, 1), date(2024, 1, 31))
+    store.mark_covered(REALM, 'Invoice', date(2024, 2, 1), date(2024, 2, 29))
+    store.mark_covered(REALM, 'Invoice', date(2024, 1, 15), date(2024, 2, 10))
+
+    assert store.covered_ranges(REALM, 'Invoice') == [(date(2024, 1, 1), date(2024, 2, 29))]
+    assert store.covered_ranges(REALM, 'Purchase') == []
+    assert store.covered_ranges('456', 'Invoice') == []
+
+
+def test_mark_covered_never_covers_today(store):
+    today = date.today()
+    store.mark_covered(REALM, 'Invoice', today - timedelta(days=3), today)
+    assert store.covered_ranges(REALM, 'Invoice') == [(today - timedelta(days=3), today - timedelta(days=1))]
+
+    store.mark_covered(REALM, 'Purchase', today, today)
+    assert store.covered_ranges(REALM, 'Purchase') == []
+
+
+def test_replace_range_keeps_documents_outside_range(store):
+    store.replace_range(REALM, 'Invoice', date(2024, 1, 1), date(2024, 2, 29), [
+        invoice('1', '2024-01-10', 10), invoice('2', '2024-02-10', 20),
+    ])
+    store.replace_range(REALM, 'Invoice', date(2024, 2, 1), date(2024, 2, 29), [
+        invoice('3', '2024-02-11', 30),
+    ])
+
+    assert sorted(doc['Id'] for doc in store.load_documents(REALM, 'Invoice')) == ['1', '3']
+    loaded = store.load_objects(REALM, Invoice, date(2024, 2, 1), date(2024, 2, 29))
+    assert [(obj.Id, obj.TotalAmt) for obj in loaded] == [('3', 30)]
+
+
+def test_replace_all_marks_the_list_complete(store):
+    assert not store.has_complete_list(REALM, 'Account')
+    store.upsert_documents(REALM, 'Account', [QboRecord({'Id': '1', 'Name': 'A1'})])
+    assert not store.has_complete_list(REALM, 'Account')
+
+    store.replace_all(REALM, 'Account', [QboRecord({'Id': '2', 'Name': 'A2'})])
+    assert store.has_complete_list(REALM, 'Account')
+    assert [doc['Id'] for doc in store.load_documents(REALM, 'Account')] == ['2']
+    assert not store.has_complete_list('456', 'Account')
+
+
+def test_uncover_splits_covered_range(store):
+    store.mark_covered(REALM, 'Invoice', date(2024, 1, 1), date(2024, 6, 30))
+    store.uncover(REALM, 'Invoice', date(2024, 3, 1), date(2024, 3, 31))
+
+    assert store.covered_ranges(REALM, 'Invoice') == [
+        (date(2024, 1, 1), date(2024, 2, 29)), (date(2024, 4, 1), date(2024, 6, 30))
+    ]
+    assert store.missing_ranges(REALM, 'Invoice', date(2024, 1, 1), date(2024, 6, 30)) == [
+        (date(2024, 3, 1), date(2024, 3, 31))
+    ]
+
+
+def test_uncover_removes_ranges_inside_period(store):
+    store.mark_covered(REALM, 'Invoice', date(2024, 2, 1), date(2024, 2, 29))
+    store.mark_covered(REALM, 'Invoice', date(2024, 5, 1), date(2024, 5, 31))
+    store.uncover(REALM, 'Invoice', date(2024, 1, 1), date(2024, 3, 31))
+
+    assert store.covered_ranges(REALM, 'Invoice') == [(date(2024, 5, 1), date(2024, 5, 31))]
+
+
+def test_rollups_are_dropped_for_modified_months(store):
+    rows = [('2024-01', 'Tous', 'Ventes', 10.0), ('2024-02', 'Tous', 'Ventes', 20.0)]
+    store.replace_range(REALM, 'Invoice', date(2024, 1, 1), date(2024, 2, 29), [invoice('1', '2024-01-10', 10)])
+    store.save_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01', '2024-02'], rows)
+    assert sorted(store.load_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01', '2024-02'])) == rows
+
+    # Document déplacé de janvier à février : les deux mois sont à recalculer
+    store.upsert_documents(REALM, 'Invoice', [invoice('1', '2024-02-03', 10)])
+    assert store.load_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01']) is None
+    assert store.load_available_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01', '2024-02']) == (set(), [])
+
+
+def test_rollup_is_not_saved_after_a_concurrent_change(store):
+    rows = [('2024-01', 'Tous', 'Ventes', 10.0)]
+    generation = store.rollup_generation(REALM)
+    # Modification entre la lecture des documents et l'enregistrement de leurs agrégats
+    store.upsert_documents(REALM, 'Invoice', [invoice('1', '2024-01-10', 10)])
+
+    assert not store.save_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01'], rows, generation=generation)
+    assert store.load_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01']) is None
+
+    assert store.save_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01'], rows,
+                             generation=store.rollup_generation(REALM))
+    assert store.load_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01']) == rows
+
+
+def test_document_and_account_changes_bump_the_generation(store):
+    store.replace_range(REALM, 'Invoice', date(2024, 1, 1), date(2024, 1, 31), [])
+    store.upsert_documents(REALM, 'Account', [QboRecord({'Id': '7', 'AcctNum': '40100'})])
+    assert store.rollup_generation(REALM) == 2
+    # Aucun mois touché : rien à retirer
+    store.upsert_documents(REALM, 'Invoice', [])
+    assert store.rollup_generation(REALM) == 2
+
+
+def test_load_available_rollup_returns_the_stored_months(store):
+    store.save_rollup(REALM, 'reports', ['2024-01', '2024-03'], [('2024-01', 'Tous', 'Ventes', 1.0),
+                                                                 ('2024-03', 'HULL', 'STAT', 2.0)])
+    months, rows = store.load_available_rollup(REALM, 'reports', ['2024-01', '2024-02', '2024-03'])
+    assert months == {'2024-01', '2024-03'}
+    assert sorted(rows) == [('2024-01', 'Tous', 'Ventes', 1.0), ('2024-03', 'HULL', 'STAT', 2.0)]
+
+
+def test_account_changes_drop_all_document_rollups_only(store):
+    store.save_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01'], [('2024-01', 'Tous', 'Ventes', 10.0)])
+    store.save_rollup(REALM, 'reports', ['2024-01'], [('2024-01', 'Tous', 'Ventes', 12.0)])
+    store.upsert_documents(REALM, 'Account', [QboRecord({'Id': '7', 'AcctNum': '40100'})])
+
+    assert store.load_rollup(REALM, DOCUMENT_ROLLUP_SOURCE, ['2024-01']) is None
+    assert store.load_rollup(REALM, 'reports', ['2024-01']) == [('2024-01', 'Tous', 'Ventes', 12.0)]
+
+
+def test_load_rollup_honours_max_age(store):
+    store.save_rollup(REALM, 'reports', ['2024-01'], [('2024-01', 'Tous', 'Ventes', 12.0)])
+    assert store.load_rollup(REALM, 'reports', ['2024-01'], max_age=3600) is not None
+    assert store.load_rollup(REALM, 'reports', ['2024-01'], max_age=-1) is None
@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import precompute_dashboards
+from conftest import RESTAURANTS, FakeQboClient
+from dashboard_pipeline import fetch_snapshot, process_data_for_dashboard
+from ledger_engine import quarter_period
+from precompute_dashboards import main, precompute_period, quarters_to_precompute
+
+QUARTER = quarter_period(2024, 1)
+
+
+def test_quarters_stop_at_the_current_quarter():
+    assert quarters_to_precompute(2, today=datetime(2024, 5, 10)) == [
+        (2023, 1), (2023, 2), (2023, 3), (2023, 4), (2024, 1), (2024, 2)
+    ]
+
+
+def test_precompute_period_covers_every_restaurant(client, store):
+    dashboards = precompute_period(client, store, 'transactions', *QUARTER)
+    snapshot = fetch_snapshot(FakeQboClient(client.documents), store, 'transactions', *QUARTER)
+
+    assert list(dashboards) == [None] + RESTAURANTS
+    for restaurant, data in dashboards.items():
+        expected = process_data_for_dashboard(snapshot, *QUARTER, restaurant)
+        assert data.months == expected.months
+        # FCFP et numérique sont simulés (aléatoires) : seules les ventes sont comparées
+        np.testing.assert_allclose(data.monthly('Ventes', 'Actuel'), expected.monthly('Ventes', 'Actuel'))
+        np.testing.assert_allclose(data.monthly('Ventes', 'Année précédente'),
+                                   expected.monthly('Ventes', 'Année précédente'))
+
+
+def test_failed_period_is_reported_on_stderr(documents, store, capsys):
+    class FailingClient(FakeQboClient):
+        def query(self, query):
+            raise RuntimeError('quota')
+
+    assert precompute_period(FailingClient(documents), store, 'transactions', *QUARTER) is None
+    assert "ÉCHEC: 2024-01-01 au 2024-03-31: RuntimeError: quota" in capsys.readouterr().err
+
+
+@pytest.fixture
+def argv(client, tmp_path, monkeypatch):
+    """Arguments de main, sur le client simulé, pour les trimestres 1 et 2 de 2024."""
+    monkeypatch.setattr(precompute_dashboards, 'connect_headless', lambda token_file: SimpleNamespace(client=client))
+    monkeypatch.setattr(precompute_dashboards, 'quarters_to_precompute', lambda years: [(2024, 1), (2024, 2)])
+    return ['--store', str(tmp_path / 'ledger.db'), '--output', str(tmp_path / 'snapshots')]
+
+
+def test_failures_and_summary_go_to_stderr(argv, tmp_path, monkeypatch, capsys):
+    def fetch_first_quarter(client, store, source, start_date, end_date, refresh_mode=None):
+        if start_date.month > 1:
+            raise RuntimeError('quota')
+        return fetch_snapshot(client, store, source, start_date, end_date, refresh_mode=refresh_mode)
+
+    monkeypatch.setattr(precompute_dashboards, 'fetch_snapshot', fetch_first_quarter)
+    assert main(argv) == 1
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert "ÉCHEC: 2024-04-01 au 2024-06-30: RuntimeError: quota" in err
+    assert "(1 trimestres) publiés" in err
+    assert "ÉCHEC: trimestres non calculés (début): 2024-04" in err
+    assert os.listdir(tmp_path / 'snapshots')
+
+
+def test_empty_snapshots_fail_without_publishing(argv, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(precompute_dashboards, 'fetch_snapshot', lambda *args, **kwargs: None)
+    assert main(argv) == 1
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert "ÉCHEC: 2024-01-01 au 2024-03-31: aucune donnée récupérée" in err
+    assert "ÉCHEC: aucune période n'a pu être calculée" in err
+    assert not (tmp_path / 'snapshots').exists()
@@ -0,0 +1,90 @@
+import time
+
+import intuitlib.client
+import pytest
+
+import qbo_client
+from qbo_client import TOKEN_REFRESH_MARGIN, forget_client, get_registered_client, verify_realm_access
+
+
+class FakeAuthClient:
+    """AuthClient sans réseau : chaque renouvellement remplace les deux jetons."""
+
+    instances = []
+
+    def __init__(self, client_id, client_secret, redirect_uri, environment, refresh_token=None, realm_id=None):
+        self.client_id = client_id
+        self.environment = environment
+        self.refresh_token = refresh_token
+        self.access_token = None
+        self.expires_in = 3600
+        self.refreshes = 0
+        FakeAuthClient.instances.append(self)
+
+    def refresh(self, refresh_token=None):
+        self.refreshes += 1
+        self.access_token = f"access-{self.refreshes}"
+        self.refresh_token = f"refresh-{self.refreshes}"
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    FakeAuthClient.instances = []
+    monkeypatch.setattr(intuitlib.client, 'AuthClient', FakeAuthClient)
+    monkeypatch.setattr(qbo_client, '_CLIENTS', {})
+
+
+def register(realm_id='123', refresh_token='initial'):
+    return get_registered_client('id', 'secret', 'https://app.test', 'sandbox', realm_id, refresh_token)
+
+
+def test_client_is_created_once_per_realm():
+    first = register()
+    assert register() is first
+    assert register('456') is not first
+    assert len(FakeAuthClient.instances) == 2
+    # Un seul renouvellement à la création, pas à chaque rerun
+    assert first.auth_client.refreshes == 1
+    assert first.refresh_token == 'refresh-1'
+
+
+def test_token_is_refreshed_only_near_expiry():
+    registered = register()
+    session = registered.client.session
+
+    registered.ensure_fresh()
+    assert registered.auth_client.refreshes == 1
+
+    registered.expires_at = time.time() + TOKEN_REFRESH_MARGIN - 1
+    registered.ensure_fresh()
+    assert registered.auth_client.refreshes == 2
+    assert registered.client.session is session
+    assert session.token['access_token'] == 'access-2'
+    assert registered.expires_at > time.time() + TOKEN_REFRESH_MARGIN
+
+
+def test_forget_client_drops_only_that_realm():
+    first, other = register(), register('456')
+    forget_client('123')
+
+    assert register() is not first
+    assert register('456') is other
+
+
+@pytest.mark.parametrize('status_code, expected', [(200, True), (401, False), (403, False)])
+def test_verify_realm_access_reads_company_info(monkeypatch, status_code, expected):
+    requests_made = []
+
+    def fake_get(url, headers, timeout):
+        requests_made.append((url, headers['Authorization']))
+        return type('Response', (), {'status_code': status_code})()
+    monkeypatch.setattr(qbo_client.requests, 'get', fake_get)
+
+    assert verify_realm_access('token', '123', 'sandbox') is expected
+    assert requests_made == [("https://sandbox-quickbooks.api.intuit.com/v3/company/123/companyinfo/123",
+                              "Bearer token")]
+
+
+def test_verify_realm_access_rejects_malformed_realm(monkeypatch):
+    monkeypatch.setattr(qbo_client.requests, 'get', None)
+    assert not verify_realm_access('token', '123/../456', 'production')
@@ -0,0 +1,256 @@
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from quickbooks.exceptions import QuickbooksException
+from quickbooks.objects.account import Account
+from quickbooks.objects.invoice import Invoice
+from quickbooks.objects.journalentry import JournalEntry
+from quickbooks.objects.purchase import Purchase
+
+from conftest import FakeQboClient, FakeResponse
+from qbo_fetch import (
+    fetch_all, fetch_batched, fetch_concurrently, fetch_with_store, iter_qbo_pages, new_fetch_stats,
+    sync_changes, txn_date_clause, utc_timestamp
+)
+
+REALM = FakeQboClient.company_id
+
+ENTITY_QUERIES = {
+    'journal_entries': (JournalEntry, txn_date_clause('2024-01-01', '2024-06-30')),
+    'invoices': (Invoice, txn_date_clause('2024-01-01', '2024-06-30')),
+    'purchases': (Purchase, ""),
+    'accounts': (Account, "Active = true"),
+}
+
+
+def ids(records):
+    return [record.Id for record in records]
+
+
+def test_fetch_all_follows_pages(client, documents):
+    stats = new_fetch_stats()
+    records = fetch_all(Invoice, client, page_size=30, stats=stats)
+
+    assert ids(records) == [doc['Id'] for doc in documents['Invoice']]
+    assert stats['pages'] == len(documents['Invoice']) // 30 + 1
+    assert stats['rows'] == len(documents['Invoice'])
+    assert "STARTPOSITION 31 MAXRESULTS 30" in client.queries[1]
+    # Seuls les champs déclarés sont demandés et gardés
+    assert client.queries[0].startswith("SELECT Id, SyncToken, TxnDate, TotalAmt, CustomerRef FROM Invoice")
+    assert set(records[0].to_dict()) <= {'Id', 'SyncToken', 'TxnDate', 'TotalAmt', 'CustomerRef'}
+
+
+def test_full_last_page_needs_one_empty_page(client, documents):
+    stats = new_fetch_stats()
+    pages = list(iter_qbo_pages(Invoice, client, page_size=50, stats=stats))
+
+    assert [len(page) for page in pages] == [50] * (len(documents['Invoice']) // 50)
+    assert stats['pages'] == len(pages) + 1
+
+
+def test_where_clause_filters_every_page(client, documents):
+    where_clause = txn_date_clause('2024-01-01', '2024-06-30')
+    records = fetch_all(Invoice, client, where_clause, page_size=10)
+
+    assert ids(records) == [doc['Id'] for doc in documents['Invoice']
+                            if '2024-01-01' <= doc['TxnDate'] <= '2024-06-30']
+    assert all(where_clause in query for query in client.queries)
+
+
+def test_fetch_concurrently_matches_sequential_fetches(client, documents):
+    stats = {key: new_fetch_stats() for key in ENTITY_QUERIES}
+    results = fetch_concurrently(ENTITY_QUERIES, client, stats)
+
+    sequential = FakeQboClient(documents)
+    for key, (entity_cls, where_clause) in ENTITY_QUERIES.items():
+        assert ids(results[key]) == ids(fetch_all(entity_cls, sequential, where_clause))
+        assert stats[key]['rows'] == len(results[key])
+
+
+def test_fetch_concurrently_runs_entities_in_parallel(documents):
+    # Chaque requête attend que toutes les entités aient commencé : un enchaînement séquentiel bloquerait
+    barrier = threading.Barrier(len(ENTITY_QUERIES), timeout=5)
+
+    class ParallelClient(FakeQboClient):
+        def query(self, select):
+            if 'STARTPOSITION 1 ' in select:
+                barrier.wait()
+            return super().query(select)
+
+    results = fetch_concurrently(ENTITY_QUERIES, ParallelClient(documents),
+                                 {key: new_fetch_stats() for key in ENTITY_QUERIES})
+    assert set(results) == set(ENTITY_QUERIES)
+
+
+def test_fetch_concurrently_raises_worker_errors(documents):
+    class FailingClient(FakeQboClient):
+        def query(self, select):
+            if ' FROM Purchase ' in select:
+                raise RuntimeError('quota')
+            return super().query(select)
+
+    with pytest.raises(RuntimeError, match='quota'):
+        fetch_concurrently(ENTITY_QUERIES, FailingClient(documents),
+                           {key: new_fetch_stats() for key in ENTITY_QUERIES})
+
+
+@pytest.mark.parametrize('page_size', [7, 50, 1000])
+def test_fetch_batched_matches_fetch_concurrently(client, page_size):
+    expected = fetch_concurrently(ENTITY_QUERIES, FakeQboClient(client.documents),
+                                  {key: new_fetch_stats() for key in ENTITY_QUERIES})
+    stats = {key: new_fetch_stats() for key in ENTITY_QUERIES}
+    batched = fetch_batched(ENTITY_QUERIES, client, stats, page_size=page_size)
+
+    assert {key: ids(records) for key, records in batched.items()} == \
+           {key: ids(records) for key, records in expected.items()}
+    assert all(len(batch) <= 30 for batch in client.batches)
+    assert {key: stats[key]['rows'] for key in stats} == {key: len(batched[key]) for key in batched}
+
+
+def test_fetch_batched_reads_ahead_only_for_full_entities(client):
+    stats = {key: new_fetch_stats() for key in ENTITY_QUERIES}
+    fetch_batched(ENTITY_QUERIES, client, stats, max_items=8, page_size=20)
+
+    # Premier appel : une page par entité; ensuite les places vont aux entités dont la page était pleine
+    assert [query.split(' FROM ')[1].split()[0] for query in client.batches[0]] == \
+           ['JournalEntry', 'Invoice', 'Purchase', 'Account']
+    assert not any(' FROM Account ' in query for batch in client.batches[1:] for query in batch)
+    assert len(client.batches[1]) == 6
+    assert stats['accounts']['pages'] == 1
+
+
+def test_fetch_batched_raises_item_faults(documents):
+    class FaultClient(FakeQboClient):
+        def process_request(self, method, url, headers=None, params=None, data=None):
+            body = json.loads(super().process_request(method, url, headers, params, data).content)
+            body['BatchItemResponse'][1] = {'bId': '1', 'Fault': {'Error': [
+                {'Message': 'Throttled', 'code': '3001', 'Detail': 'quota'}]}}
+            return FakeResponse(body)
+
+    with pytest.raises(QuickbooksException, match='Throttled'):
+        fetch_batched(ENTITY_QUERIES, FaultClient(documents), {key: new_fetch_stats() for key in ENTITY_QUERIES})
+
+
+@pytest.mark.parametrize('drop', [lambda items: items.pop(2), lambda items: items[2].pop('QueryResponse')])
+def test_fetch_batched_raises_on_missing_items(documents, drop):
+    class MissingItemClient(FakeQboClient):
+        def process_request(self, method, url, headers=None, params=None, data=None):
+            body = json.loads(super().process_request(method, url, headers, params, data).content)
+            drop(body['BatchItemResponse'])
+            return FakeResponse(body)
+
+    with pytest.raises(QuickbooksException, match='missing items') as error:
+        fetch_batched(ENTITY_QUERIES, MissingItemClient(documents),
+                      {key: new_fetch_stats() for key in ENTITY_QUERIES})
+    assert error.value.detail == "bId sans QueryResponse: 2"
+
+
+def test_fetch_with_store_requests_only_missing_ranges(client, store):
+    dated = {'invoices': (Invoice, date(2024, 1, 1), date(2024, 3, 31))}
+    lists = {'accounts': (Account, "Active = true")}
+    stats = {key: new_fetch_stats() for key in ('invoices', 'accounts')}
+
+    first = fetch_with_store(store, client, dated, lists, stats)
+    expected = [doc['Id'] for doc in client.documents['Invoice'] if '2024-01-01' <= doc['TxnDate'] <= '2024-03-31']
+    assert sorted(ids(first['invoices'])) == sorted(expected)
+    assert len(first['accounts']) == len(client.documents['Account'])
+    assert stats['invoices']['rows'] == len(expected)
+    assert store.get_watermark(REALM) is not None
+
+    # Période couverte : aucune requête; période élargie : seule la plage absente est demandée
+    client.queries.clear()
+    fetch_with_store(store, client, dated, lists, stats)
+    assert client.queries == []
+    fetch_with_store(store, client, {'invoices': (Invoice, date(2024, 1, 1), date(2024, 4, 30))}, lists, stats)
+    assert len(client.queries) == 1 and txn_date_clause('2024-04-01', '2024-04-30') in client.queries[0]
+
+
+
+def test_watermark_is_set_only_once_everything_is_stored(documents, store):
+    class FailingClient(FakeQboClient):
+        def query(self, query):
+            if ' FROM Account ' in query:
+                raise RuntimeError('quota')
+            return super().query(query)
+
+    dated = {'invoices': (Invoice, date(2024, 1, 1), date(2024, 3, 31))}
+    lists = {'accounts': (Account, "Active = true")}
+    stats = {key: new_fetch_stats() for key in ('invoices', 'accounts')}
+    with pytest.raises(RuntimeError):
+        fetch_with_store(store, FailingClient(documents), dated, lists, stats)
+    assert store.get_watermark(REALM) is None
+
+    results = fetch_with_store(store, FakeQboClient(documents), dated, lists, stats)
+    assert len(results['accounts']) == len(documents['Account'])
+    assert store.get_watermark(REALM) is not None
+
+
+def test_accounts_from_changes_do_not_complete_the_list(client, store):
+    # Un compte modifié, capté par CDC avant toute récupération de la liste des comptes
+    store.set_watermark(REALM, utc_timestamp())
+    client.changes = {'Account': [dict(client.documents['Account'][0], Name='Modifié')]}
+    sync_changes(store, client, {'accounts': Account}, {'accounts': new_fetch_stats()})
+    assert len(store.load_documents(REALM, 'Account')) == 1
+
+    results = fetch_with_store(store, client, {}, {'accounts': (Account, "Active = true")},
+                               {'accounts': new_fetch_stats()})
+    assert len(results['accounts']) == len(client.documents['Account'])
+    assert store.has_complete_list(REALM, 'Account')
+
+def test_fetch_with_store_keeps_each_period_under_its_key(client, store):
+    dated = {'invoices': (Invoice, date(2024, 1, 1), date(2024, 3, 31)),
+             'prior_year_invoices': (Invoice, date(2023, 1, 1), date(2023, 3, 31))}
+    results = fetch_with_store(store, client, dated, {}, {key: new_fetch_stats() for key in dated})
+
+    for key, (_, start, end) in dated.items():
+        expected = [doc['Id'] for doc in client.documents['Invoice']
+                    if start.isoformat() <= doc['TxnDate'] <= end.isoformat()]
+        assert sorted(ids(results[key])) == sorted(expected)
+
+
+def test_sync_changes_merges_cdc_response(client, store):
+    fetch_with_store(store, client, {'invoices': (Invoice, date(2024, 1, 1), date(2024, 12, 31))}, {},
+                     {'invoices': new_fetch_stats()})
+    stored = {doc['Id']: doc for doc in store.load_documents(REALM, 'Invoice')}
+    deleted_id, updated_id = sorted(stored)[:2]
+    watermark = store.get_watermark(REALM)
+
+    client.changes = {'Invoice': [
+        {'Id': deleted_id, 'status': 'Deleted'},
+        {'Id': updated_id, 'SyncToken': '1', 'TxnDate': '2024-02-02', 'TotalAmt': 7, 'Extra': 'ignored'},
+        {'Id': 'new', 'SyncToken': '0', 'TxnDate': '2024-03-03', 'TotalAmt': 9},
+    ]}
+    client.queries.clear()
+    stats = {key: new_fetch_stats() for key in ('journal_entries', 'invoices')}
+    sync_changes(store, client, {'journal_entries': JournalEntry, 'invoices': Invoice}, stats)
+
+    after = {doc['Id']: doc for doc in store.load_documents(REALM, 'Invoice')}
+    assert deleted_id not in after
+    assert after[updated_id] == {'Id': updated_id, 'SyncToken': '1', 'TxnDate': '2024-02-02', 'TotalAmt': 7}
+    assert after['new']['TotalAmt'] == 9
+    assert len(after) == len(stored)
+    # CDC répond pour toutes les entités : pas de requête de repli
+    assert client.queries == []
+    assert stats['invoices']['rows'] == 3
+    assert store.get_watermark(REALM) >= watermark
+
+
+def test_sync_changes_falls_back_to_last_updated_time(client, store):
+    old_watermark = (datetime.now(timezone.utc) - timedelta(days=45)).isoformat(timespec='seconds')
+    store.set_watermark(REALM, old_watermark)
+    client.change_data_capture = None
+    client.documents = {'Invoice': [{'Id': '1', 'SyncToken': '2', 'TxnDate': '2024-05-05', 'TotalAmt': 3}]}
+
+    sync_changes(store, client, {'invoices': Invoice}, {'invoices': new_fetch_stats()})
+
+    assert f"MetaData.LastUpdatedTime >= '{old_watermark}'" in client.queries[0]
+    assert store.load_documents(REALM, 'Invoice') == client.documents['Invoice']
+    assert store.get_watermark(REALM) > old_watermark
+
+
+def test_sync_changes_without_watermark_does_nothing(client, store):
+    sync_changes(store, client, {'invoices': Invoice}, {'invoices': new_fetch_stats()})
+    assert client.queries == []
+    assert store.get_watermark(REALM) is None
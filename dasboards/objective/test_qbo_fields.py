@@ -0,0 +1,40 @@
+import pytest
+
+from qbo_fields import QboRecord, project_document, select_clause, to_record
+
+JOURNAL_ENTRY = {
+    'Id': '5', 'SyncToken': '2', 'TxnDate': '2024-01-15', 'DocNumber': 'JE-5', 'PrivateNote': 'note',
+    'Line': [
+        {'Id': '0', 'Amount': 12.5, 'Description': 'line', 'DetailType': 'JournalEntryLineDetail',
+         'JournalEntryLineDetail': {'PostingType': 'Debit', 'AccountRef': {'value': '7', 'name': 'A7'},
+                                    'ClassRef': {'value': '1'}}},
+        {'DetailType': 'DescriptionOnly', 'Description': 'note'},
+    ],
+}
+
+
+def test_select_clause_lists_declared_fields():
+    assert select_clause('Invoice') == "Id, SyncToken, TxnDate, TotalAmt, CustomerRef"
+    assert select_clause('Vendor') == "*"
+
+
+def test_project_document_keeps_only_declared_fields():
+    assert project_document('JournalEntry', JOURNAL_ENTRY) == {
+        'Id': '5', 'SyncToken': '2', 'TxnDate': '2024-01-15',
+        'Line': [
+            {'Amount': 12.5,
+             'JournalEntryLineDetail': {'PostingType': 'Debit', 'AccountRef': {'value': '7', 'name': 'A7'}}},
+            {},
+        ],
+    }
+
+
+def test_record_reads_like_a_quickbooks_object():
+    entry = to_record('JournalEntry', JOURNAL_ENTRY)
+
+    assert entry.Line[0].Amount == 12.5
+    assert entry.Line[0].JournalEntryLineDetail.AccountRef.value == '7'
+    assert getattr(entry.Line[1], 'JournalEntryLineDetail', None) is None
+    assert not hasattr(entry, 'DocNumber')
+    with pytest.raises(AttributeError):
+        QboRecord({}).TotalAmt
@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+from account_index import get_account_classifier
+from conftest import ACCOUNT_NUMBERS, FakeQboClient, make_accounts, make_report_entries
+from ledger_engine import CATEGORIES
+from qbo_fetch import new_fetch_stats
+from qbo_reports import month_periods, profit_and_loss_lines
+from rollup_cube import RollupCube
+
+ACCOUNTS = {account['Id']: {'Number': account['AcctNum']} for account in make_accounts()}
+
+
+def test_month_periods_are_bounded_by_the_period():
+    assert month_periods(date(2024, 1, 15), date(2024, 3, 10)) == [
+        ('2024-01', '2024-01-15', '2024-01-31'),
+        ('2024-02', '2024-02-01', '2024-02-29'),
+        ('2024-03', '2024-03-01', '2024-03-10'),
+    ]
+
+
+@pytest.mark.parametrize('period', [(date(2024, 1, 1), date(2024, 3, 31)), (date(2024, 3, 5), date(2024, 5, 20))])
+def test_report_lines_match_classified_entries(period):
+    entries = make_report_entries()
+    client = FakeQboClient({}, reports=entries)
+    stats = new_fetch_stats()
+    lines = profit_and_loss_lines(client, *period, ACCOUNTS, stats)
+
+    # Référence : somme des montants classés, par (mois, restaurant, catégorie)
+    classifier = get_account_classifier()
+    expected = {}
+    for day, account_id, restaurant, amount in entries:
+        classification = classifier.classify(ACCOUNT_NUMBERS[int(account_id)])
+        if classification is None or not period[0].isoformat() <= day <= period[1].isoformat():
+            continue
+        key = (day[:7], restaurant, classification[1])
+        expected[key] = expected.get(key, 0.0) + amount
+
+    sums = lines.groupby(['Month', 'Restaurant', 'Category'], observed=True)['Amount'].sum()
+    assert sums.to_dict() == pytest.approx(expected)
+    assert len(client.report_requests) == stats['pages'] == 3
+    assert client.report_requests[0][0] == period[0].isoformat()
+
+
+def test_report_lines_feed_the_cube():
+    client = FakeQboClient({}, reports=[('2024-01-10', '0', 'HULL', 25.0), ('2024-01-11', '8', 'HULL', 9.0)])
+    lines = profit_and_loss_lines(client, date(2024, 1, 1), date(2024, 1, 31), ACCOUNTS, new_fetch_stats())
+    hull = RollupCube.from_lines(lines, ['2024-01']).matrix(['2024-01'], 'HULL')
+
+    # Le compte 70000 n'est pas suivi
+    assert hull[0, CATEGORIES.index('Ventes')] == 25.0
+    assert hull.sum() == 25.0
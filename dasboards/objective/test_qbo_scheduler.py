@@ -0,0 +1,147 @@
+import pytest
+import requests
+
+import qbo_scheduler
+from qbo_scheduler import RequestScheduler, is_batch_request
+
+
+class Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {'Retry-After': retry_after} if retry_after else {}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Remplace les attentes de l'ordonnanceur par leur enregistrement."""
+    delays = []
+    monkeypatch.setattr(qbo_scheduler.time, 'sleep', delays.append)
+    return delays
+
+
+def responses(*items):
+    """Retourne une requête simulée qui renvoie (ou lève) les éléments dans l'ordre."""
+    items = list(items)
+    calls = []
+
+    def send_request(*args, **kwargs):
+        calls.append((args, kwargs))
+        item = items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+    send_request.calls = calls
+    return send_request
+
+
+def test_retries_transient_statuses_until_success(sleeps):
+    scheduler = RequestScheduler(max_retries=5, base_delay=1.0)
+    send_request = responses(Response(503), Response(500), Response(200))
+
+    response = scheduler.send(send_request, 'POST', url='https://quickbooks.test')
+
+    assert response.status_code == 200
+    assert send_request.calls == [(('POST',), {'url': 'https://quickbooks.test'})] * 3
+    assert scheduler.stats['requests'] == 3
+    assert scheduler.stats['retries'] == 2
+    assert scheduler.stats['throttled'] == 0
+    assert len(sleeps) == 2
+    # Attente exponentielle avec gigue : au plus base_delay * 2 ** tentative
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+
+def test_throttled_response_waits_retry_after(sleeps):
+    scheduler = RequestScheduler(max_delay=60.0)
+    send_request = responses(Response(429, retry_after='7'), Response(429, retry_after='600'), Response(200))
+
+    assert scheduler.send(send_request).status_code == 200
+    assert sleeps == [7.0, 60.0]
+    assert scheduler.stats['throttled'] == 2
+    assert scheduler.stats['throttled_seconds'] == pytest.approx(67.0)
+
+
+def test_gives_up_after_max_retries(sleeps):
+    scheduler = RequestScheduler(max_retries=2)
+    send_request = responses(Response(502), Response(502), Response(502), Response(200))
+
+    assert scheduler.send(send_request).status_code == 502
+    assert len(send_request.calls) == 3
+    assert scheduler.stats['retries'] == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    scheduler = RequestScheduler()
+    send_request = responses(Response(400))
+
+    assert scheduler.send(send_request).status_code == 400
+    assert scheduler.stats['retries'] == 0
+    assert sleeps == []
+
+
+def test_network_errors_are_retried_then_raised(sleeps):
+    scheduler = RequestScheduler(max_retries=1)
+    send_request = responses(requests.ConnectionError('reset'), Response(200))
+    assert scheduler.send(send_request).status_code == 200
+
+    send_request = responses(requests.Timeout('slow'), requests.Timeout('slow'))
+    with pytest.raises(requests.Timeout):
+        scheduler.send(send_request)
+    assert len(send_request.calls) == 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge simulée : chaque attente de l'ordonnanceur avance le temps."""
+    now = [1000.0]
+
+    def sleep(delay):
+        now[0] += delay
+    monkeypatch.setattr(qbo_scheduler.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(qbo_scheduler.time, 'sleep', sleep)
+    return now
+
+
+def requests_sent_within(scheduler, clock, seconds, url='https://quickbooks.test/v3/company/1/query'):
+    """Envoie des requêtes jusqu'à `seconds` secondes simulées; retourne leurs instants relatifs."""
+    started = clock[0]
+    sent = []
+    while True:
+        scheduler.send(lambda method, url: Response(200), 'POST', url)
+        if clock[0] - started >= seconds:
+            return sent
+        sent.append(clock[0] - started)
+
+
+def test_bucket_starts_with_a_small_burst(clock):
+    scheduler = RequestScheduler(requests_per_minute=60, burst=10)
+    sent = requests_sent_within(scheduler, clock, 60)
+
+    # La réserve part d'un coup, puis le débit garde la minute sous la limite
+    assert sent[:10] == [0.0] * 10
+    assert sent[10] == pytest.approx(60 / 50)
+    assert len(sent) <= 60
+    assert scheduler.stats['throttled_seconds'] == pytest.approx(clock[0] - 1000.0)
+
+
+def test_full_rate_never_exceeds_the_limit_in_the_first_minute(clock):
+    sent = requests_sent_within(RequestScheduler(), clock, 60)
+    assert len(sent) <= 500
+
+
+def test_batch_calls_follow_their_own_limit(clock):
+    scheduler = RequestScheduler(batch_requests_per_minute=40, burst=10)
+    sent = requests_sent_within(scheduler, clock, 60, url='https://quickbooks.test/v3/company/1/batch')
+
+    assert len(sent) <= 40
+    assert sent[10] == pytest.approx(60 / 30)
+    # Les requêtes ordinaires ne sont pas limitées par le seau batch
+    started = clock[0]
+    scheduler.send(lambda method, url: Response(200), 'POST', url='https://quickbooks.test/v3/company/1/query')
+    assert clock[0] == started
+
+
+def test_is_batch_request():
+    assert is_batch_request(('POST', 'https://quickbooks.test/v3/company/1/batch'), {})
+    assert is_batch_request(('POST',), {'url': 'https://quickbooks.test/v3/company/1/batch'})
+    assert not is_batch_request(('POST', 'https://quickbooks.test/v3/company/1/query'), {})
+    assert not is_batch_request((), {})
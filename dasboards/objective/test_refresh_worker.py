@@ -0,0 +1,72 @@
+import threading
+
+from refresh_worker import RefreshWorker, format_age
+from shared_cache import SharedDataCache
+
+
+def wait_for(condition, timeout=5):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+    return False
+
+
+def test_watched_key_is_fetched_in_background():
+    cache = SharedDataCache()
+    worker = RefreshWorker(cache, interval=900)
+    worker.watch('key', lambda: 'value')
+
+    assert wait_for(lambda: cache.peek('key')[0] == 'value')
+    assert wait_for(lambda: worker.stats['refreshes'] == 1)
+    assert not worker.is_stale('key')
+
+
+def test_watch_keeps_the_most_recent_keys():
+    cache = SharedDataCache()
+    worker = RefreshWorker(cache, max_keys=2)
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        return 1
+
+    for key in ('a', 'b', 'a', 'c'):
+        worker.watch(key, fetch)
+    # 'a' a été demandé de nouveau après 'b' : c'est 'b' qui est abandonné
+    assert list(worker._jobs) == ['a', 'c']
+    release.set()
+
+
+def test_failed_revalidation_is_recorded():
+    cache = SharedDataCache()
+    worker = RefreshWorker(cache)
+
+    def failing_fetch():
+        raise RuntimeError('quota')
+
+    worker.watch('key', failing_fetch)
+    worker.watch('empty', lambda: None)
+    assert wait_for(lambda: worker.last_error('key') and worker.last_error('empty'))
+    assert worker.last_error('key') == "quota"
+    # Un résultat vide est un échec : la récupération signale ses erreurs en retournant None
+    assert worker.last_error('empty') == "aucune donnée récupérée"
+    assert worker.last_error('autre') is None
+    assert worker.stats['refreshes'] == 0
+
+
+def test_success_clears_the_last_error():
+    cache = SharedDataCache()
+    worker = RefreshWorker(cache)
+    worker._record('key', "quota")
+    worker._record('key', None)
+
+    assert worker.last_error('key') is None
+    assert worker.stats == {'refreshes': 1, 'errors': 1}
+
+
+def test_format_age():
+    assert format_age(30) == "moins d'une minute"
+    assert format_age(600) == "10 min"
+    assert format_age(5400) == "1.5 h"
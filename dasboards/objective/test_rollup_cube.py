@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger_engine import ALL_RESTAURANTS, CATEGORIES
+from rollup_cube import RollupCube
+
+MONTHS = ['2024-01', '2024-02', '2024-03']
+
+
+def lines(rows):
+    """Lignes aplaties (Month, Restaurant, Category, Amount) comme flatten_qbo_json."""
+    months, restaurants, categories, amounts = zip(*rows)
+    return pd.DataFrame({
+        'Month': pd.Categorical(months),
+        'Restaurant': pd.Categorical(restaurants),
+        'Category': pd.Categorical(categories),
+        'Amount': np.asarray(amounts, dtype=np.float64),
+    })
+
+
+@pytest.fixture
+def cube():
+    return RollupCube.from_lines(lines([
+        ('2024-01', 'HULL', 'Ventes', 100.0),
+        ('2024-01', 'HULL', 'Ventes', 50.0),
+        ('2024-01', 'OTTAWA', 'Gestion', 30.0),
+        ('2024-02', None, 'Ventes', 7.0),
+        ('2024-02', 'OTTAWA', 'Autre', 999.0),
+        ('2024-03', 'HULL', 'Perte brute', -4.0),
+        ('2023-12', 'HULL', 'Ventes', 1000.0),
+    ]), MONTHS)
+
+
+def test_from_lines_sums_by_month_restaurant_and_category(cube):
+    sales, labour = CATEGORIES.index('Ventes'), CATEGORIES.index('Gestion')
+    assert cube.restaurants == [ALL_RESTAURANTS, 'HULL', 'OTTAWA']
+    assert cube.values.shape == (3, 3, len(CATEGORIES))
+    assert cube.matrix(MONTHS, 'HULL')[:, sales].tolist() == [150.0, 0.0, 0.0]
+    assert cube.matrix(MONTHS, 'OTTAWA')[:, labour].tolist() == [30.0, 0.0, 0.0]
+    # Tous restaurants : lignes sans restaurant comprises, catégorie 'Autre' et mois hors cube ignorés
+    assert cube.matrix(MONTHS)[:, sales].tolist() == [150.0, 7.0, 0.0]
+    assert cube.values.sum() == pytest.approx(2 * (150.0 + 30.0 - 4.0) + 7.0)
+
+
+def test_from_lines_without_lines():
+    empty = RollupCube.from_lines(lines([('2024-01', 'HULL', 'Ventes', 1.0)]).iloc[:0], MONTHS)
+    assert empty.restaurants == [ALL_RESTAURANTS]
+    assert not empty.values.any()
+
+
+def test_matrix_of_unknown_restaurant_or_month_is_zero(cube):
+    assert not cube.matrix(MONTHS, 'MONTREAL').any()
+    assert not cube.matrix(['2025-01'], 'HULL').any()
+
+
+def test_period_totals_match_sums_of_months(cube):
+    for restaurant in (None, 'HULL', 'OTTAWA', 'MONTREAL'):
+        for i in range(len(MONTHS)):
+            for j in range(i, len(MONTHS)):
+                expected = cube.matrix(MONTHS[i:j + 1], restaurant).sum(axis=0)
+                assert cube.period_totals(MONTHS[i], MONTHS[j], restaurant) == pytest.approx(expected)
+    assert not cube.period_totals('2025-01', '2025-03').any()
+
+
+def test_to_rows_and_from_rows_round_trip(cube):
+    rebuilt = RollupCube.from_rows(MONTHS, cube.to_rows())
+    assert rebuilt.restaurants == cube.restaurants
+    np.testing.assert_array_equal(rebuilt.values, cube.values)
+    assert rebuilt.fingerprint == cube.fingerprint
+
+    # Seuls les mois demandés, et les mois sans ligne restent à zéro
+    partial = RollupCube.from_rows(MONTHS, cube.to_rows(['2024-02']))
+    np.testing.assert_array_equal(partial.matrix(MONTHS), np.vstack([np.zeros(len(CATEGORIES)),
+                                                                     cube.matrix(['2024-02']),
+                                                                     np.zeros(len(CATEGORIES))]))
+
+
+def test_combine_assembles_months_and_restaurants(cube):
+    later = RollupCube.from_lines(lines([
+        ('2024-03', 'MONTREAL', 'Ventes', 5.0),
+        ('2024-04', 'HULL', 'Ventes', 8.0),
+    ]), ['2024-03', '2024-04'])
+    combined = RollupCube.combine([cube, later], MONTHS + ['2024-04'])
+
+    assert combined.restaurants == [ALL_RESTAURANTS, 'HULL', 'MONTREAL', 'OTTAWA']
+    np.testing.assert_array_equal(combined.matrix(MONTHS[:2], 'HULL'), cube.matrix(MONTHS[:2], 'HULL'))
+    np.testing.assert_array_equal(combined.matrix(['2024-04'], 'HULL'), later.matrix(['2024-04'], 'HULL'))
+    # Le mois présent dans les deux cubes vient du dernier
+    np.testing.assert_array_equal(combined.matrix(['2024-03']), later.matrix(['2024-03']))
+    assert not combined.matrix(['2024-03'], 'HULL').any()
+
+
+def test_fingerprint_changes_with_values(cube):
+    rows = cube.to_rows()
+    changed = [rows[0][:3] + (rows[0][3] + 1,)] + rows[1:]
+    assert RollupCube.from_rows(MONTHS, changed).fingerprint != cube.fingerprint
@@ -0,0 +1,107 @@
+import threading
+
+from shared_cache import SharedDataCache
+
+
+def test_concurrent_requests_share_one_fetch():
+    cache = SharedDataCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'rows': 3}
+
+    results = []
+
+    def request():
+        results.append(cache.get('key', fetch))
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=request) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    # Les sessions suivantes attendent la récupération en cours
+    while cache.stats['coalesced'] < len(followers):
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(source for _, source in results) == ['coalesced'] * 5 + ['fetch']
+    assert all(value is results[0][0] for value, _ in results)
+    assert cache.get('key', fetch) == ({'rows': 3}, 'cache')
+    assert cache.stats == {'hits': 1, 'fetches': 1, 'coalesced': 5}
+
+
+def test_error_is_shared_and_not_cached():
+    cache = SharedDataCache()
+    started, release = threading.Event(), threading.Event()
+
+    def failing_fetch():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('quota')
+
+    errors = []
+
+    def request():
+        try:
+            cache.get('key', failing_fetch)
+        except RuntimeError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=request)
+    follower.start()
+    while cache.stats['coalesced'] < 1:
+        threading.Event().wait(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert cache.get('key', lambda: 'ok') == ('ok', 'fetch')
+
+
+def test_none_result_is_not_cached():
+    cache = SharedDataCache()
+    assert cache.get('key', lambda: None) == (None, 'fetch')
+    assert cache.peek('key') == (None, None)
+    assert cache.get('key', lambda: 1) == (1, 'fetch')
+
+
+def test_max_age_forces_fresher_value():
+    cache = SharedDataCache(ttl=900)
+    cache.get('key', lambda: 'old')
+    assert cache.get('key', lambda: 'new', max_age=900) == ('old', 'cache')
+    assert cache.get('key', lambda: 'new', max_age=0) == ('new', 'fetch')
+    value, age = cache.peek('key')
+    assert value == 'new' and age >= 0
+
+
+def test_oldest_entries_are_evicted_and_invalidate_filters_keys():
+    cache = SharedDataCache(max_entries=2)
+    for key in [('a', 1), ('a', 2), ('b', 1)]:
+        cache.get(key, lambda: key)
+    assert cache.age(('a', 1)) is None
+    assert cache.age(('a', 2)) is not None
+
+    cache.invalidate(lambda key: key[0] == 'a')
+    assert cache.age(('a', 2)) is None
+    assert cache.peek(('b', 1))[0] == ('b', 1)
+    cache.invalidate()
+    assert cache.peek(('b', 1)) == (None, None)
+
+
+def test_expired_entry_is_fetched_again():
+    cache = SharedDataCache(ttl=0)
+    cache.get('key', lambda: 'first')
+    assert cache.get('key', lambda: 'second') == ('second', 'fetch')